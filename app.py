@@ -4,10 +4,11 @@ for user authentication, product management, translation, title suggestion, and
 """
 import re
 import os
+import asyncio
 import uuid
 import json
 import logging
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, timedelta
 from difflib import get_close_matches
 import spacy
@@ -21,19 +22,81 @@ from fastapi import (
     Depends,
     WebSocket,
     WebSocketDisconnect,
+    Request,
+    Response,
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from google.auth.credentials import AnonymousCredentials
 from google.cloud import translate_v2 as translate
 from openai import AsyncOpenAI
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from pydantic import BaseModel
 import mysql.connector
-from backend.tasks.tasks import add_crawl_task
+from backend.tasks.tasks import enqueue_crawl_task, task_batcher
+from backend.utils.search_index import ProductSearchIndex, changed_product_rows
+from backend.utils.keyword_matcher import KeywordMatcher, hashed_ngram_vector
+from backend.utils.keyword_catalog import KeywordCatalog, load_keyword_rows
+from backend.utils.utils import (
+    MARKETPLACES,
+    DEFAULT_MARKETPLACE,
+    get_keyword_version,
+    get_keyword_versions,
+    get_changed_keyword_versions,
+)
+from backend.utils.metrics import (
+    registry,
+    timed,
+    install_http_metrics,
+    STAGE_SECONDS,
+    WEBSOCKET_CONNECTIONS,
+    WEBSOCKET_ACTIVE,
+)
+from backend.utils.result_cache import ResultCache
+from backend.utils.keyword_stats import (
+    calculate_bins,
+    compare_columns,
+    merge_parts,
+    row_parts,
+    RATING_VALUES,
+)
+from backend.utils.metric_snapshots import (
+    SnapshotStore,
+    fetch_metric_rows,
+    parse_metric_rows,
+)
+from backend.utils.bulk_export import (
+    start_export,
+    SCHEMAS as EXPORT_SCHEMAS,
+    FORMATS as EXPORT_FORMATS,
+    MAX_EXPORT_KEYWORDS,
+)
+from backend.utils.migrations import migrate
+from backend.utils.saved_lists import (
+    save_products,
+    unsave_products,
+    MAX_BULK_PRODUCTS,
+)
+from backend.utils.http_cache import (
+    version_etag,
+    etag_matches,
+    preferred_encoding,
+    encode_body,
+    not_modified,
+    json_response,
+)
+from backend.utils.image_cache import (
+    ImageCache,
+    ImageCacheError,
+    is_allowed_image_url,
+    THUMBNAIL_WIDTHS,
+    DEFAULT_THUMBNAIL_WIDTH,
+)
 
 app = FastAPI()
+install_http_metrics(app)
 load_dotenv()
 
 nlp = spacy.load("en_core_web_sm")
@@ -41,94 +104,25 @@ nlp = spacy.load("en_core_web_sm")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-WHITELIST = [
-    "women's clothing",
-    "accessory",
-    "action figure",
-    "Air Fryer",
-    "air purifier",
-    "Amazon fire TV stick",
-    "ant killer",
-    "anti slip dog paw pads",
-    "Apple AirPods",
-    "Apple AirTag",
-    "bag",
-    "bed sheet",
-    "bicycle",
-    "board game",
-    "body lotion",
-    "camera",
-    "camping gear",
-    "car part",
-    "children's book",
-    "crocs",
-    "cushion foundation",
-    "disposable face towel",
-    "earring",
-    "educational toy",
-    "engagement gifts",
-    "External Hard Drive",
-    "fiction",
-    "Fitbit",
-    "fitness equipment",
-    "fitness tracker",
-    "flat back stud earrings",
-    "fly trap",
-    "furniture",
-    "grooming product",
-    "headphone",
-    "health supplement",
-    "home decor",
-    "hydrating serum for face",
-    "kitchen gadgets",
-    "laptop",
-    "laptops",
-    "lego",
-    "makeup",
-    "makeup remover wipes",
-    "mascara",
-    "men's clothing",
-    "microphone",
-    "microwave",
-    "monitor",
-    "Nintendo Switch",
-    "non-fiction",
-    "personalized cutting board",
-    "pet food",
-    "pet toy",
-    "pillow case",
-    "ping pong paddle",
-    "portable bluetooth speaker",
-    "printer",
-    "puzzle",
-    "refrigerator",
-    "skincare product",
-    "smartphone",
-    "smartphones",
-    "smartwatch",
-    "sports equipment",
-    "SSD",
-    "sun protection shirts",
-    "tablet",
-    "taiwanese oolong tea bags",
-    "tazo decaffeinated chai tea bags",
-    "tech golf polo",
-    "textbook",
-    "vacuum cleaner",
-    "washing machine",
-    "water shoes",
-    "Wireless Earbuds",
-]
+keyword_catalogs = {marketplace: KeywordCatalog() for marketplace in MARKETPLACES}
+# The worker's invalidation reaches one API process, so every process also
+# reloads its catalog on this interval
+KEYWORD_CATALOG_REFRESH_SECONDS = float(os.getenv("KEYWORD_CATALOG_REFRESH_SECONDS", "300"))
+
+
+def is_known_keyword(keyword):
+    """Whether a keyword was crawled in any marketplace"""
+    return any(keyword in catalog for catalog in keyword_catalogs.values())
 
 
 def validate_keyword(keyword):
     """
-    Validate the keyword against a list of known valid words using SpaCy
+    Validate the keyword against the catalog of crawled keywords using SpaCy
     and check if it's a meaningful word
     """
     logger.info("Validating keyword: %s", keyword)
-    if keyword.lower() in [k.lower() for k in WHITELIST]:
-        logger.info("Keyword '%s' is in the whitelist", keyword)
+    if is_known_keyword(keyword):
+        logger.info("Keyword '%s' is in the keyword catalog", keyword)
         return True
 
     if not re.match("^[a-zA-Z0-9' ]+$", keyword):
@@ -154,11 +148,12 @@ def validate_keyword(keyword):
     return True
 
 
+@timed("correct_typo")
 def correct_typo(keyword):
     """
     Correct typos in the keyword using a predefined vocabulary.
     """
-    if keyword.lower() in [k.lower() for k in WHITELIST]:
+    if is_known_keyword(keyword):
         return keyword
 
     try:
@@ -194,6 +189,7 @@ def correct_typo(keyword):
     return keyword
 
 
+@timed("normalize_keyword")
 def normalize_keyword(keyword):
     """
     Normalize the given keyword by converting to lowercase, removing extra spaces,
@@ -238,6 +234,32 @@ async def validate_keyword_endpoint(keyword: str):
     return JSONResponse(content={"valid": False}, status_code=400)
 
 
+@app.get("/api/autocomplete")
+async def autocomplete_keyword(
+    prefix: str = "",
+    marketplace: str = DEFAULT_MARKETPLACE,
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Complete a typed prefix with the most popular crawled keywords of a
+    marketplace, steering searches to keywords whose products are stored
+    """
+    catalog = keyword_catalogs.get(marketplace)
+    if catalog is None:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown marketplace '{marketplace}'."
+        )
+    with STAGE_SECONDS.time(stage="keyword_autocomplete"):
+        completions = catalog.complete(prefix, limit)
+    return {
+        "prefix": prefix,
+        "completions": [
+            {"keyword": keyword, "popularity": popularity}
+            for keyword, popularity in completions
+        ],
+    }
+
+
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = r"google-translate-key.json"
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
@@ -257,7 +279,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-translate_client = translate.Client()
+# A translation endpoint other than Google's, such as the load test's
+# stand-in, is called without credentials
+TRANSLATE_API_ENDPOINT = os.getenv("TRANSLATE_API_ENDPOINT")
+if TRANSLATE_API_ENDPOINT:
+    translate_client = translate.Client(
+        credentials=AnonymousCredentials(),
+        client_options={"api_endpoint": TRANSLATE_API_ENDPOINT},
+    )
+else:
+    translate_client = translate.Client()
 
 active_connections = []
 
@@ -272,6 +303,289 @@ def get_db_connection():
     )
 
 
+product_index = ProductSearchIndex()
+product_index_lock = asyncio.Lock()
+
+
+def load_product_index_changes(index):
+    """Read the rows a search index is missing, see changed_product_rows"""
+    conn = get_db_connection()
+    try:
+        return changed_product_rows(conn, index)
+    finally:
+        conn.close()
+
+
+def build_search_index():
+    """A search index of every stored product"""
+    index = ProductSearchIndex()
+    rows, index.synced_at = load_product_index_changes(index)
+    index.add_rows(rows)
+    return index
+
+
+async def refresh_product_index():
+    """
+    Add products stored since the last refresh to the in-process search index
+    and re-index those crawled again. The rows are read in a thread and
+    indexed on the event loop, so searches never see a half-added product;
+    once most entries are superseded, the index is rebuilt in a thread.
+    """
+    global product_index
+    async with product_index_lock:
+        try:
+            if product_index.replaced() > len(product_index):
+                product_index = await asyncio.to_thread(build_search_index)
+                logger.info("Rebuilt product index (%s products)", len(product_index))
+                return len(product_index)
+            rows, synced_at = await asyncio.to_thread(
+                load_product_index_changes, product_index
+            )
+        except mysql.connector.Error as err:
+            logger.error("Error refreshing product index: %s", str(err))
+            return 0
+        added = product_index.add_rows(rows)
+        product_index.synced_at = synced_at
+        logger.info("Indexed %s new or changed products (%s total)", added, len(product_index))
+        return added
+
+
+# A spaCy model with word vectors lets the keyword matcher match synonyms;
+# without one it falls back to hashed n-grams, which only match spellings
+KEYWORD_VECTORS_MODEL = os.getenv("KEYWORD_VECTORS_MODEL", "en_core_web_md")
+KEYWORD_WORD_SIMILARITY = float(os.getenv("KEYWORD_WORD_SIMILARITY", "0.7"))
+try:
+    vectors_nlp = spacy.load(KEYWORD_VECTORS_MODEL)
+except OSError:
+    logger.warning(
+        "spaCy model %s is not installed, matching keywords by spelling only",
+        KEYWORD_VECTORS_MODEL,
+    )
+    vectors_nlp = nlp
+
+
+def embed_keyword(keyword):
+    """Embed a keyword with spaCy vectors if the model has them, else hashed n-grams"""
+    if vectors_nlp.vocab.vectors_length:
+        return vectors_nlp.make_doc(keyword).vector
+    return hashed_ngram_vector(keyword)
+
+
+def similar_words(word, other):
+    """Whether the word vectors of two words are at least KEYWORD_WORD_SIMILARITY similar"""
+    lexeme, other_lexeme = vectors_nlp.vocab[word], vectors_nlp.vocab[other]
+    if not (lexeme.has_vector and other_lexeme.has_vector):
+        return False
+    return lexeme.similarity(other_lexeme) >= KEYWORD_WORD_SIMILARITY
+
+
+KEYWORD_MATCH_THRESHOLD = float(os.getenv("KEYWORD_MATCH_THRESHOLD", "0.6"))
+keyword_matcher = KeywordMatcher(
+    embed=embed_keyword,
+    similar_words=similar_words if vectors_nlp.vocab.vectors_length else None,
+)
+
+
+def refresh_keyword_matcher():
+    """Load canonical keywords not yet known to the keyword matcher"""
+    try:
+        conn = get_db_connection()
+    except mysql.connector.Error as err:
+        logger.error("Error connecting to refresh keyword matcher: %s", str(err))
+        return 0
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT keyword FROM normalized_keywords")
+        return keyword_matcher.add_many(row[0] for row in cursor.fetchall())
+    except mysql.connector.Error as err:
+        logger.error("Error refreshing keyword matcher: %s", str(err))
+        return 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def load_keyword_catalog_rows(keyword=None, marketplace=None):
+    """
+    (keyword, popularity) rows of the stored keywords by marketplace, or only
+    those of one keyword when given
+    """
+    conn = get_db_connection()
+    try:
+        by_marketplace = {}
+        for stored_keyword, stored_marketplace, popularity in load_keyword_rows(
+            conn, keyword, marketplace
+        ):
+            by_marketplace.setdefault(stored_marketplace, []).append(
+                (stored_keyword, float(popularity))
+            )
+        return by_marketplace
+    finally:
+        conn.close()
+
+
+def build_keyword_catalogs():
+    """New keyword catalogs of every marketplace holding the stored keywords"""
+    by_marketplace = load_keyword_catalog_rows()
+    catalogs = {marketplace: KeywordCatalog() for marketplace in MARKETPLACES}
+    for marketplace, catalog in catalogs.items():
+        catalog.add_many(by_marketplace.get(marketplace, ()))
+    return catalogs
+
+
+async def refresh_keyword_catalog(keyword=None, marketplace=None):
+    """
+    Reload the keyword catalogs, or only the entries of one keyword when
+    given. The catalogs are read on the event loop without a lock, so a full
+    reload builds new catalogs in a thread and swaps them in at once, and the
+    rows of one keyword are read in a thread and added on the event loop.
+    """
+    global keyword_catalogs
+    try:
+        if keyword is None:
+            keyword_catalogs = await asyncio.to_thread(build_keyword_catalogs)
+            logger.info(
+                "Loaded %s keywords into the keyword catalog",
+                sum(len(catalog) for catalog in keyword_catalogs.values()),
+            )
+            return
+        by_marketplace = await asyncio.to_thread(
+            load_keyword_catalog_rows, keyword, marketplace
+        )
+    except Exception as err:
+        logger.error("Error refreshing keyword catalog: %s", str(err))
+        return
+    added = 0
+    for stored_marketplace, rows in by_marketplace.items():
+        catalog = keyword_catalogs.get(stored_marketplace)
+        if catalog is not None:
+            added += sum(catalog.add(*row) for row in rows)
+    logger.info("Added %s keywords to the keyword catalog", added)
+
+
+@app.on_event("startup")
+async def migrate_schema():
+    """Apply pending schema migrations before anything reads the database"""
+    migrate()
+
+
+@app.on_event("startup")
+async def build_product_index():
+    """
+    Build the product search index, keyword matcher and keyword catalog from
+    the database at startup
+    """
+    await refresh_product_index()
+    refresh_keyword_matcher()
+    await refresh_keyword_catalog()
+
+
+async def reload_keyword_catalog():
+    """Reload the keyword catalog every KEYWORD_CATALOG_REFRESH_SECONDS"""
+    while True:
+        await asyncio.sleep(KEYWORD_CATALOG_REFRESH_SECONDS)
+        await refresh_keyword_catalog()
+
+
+@app.on_event("startup")
+async def start_keyword_catalog_reloader():
+    """Reload the keyword catalog periodically to pick up other processes' updates"""
+    app.state.catalog_reloader = None
+    if KEYWORD_CATALOG_REFRESH_SECONDS > 0:
+        app.state.catalog_reloader = asyncio.ensure_future(reload_keyword_catalog())
+
+
+@app.on_event("shutdown")
+async def stop_keyword_catalog_reloader():
+    """Stop reloading the keyword catalog"""
+    if app.state.catalog_reloader is not None:
+        app.state.catalog_reloader.cancel()
+
+
+product_cache = ResultCache()
+# The worker's invalidation reaches one API process, so every process also
+# polls the keyword versions on this interval and drops the changed keywords
+RESULT_CACHE_SYNC_SECONDS = float(os.getenv("RESULT_CACHE_SYNC_SECONDS", "2"))
+# Versions bumped shortly before a poll may commit after it, so each poll
+# re-reads the versions changed this long before the previous one
+VERSION_SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def load_changed_keyword_versions(since):
+    """
+    (keyword, marketplace, version) of the keywords whose data version changed
+    at or after since, none when since is None, and the database time now
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT CURRENT_TIMESTAMP")
+        now = cursor.fetchone()[0]
+        if since is None:
+            return [], now
+        return get_changed_keyword_versions(cursor, since), now
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def sync_product_cache():
+    """
+    Drop the cached product responses of keywords whose data version changed
+    in any process, polling every RESULT_CACHE_SYNC_SECONDS. Versions seen in
+    the previous poll are remembered, so re-read versions are not dropped again.
+    """
+    synced_at, seen = None, {}
+    while True:
+        since = None if synced_at is None else synced_at - VERSION_SYNC_OVERLAP
+        try:
+            rows, now = await asyncio.to_thread(load_changed_keyword_versions, since)
+        except Exception as err:
+            logger.error("Error polling keyword versions: %s", str(err))
+        else:
+            current = {}
+            for keyword, marketplace, version in rows:
+                current[(keyword, marketplace)] = version
+                if seen.get((keyword, marketplace)) != version:
+                    product_cache.invalidate(keyword, marketplace)
+            synced_at, seen = now, current
+        await asyncio.sleep(RESULT_CACHE_SYNC_SECONDS)
+
+
+@app.on_event("startup")
+async def start_product_cache_sync():
+    """Start polling keyword versions for the product response cache"""
+    app.state.product_cache_sync = None
+    if RESULT_CACHE_SYNC_SECONDS > 0:
+        app.state.product_cache_sync = asyncio.ensure_future(sync_product_cache())
+
+
+@app.on_event("shutdown")
+async def stop_product_cache_sync():
+    """Stop polling keyword versions"""
+    if app.state.product_cache_sync is not None:
+        app.state.product_cache_sync.cancel()
+
+
+image_cache = ImageCache()
+metric_snapshots = SnapshotStore()
+IMAGE_MAX_AGE = int(os.getenv("IMAGE_MAX_AGE", "86400"))
+# How long a queued image task stands for its keyword before it is queued again
+IMAGE_REQUEST_INTERVAL = int(os.getenv("IMAGE_REQUEST_INTERVAL", "3600"))
+
+
+@app.on_event("shutdown")
+async def close_image_cache():
+    """Release the image cache's HTTP client and thumbnail process pool"""
+    await image_cache.close()
+
+
+@app.on_event("shutdown")
+async def close_task_batcher():
+    """Send crawl tasks still buffered for the queue"""
+    await task_batcher.close()
+
+
 def verify_password(plain_password, hased_password):
     """Verify a plain password against a hashed password"""
     return pwd_context.verify(plain_password, hased_password)
@@ -308,6 +622,12 @@ class SaveProductRequest(BaseModel):
     product_id: int
 
 
+class BulkSaveRequest(BaseModel):
+    """Model for saving or unsaving several products at once"""
+
+    product_ids: List[int]
+
+
 @app.post("/api/signup")
 async def signup(signup_request: SignUpRequest):
     """Endpoint to handle user signup"""
@@ -403,16 +723,13 @@ async def save_to_saved_lists(
     cursor = conn.cursor()
 
     try:
-        query_select = "SELECT * FROM savedLists WHERE user_id = %s AND product_id = %s"
-        cursor.execute(query_select, (user_id, save_request.product_id))
-        existing_entry = cursor.fetchone()
-
-        if existing_entry:
-            raise HTTPException(status_code=400, detail="Product already saved")
-
-        query_insert = "INSERT INTO savedLists (user_id, product_id) VALUES (%s, %s)"
+        query_insert = (
+            "INSERT IGNORE INTO savedLists (user_id, product_id) VALUES (%s, %s)"
+        )
         cursor.execute(query_insert, (user_id, save_request.product_id))
         conn.commit()
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=400, detail="Product already saved")
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err)) from err
     finally:
@@ -439,23 +756,111 @@ async def unsave_product(product_id: int, user_id: str = Depends(get_current_use
     return {"message": "Product unsaved successfully!"}
 
 
+def check_bulk_request(bulk_request):
+    """Reject an empty or oversized bulk request with a 400"""
+    if not bulk_request.product_ids:
+        raise HTTPException(status_code=400, detail="No product ids given")
+    if len(bulk_request.product_ids) > MAX_BULK_PRODUCTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_PRODUCTS} products can be changed at once",
+        )
+
+
+@app.post("/api/savedLists/bulk_save")
+async def bulk_save_to_saved_lists(
+    bulk_request: BulkSaveRequest, user_id: str = Depends(get_current_user)
+):
+    """Save several products to user's saved list, reporting the status of each"""
+    check_bulk_request(bulk_request)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        results = save_products(cursor, user_id, bulk_request.product_ids)
+        conn.commit()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    finally:
+        cursor.close()
+        conn.close()
+    return {
+        "results": [
+            {"product_id": product_id, "status": status}
+            for product_id, status in results
+        ]
+    }
+
+
+@app.post("/api/savedLists/bulk_unsave")
+async def bulk_unsave_products(
+    bulk_request: BulkSaveRequest, user_id: str = Depends(get_current_user)
+):
+    """Remove several products from user's saved list, reporting the status of each"""
+    check_bulk_request(bulk_request)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        results = unsave_products(cursor, user_id, bulk_request.product_ids)
+        conn.commit()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    finally:
+        cursor.close()
+        conn.close()
+    return {
+        "results": [
+            {"product_id": product_id, "status": status}
+            for product_id, status in results
+        ]
+    }
+
+
 @app.get("/api/get_savedLists")
-async def get_saved_lists(user_id: str = Depends(get_current_user)):
-    """Get user's saved product list"""
+async def get_saved_lists(
+    user_id: str = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    ids_only: bool = False,
+):
+    """
+    Get user's saved product list, a page of it when limit is given. With
+    ids_only only the saved product ids are returned, without the products
+    join, for marking saved products in listings.
+    """
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
+    page = ""
+    params = (user_id,)
+    if limit is not None:
+        page = "LIMIT %s OFFSET %s"
+        params = (user_id, limit, offset)
 
     try:
+        if ids_only:
+            cursor.execute(
+                f"""
+                SELECT product_id FROM savedLists
+                WHERE user_id = %s
+                ORDER BY product_id
+                {page}
+                """,
+                params,
+            )
+            return [row["product_id"] for row in cursor.fetchall()]
         cursor.execute(
-            """
+            f"""
             SELECT p.id, p.mainImage_url, p.title,
             CONCAT(REPLACE(p.price_whole, '\n', ''), '.', LPAD(p.price_fraction, 2, '0')) AS price,
             p.rating, p.reviews
             FROM savedLists s
             JOIN products p ON s.product_id = p.id
             WHERE s.user_id = %s
+            ORDER BY s.product_id
+            {page}
         """,
-            (user_id,),
+            params,
         )
         products = cursor.fetchall()
     except mysql.connector.Error as err:
@@ -466,33 +871,105 @@ async def get_saved_lists(user_id: str = Depends(get_current_user)):
     return products if products else []
 
 
+def products_response(request, keyword, marketplace, body, etag, generation=None):
+    """
+    Answer with a product list body, compressed if the client accepts it.
+    Compressed bodies are cached next to the plain one, and only served
+    while they carry the same ETag.
+    """
+    encoding = preferred_encoding(request, len(body))
+    if encoding is not None:
+        cached = product_cache.get(keyword, marketplace, encoding, record=False)
+        if cached is None or cached[1] != etag:
+            body = encode_body(body, encoding)
+            product_cache.put(keyword, marketplace, body, generation, etag, encoding)
+        else:
+            body = cached[0]
+    return json_response(body, etag, encoding)
+
+
 @app.get("/api/fetch_products")
-async def fetch_products(keyword: str, sessionId: str):
-    """Validate keyword first then fetch product information based on the keyword"""
-    logger.info("Received keyword: %s, sessionId: %s", keyword, sessionId)
+async def fetch_products(
+    request: Request,
+    keyword: str,
+    sessionId: str,
+    crawl: bool = False,
+    marketplace: str = DEFAULT_MARKETPLACE,
+):
+    """
+    Validate keyword first then fetch product information based on the keyword.
+    Unknown keywords close to an existing one are answered with suggestions
+    and no products instead of a new crawl, unless crawl is set. Keywords known in one
+    marketplace but not yet crawled in the requested one are queued for it.
+    Responses carry an ETag of the keyword's data version; a matching
+    If-None-Match is answered with 304 before the product query.
+    """
+    logger.info(
+        "Received keyword: %s, sessionId: %s, marketplace: %s",
+        keyword,
+        sessionId,
+        marketplace,
+    )
+    if marketplace not in MARKETPLACES:
+        return JSONResponse(
+            status_code=400,
+            content={"detail": f"Unknown marketplace '{marketplace}'."},
+        )
+    search_term = " ".join(keyword.lower().split())
+    if_none_match = request.headers.get("if-none-match")
+    cached = product_cache.lookup(search_term, marketplace)
+    if cached is not None:
+        canonical_keyword, body, etag = cached
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return products_response(request, canonical_keyword, marketplace, body, etag)
+    generation = product_cache.generation
+
+    normalized_keyword = normalize_keyword(keyword)
+    if not normalized_keyword:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "detail": "Invalid keyword. Please enter a meaningful search term."
+            },
+        )
+
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
-    
+
     try:
-        normalized_keyword = normalize_keyword(keyword)
-        if not normalized_keyword:
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "detail": "Invalid keyword. Please enter a meaningful search term."
-                },
+        with STAGE_SECONDS.time(stage="normalized_keywords_lookup"):
+            cursor.execute(
+                "SELECT keyword FROM normalized_keywords WHERE FIND_IN_SET(%s, keyword_pool)",
+                (normalized_keyword,),
             )
-
-        cursor.execute(
-            "SELECT keyword FROM normalized_keywords WHERE FIND_IN_SET(%s, keyword_pool)",
-            (normalized_keyword,),
-        )
-        result = cursor.fetchone()
+            result = cursor.fetchone()
 
         if result:
+            product_cache.add_alias(search_term, result["keyword"])
             normalized_keyword = result["keyword"]
         else:
-            add_crawl_task(normalized_keyword, sessionId)
+            suggestions = [] if crawl else keyword_matcher.matches(
+                normalized_keyword, KEYWORD_MATCH_THRESHOLD
+            )
+            if suggestions:
+                logger.info(
+                    "Keyword '%s' is close to existing keywords %s",
+                    normalized_keyword,
+                    suggestions,
+                )
+                return JSONResponse(
+                    status_code=200,
+                    content={
+                        "detail": "Similar keywords already exist.",
+                        "products": [],
+                        "suggestions": [
+                            {"keyword": match, "similarity": round(similarity, 3)}
+                            for match, similarity in suggestions
+                        ],
+                    },
+                )
+            await enqueue_crawl_task(normalized_keyword, sessionId, marketplace=marketplace)
             logger.info(
                 "No products found for keyword '%s', crawl task added",
                 normalized_keyword,
@@ -504,37 +981,66 @@ async def fetch_products(keyword: str, sessionId: str):
                 },
             )
 
-        cursor.execute(
-            """
-            SELECT id, mainImage_url, title,
-            CONCAT(REPLACE(price_whole, '\n', ''), '.', LPAD(price_fraction, 2, '0')) AS price,
-            rating, reviews, url
-            FROM products
-            WHERE keyword = %s
-            """,
-            (normalized_keyword,),
-        )
-        products = cursor.fetchall()
+        with STAGE_SECONDS.time(stage="keyword_version_lookup"):
+            etag = version_etag(
+                "products",
+                normalized_keyword,
+                marketplace,
+                get_keyword_version(cursor, normalized_keyword, marketplace),
+            )
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+        with STAGE_SECONDS.time(stage="products_query"):
+            cursor.execute(
+                """
+                SELECT id, mainImage_url, title,
+                CONCAT(REPLACE(price_whole, '\n', ''), '.', LPAD(price_fraction, 2, '0')) AS price,
+                rating, reviews, url
+                FROM products
+                WHERE keyword = %s AND marketplace = %s
+                """,
+                (normalized_keyword, marketplace),
+            )
+            products = cursor.fetchall()
 
+        if not products and marketplace != DEFAULT_MARKETPLACE:
+            await enqueue_crawl_task(normalized_keyword, sessionId, marketplace=marketplace)
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "detail": "Keyword not crawled in this marketplace yet. "
+                    "A crawl task has been added to the queue"
+                },
+            )
         if not products:
             return JSONResponse(
                 status_code=404, content={"detail": "No products found for the keyword"}
             )
 
-        product_list = []
-        for product in products:
-            product_dict = {
-                "id": product["id"],
-                "main_Image": product["mainImage_url"],
-                "product_title": product["title"],
-                "price": product["price"],
-                "rating": product["rating"],
-                "reviews": product["reviews"],
-                "url": product["url"],
-            }
-            product_list.append(product_dict)
-        logger.info("Fetched products from DB: %s", product_list)
-        return JSONResponse(content=product_list)
+        with STAGE_SECONDS.time(stage="products_serialization"):
+            product_list = []
+            for product in products:
+                product_dict = {
+                    "id": product["id"],
+                    "main_Image": product["mainImage_url"],
+                    "product_title": product["title"],
+                    "price": product["price"],
+                    "rating": product["rating"],
+                    "reviews": product["reviews"],
+                    "url": product["url"],
+                }
+                product_list.append(product_dict)
+            body = JSONResponse(content=product_list).body
+        product_cache.put(normalized_keyword, marketplace, body, generation, etag)
+        logger.info(
+            "Fetched %s products from DB for keyword '%s'",
+            len(product_list),
+            normalized_keyword,
+        )
+        return products_response(
+            request, normalized_keyword, marketplace, body, etag, generation
+        )
     except Exception as err:
         logger.error("Error in fetch_products: %s", str(err))
         return JSONResponse(
@@ -546,6 +1052,246 @@ async def fetch_products(keyword: str, sessionId: str):
         conn.close()
 
 
+@app.get("/api/search_products")
+async def search_products(
+    q: str = Query(..., min_length=1, description="Search terms"),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Search all crawled product titles ranked by relevance"""
+    matches = product_index.search(
+        q,
+        limit=limit,
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+    )
+    if not matches:
+        return []
+
+    scores = dict(matches)
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        placeholders = ", ".join(["%s"] * len(scores))
+        cursor.execute(
+            f"""
+            SELECT id, mainImage_url, title,
+            CONCAT(REPLACE(price_whole, '\n', ''), '.', LPAD(price_fraction, 2, '0')) AS price,
+            rating, reviews, url, keyword
+            FROM products
+            WHERE id IN ({placeholders})
+            """,
+            tuple(scores),
+        )
+        products = cursor.fetchall()
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    finally:
+        cursor.close()
+        conn.close()
+
+    product_list = [
+        {
+            "id": product["id"],
+            "main_Image": product["mainImage_url"],
+            "product_title": product["title"],
+            "price": product["price"],
+            "rating": product["rating"],
+            "reviews": product["reviews"],
+            "url": product["url"],
+            "keyword": product["keyword"],
+            "score": scores[product["id"]],
+        }
+        for product in products
+    ]
+    product_list.sort(key=lambda product: product["score"], reverse=True)
+    return product_list
+
+
+@app.get("/api/products/{product_id}/images")
+async def get_product_images(product_id: int, sessionId: Optional[str] = None):
+    """
+    Fetch the images of a product. Images are collected after the search
+    results are stored, so a product without any yet gets an image task queued
+    for its keyword. The task is queued once per IMAGE_REQUEST_INTERVAL, so
+    products whose page has no images do not queue one on every request.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT keyword, marketplace, mainImage_url FROM products WHERE id = %s",
+            (product_id,),
+        )
+        product = cursor.fetchone()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        cursor.execute(
+            "SELECT url FROM product_images WHERE product_id = %s ORDER BY position",
+            (product_id,),
+        )
+        images = [row["url"] for row in cursor.fetchall()]
+        requested = False
+        if not images:
+            # Affects no row while a task queued for the keyword is recent
+            cursor.execute(
+                """
+                INSERT INTO image_requests (keyword, marketplace) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE requested_at = IF(
+                    requested_at < NOW() - INTERVAL %s SECOND, NOW(), requested_at
+                )
+                """,
+                (product["keyword"], product["marketplace"], IMAGE_REQUEST_INTERVAL),
+            )
+            requested = cursor.rowcount > 0
+            conn.commit()
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    finally:
+        cursor.close()
+        conn.close()
+
+    if images:
+        return {
+            "product_id": product_id,
+            "main_image": images[0],
+            "other_images": images[1:],
+        }
+    if requested:
+        await enqueue_crawl_task(
+            product["keyword"], sessionId, mode="images", marketplace=product["marketplace"]
+        )
+        detail = "Images are not fetched yet. An image task has been added to the queue"
+    else:
+        detail = "Images are not fetched yet. An image task is already queued"
+    return JSONResponse(
+        status_code=202,
+        content={
+            "detail": detail,
+            "product_id": product_id,
+            "main_image": product["mainImage_url"],
+            "other_images": [],
+        },
+    )
+
+
+@app.get("/api/image")
+async def proxy_image(
+    request: Request,
+    url: str = Query(..., description="Amazon image URL"),
+    width: int = Query(DEFAULT_THUMBNAIL_WIDTH, description="Thumbnail width"),
+):
+    """Serve a cached thumbnail of a product image, generating it on first access"""
+    if not is_allowed_image_url(url):
+        raise HTTPException(status_code=400, detail="Image host not allowed")
+    if width not in THUMBNAIL_WIDTHS:
+        raise HTTPException(
+            status_code=400, detail=f"Width must be one of {list(THUMBNAIL_WIDTHS)}"
+        )
+    try:
+        path, etag = await image_cache.get(url, width)
+    except ImageCacheError as err:
+        logger.warning("Image proxy failed: %s", err)
+        raise HTTPException(status_code=502, detail="Image could not be fetched") from err
+
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={IMAGE_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+
+def image_cache_samples():
+    """Expose the thumbnail cache statistics on /metrics"""
+    stats = image_cache.metrics()
+    return [
+        ("image_cache_hits_total", "counter", "Thumbnail cache hits",
+         stats["image_cache_hits"]),
+        ("image_cache_misses_total", "counter", "Thumbnail cache misses",
+         stats["image_cache_misses"]),
+        ("image_cache_evictions_total", "counter", "Thumbnails evicted",
+         stats["image_cache_evictions"]),
+        ("image_cache_bytes", "gauge", "Bytes of cached thumbnails",
+         stats["image_cache_bytes"]),
+    ]
+
+
+registry.add_collector(image_cache_samples)
+
+
+def task_queue_samples():
+    """Expose the crawl task batching statistics on /metrics"""
+    stats = task_batcher.metrics()
+    return [
+        ("task_queue_batches_sent_total", "counter", "Batches sent to the task queue",
+         stats["queue_batches_sent"]),
+        ("task_queue_messages_sent_total", "counter", "Tasks accepted by the queue",
+         stats["queue_messages_sent"]),
+        ("task_queue_messages_failed_total", "counter", "Tasks given up after retries",
+         stats["queue_messages_failed"]),
+        ("task_queue_buffered", "gauge", "Tasks waiting for the next batch",
+         stats["queue_buffered"]),
+    ]
+
+
+registry.add_collector(task_queue_samples)
+
+
+def product_cache_samples():
+    """Expose the product response cache statistics on /metrics"""
+    stats = product_cache.metrics()
+    return [
+        ("product_cache_hits_total", "counter", "Product responses served from memory",
+         stats["result_cache_hits"]),
+        ("product_cache_misses_total", "counter", "Product requests answered from MySQL",
+         stats["result_cache_misses"]),
+        ("product_cache_hit_ratio", "gauge", "Share of product requests served from memory",
+         stats["result_cache_hit_ratio"]),
+        ("product_cache_evictions_total", "counter", "Product responses evicted",
+         stats["result_cache_evictions"]),
+        ("product_cache_invalidations_total", "counter",
+         "Product responses dropped after a crawl", stats["result_cache_invalidations"]),
+        ("product_cache_entries", "gauge", "Cached product responses",
+         stats["result_cache_entries"]),
+        ("product_cache_bytes", "gauge", "Bytes of cached product responses",
+         stats["result_cache_bytes"]),
+        ("product_cache_aliases", "gauge", "Search terms mapped to cached keywords",
+         stats["result_cache_aliases"]),
+    ]
+
+
+registry.add_collector(product_cache_samples)
+
+
+def metric_snapshot_samples():
+    """Expose the metric snapshot statistics on /metrics"""
+    stats = metric_snapshots.metrics()
+    return [
+        ("metric_snapshot_hits_total", "counter", "Statistics read from a snapshot",
+         stats["metric_snapshot_hits"]),
+        ("metric_snapshot_misses_total", "counter", "Statistics without a snapshot",
+         stats["metric_snapshot_misses"]),
+        ("metric_snapshot_stale_total", "counter",
+         "Statistics whose snapshot was older than the keyword",
+         stats["metric_snapshot_stale"]),
+        ("metric_snapshot_open", "gauge", "Snapshots mapped in this process",
+         stats["metric_snapshot_open"]),
+    ]
+
+
+registry.add_collector(metric_snapshot_samples)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Expose the application metrics in the Prometheus text format"""
+    return Response(
+        content=registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 @app.get("/api/translate")
 async def translate_text(
     text: str = Query(..., description="Text to translate"),
@@ -557,91 +1303,98 @@ async def translate_text(
 
 
 @app.get("/api/fetch_statistics")
-async def fetch_statistics(keyword: str):
-    """Fetch statistics for products based on a keyword"""
+async def fetch_statistics(
+    request: Request, keyword: str, marketplace: str = DEFAULT_MARKETPLACE
+):
+    """
+    Fetch statistics for products based on a keyword, answering a matching
+    If-None-Match with 304 before querying the products. The metrics are
+    read from the keyword's snapshot while it is at the current version.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT
-        CONCAT(REPLACE(
-            REPLACE(price_whole, '\n', ''), ',', ''),
-            '.', LPAD(price_fraction, 2, '0')) AS price,
-        SUBSTRING_INDEX(rating, ' ', 1) as rating,
-        REPLACE(reviews, ',', '') as reviews
-        FROM products
-        WHERE keyword = %s
-        """,
-        (keyword,),
-    )
-    products = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    try:
+        version = get_keyword_version(cursor, keyword, marketplace)
+        etag = version_etag("statistics", keyword, marketplace, version)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+        snapshot = metric_snapshots.load(keyword, marketplace, version)
+        if snapshot is not None:
+            columns = snapshot.columns
+        else:
+            with STAGE_SECONDS.time(stage="statistics_query"):
+                columns = parse_metric_rows(
+                    fetch_metric_rows(cursor, keyword, marketplace)
+                )
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    finally:
+        cursor.close()
+        conn.close()
 
-    if not products:
+    if not len(columns["prices"]):
         return JSONResponse(
             status_code=404, 
             content={"error": "No product found for current keyword"}
         )
 
-    price_list = [float(product[0]) for product in products]
-    rating_list = [float(product[1]) for product in products]
-    review_list = [int(product[2]) for product in products]
+    body = JSONResponse(
+        content=compute_statistics(
+            columns["prices"], columns["ratings"], columns["reviews"]
+        )
+    ).body
+    encoding = preferred_encoding(request, len(body))
+    if encoding is not None:
+        body = encode_body(body, encoding)
+    return json_response(body, etag, encoding)
 
-    def calculate_bins(data, num_bins=10, round_up=False):
-        min_val = np.floor(min(data)) if not round_up else np.ceil(min(data))
-        max_val = np.ceil(max(data)) + 1e-6
-        step = np.ceil((max_val - min_val) / num_bins)
-        bins = np.arange(min_val, max_val + step, step)
-        return bins
 
-    price_bins = calculate_bins(price_list, round_up=True)
+@timed("statistics_compute")
+def compute_statistics(prices, ratings, reviews):
+    """Compute the price, rating and review statistics of a keyword's metric arrays"""
+    price_bins = calculate_bins(prices, round_up=True)
     price_bin_labels = [
         f"${int(price_bins[i])}-${int(price_bins[i+1])}"
         for i in range(len(price_bins) - 1)
     ]
     price_range_distribution = (
-        pd.cut(price_list, bins=price_bins, labels=price_bin_labels, right=False)
+        pd.cut(prices, bins=price_bins, labels=price_bin_labels, right=False)
         .value_counts()
         .sort_index()
         .to_dict()
     )
 
-    review_bins = calculate_bins(review_list, round_up=True)
+    review_bins = calculate_bins(reviews, round_up=True)
     review_bin_labels = [
         f"{int(review_bins[i])}-{int(review_bins[i+1])}"
         for i in range(len(review_bins) - 1)
     ]
     review_range_distribution = (
-        pd.cut(review_list, bins=review_bins, labels=review_bin_labels, right=False)
+        pd.cut(reviews, bins=review_bins, labels=review_bin_labels, right=False)
         .value_counts()
         .sort_index()
         .to_dict()
     )
 
     rating_distribution = {
-        "1": rating_list.count(1),
-        "2": rating_list.count(2),
-        "3": rating_list.count(3),
-        "4": rating_list.count(4),
-        "5": rating_list.count(5),
+        str(value): int(np.count_nonzero(ratings == value)) for value in RATING_VALUES
     }
 
     statistics = {
-        "seller_count": len(products),
-        "price_range": (min(price_list), max(price_list)),
-        "average_price": sum(price_list) / len(price_list),
-        "average_rating": sum(rating_list) / len(rating_list),
-        "average_reviews": sum(review_list) / len(review_list),
-        "price_list": price_list,
-        "review_list": review_list,
-        "rating_list": rating_list,
+        "seller_count": len(prices),
+        "price_range": (float(prices.min()), float(prices.max())),
+        "average_price": float(prices.mean()),
+        "average_rating": float(ratings.mean()),
+        "average_reviews": float(reviews.mean()),
+        "price_list": prices.tolist(),
+        "review_list": reviews.tolist(),
+        "rating_list": ratings.tolist(),
         "price_range_distribution": price_range_distribution,
         "review_range_distribution": review_range_distribution,
         "rating_distribution": rating_distribution,
     }
 
-    return JSONResponse(content=statistics)
+    return statistics
 
 
 @app.get("/api/suggested_title")
@@ -671,6 +1424,205 @@ async def get_suggested_title(keyword: str):
         raise HTTPException(status_code=500, detail=str(err)) from err
 
 
+class CompareStatisticsRequest(BaseModel):
+    """Model for comparing the statistics of several keywords"""
+
+    keywords: List[str]
+    marketplace: str = DEFAULT_MARKETPLACE
+
+
+MAX_COMPARED_KEYWORDS = 500
+
+
+@app.post("/api/compare_statistics")
+async def compare_keyword_statistics(compare_request: CompareStatisticsRequest):
+    """
+    Fetch the statistics of several keywords side by side, in one query and
+    on price and review bins shared by all of them. Keywords without
+    products are listed as missing. Keywords with a current metric snapshot
+    are read from it; only the others are queried.
+    """
+    if compare_request.marketplace not in MARKETPLACES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown marketplace '{compare_request.marketplace}'.",
+        )
+    keywords = list(dict.fromkeys(compare_request.keywords))
+    if not keywords:
+        raise HTTPException(status_code=400, detail="No keywords given")
+    if len(keywords) > MAX_COMPARED_KEYWORDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_COMPARED_KEYWORDS} keywords can be compared at once",
+        )
+    marketplace = compare_request.marketplace
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        with STAGE_SECONDS.time(stage="compare_statistics_snapshots"):
+            parts = []
+            stale = []
+            versions = get_keyword_versions(cursor, keywords, marketplace)
+            for keyword in keywords:
+                snapshot = metric_snapshots.load(
+                    keyword, marketplace, versions.get(keyword, 0)
+                )
+                if snapshot is None:
+                    stale.append(keyword)
+                    continue
+                columns = snapshot.columns
+                parts.append(
+                    (keyword, columns["prices"], columns["ratings"], columns["reviews"])
+                )
+        if stale:
+            with STAGE_SECONDS.time(stage="compare_statistics_query"):
+                cursor.execute(
+                    f"""
+                    SELECT keyword,
+                    CONCAT(REPLACE(
+                        REPLACE(price_whole, '\n', ''), ',', ''),
+                        '.', LPAD(price_fraction, 2, '0')) AS price,
+                    SUBSTRING_INDEX(rating, ' ', 1) as rating,
+                    REPLACE(reviews, ',', '') as reviews
+                    FROM products
+                    WHERE marketplace = %s
+                    AND keyword IN ({", ".join(["%s"] * len(stale))})
+                    """,
+                    (marketplace, *stale),
+                )
+                parts.extend(row_parts(cursor.fetchall()))
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    finally:
+        cursor.close()
+        conn.close()
+
+    with STAGE_SECONDS.time(stage="compare_statistics_compute"):
+        comparison = compare_columns(*merge_parts(parts))
+    comparison["missing"] = [
+        keyword for keyword in keywords if keyword not in comparison["keywords"]
+    ]
+    return comparison
+
+
+LEADERBOARD_SORTS = ("opportunity", "saturation")
+
+
+@app.get("/api/leaderboard")
+async def keyword_leaderboard(
+    marketplace: str = DEFAULT_MARKETPLACE,
+    sort: str = "opportunity",
+    min_products: int = Query(0, ge=0),
+    max_saturation: Optional[float] = Query(None, ge=0, le=1),
+    min_opportunity: Optional[float] = Query(None, ge=0, le=100),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Rank the scored keywords of a marketplace by opportunity or saturation,
+    highest first. The ranking is read from the keyword_scores table, whose
+    (marketplace, score) indexes serve the ordering without sorting.
+    """
+    if marketplace not in MARKETPLACES:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown marketplace '{marketplace}'."
+        )
+    if sort not in LEADERBOARD_SORTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort must be one of {', '.join(LEADERBOARD_SORTS)}",
+        )
+    # Keywords without products are stored with an empty score, not ranked
+    conditions = ["marketplace = %s", "product_count >= %s"]
+    params = [marketplace, max(min_products, 1)]
+    if max_saturation is not None:
+        conditions.append("saturation <= %s")
+        params.append(max_saturation)
+    if min_opportunity is not None:
+        conditions.append("opportunity >= %s")
+        params.append(min_opportunity)
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        with STAGE_SECONDS.time(stage="leaderboard_query"):
+            cursor.execute(
+                f"""
+                SELECT keyword, product_count, total_reviews, median_reviews,
+                review_hhi, price_cv, rating_std, average_price, average_rating,
+                saturation, opportunity, scored_at
+                FROM keyword_scores
+                WHERE {" AND ".join(conditions)}
+                ORDER BY {sort} DESC, keyword DESC
+                LIMIT %s OFFSET %s
+                """,
+                (*params, limit, offset),
+            )
+            rows = cursor.fetchall()
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    finally:
+        cursor.close()
+        conn.close()
+    return [
+        {**row, "scored_at": row["scored_at"].isoformat() if row["scored_at"] else None}
+        for row in rows
+    ]
+
+
+@app.get("/api/export")
+async def export_data(
+    user_id: str = Depends(get_current_user),
+    kind: str = "products",
+    file_format: str = Query("csv", alias="format"),
+    marketplace: str = DEFAULT_MARKETPLACE,
+    keywords: Optional[List[str]] = Query(None),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Stream the products or keyword statistics of a marketplace as CSV,
+    Parquet or Arrow, optionally restricted to stored keywords and to a
+    crawl time range [since, until). Rows are streamed from the database in
+    chunks, so exports of any size use the same memory.
+    """
+    if kind not in EXPORT_SCHEMAS:
+        raise HTTPException(
+            status_code=400, detail=f"kind must be one of {', '.join(EXPORT_SCHEMAS)}"
+        )
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}"
+        )
+    if marketplace not in MARKETPLACES:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown marketplace '{marketplace}'."
+        )
+    keywords = list(dict.fromkeys(keywords or []))
+    if len(keywords) > MAX_EXPORT_KEYWORDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_EXPORT_KEYWORDS} keywords can be exported at once",
+        )
+    logger.info("User %s exports %s as %s", user_id, kind, file_format)
+    try:
+        chunks = start_export(
+            get_db_connection(), kind, file_format, marketplace, keywords, since, until
+        )
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    media_type, extension = EXPORT_FORMATS[file_format]
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{kind}-{marketplace}.{extension}"'
+            )
+        },
+    )
+
+
 class NotificationRequest(BaseModel):
     """
     A model representing a notification request
@@ -688,6 +1640,8 @@ async def notify(notification: NotificationRequest):
     """
     sessionId = notification.sessionId
     message = notification.message
+    await refresh_product_index()
+    await asyncio.to_thread(refresh_keyword_matcher)
     if sessionId in connected_clients:
         logger.info("Notifying sessionId: %s with message: %s", sessionId, message)
         for websocket in connected_clients[sessionId]:
@@ -700,6 +1654,32 @@ async def notify(notification: NotificationRequest):
     return {"status": "error", "message": "No connected clients found."}
 
 
+class InvalidationRequest(BaseModel):
+    """
+    A model representing a worker's signal that the stored products of a
+    keyword changed
+    """
+
+    keyword: str
+    marketplace: Optional[str] = None
+
+
+@app.post("/api/invalidate")
+async def invalidate(invalidation: InvalidationRequest):
+    """
+    Drop the cached product responses of a keyword after the worker stored
+    it, and add the keyword to the keyword catalog or update its popularity
+    """
+    product_cache.invalidate(invalidation.keyword, invalidation.marketplace)
+    await refresh_keyword_catalog(invalidation.keyword, invalidation.marketplace)
+    logger.info(
+        "Invalidated cached products of keyword: %s (%s)",
+        invalidation.keyword,
+        invalidation.marketplace or "all marketplaces",
+    )
+    return {"status": "success"}
+
+
 connected_clients = {}
 
 
@@ -710,6 +1690,8 @@ async def websocket_endpoint(websocket: WebSocket, sessionId: str):
     store connected clients in the global 'connected_clients' dictionary.
     """
     await websocket.accept()
+    WEBSOCKET_CONNECTIONS.inc()
+    WEBSOCKET_ACTIVE.inc()
     if sessionId not in connected_clients:
         connected_clients[sessionId] = []
     if websocket not in connected_clients[sessionId]:
@@ -724,9 +1706,11 @@ async def websocket_endpoint(websocket: WebSocket, sessionId: str):
         if not connected_clients[sessionId]:
             del connected_clients[sessionId]
         logger.info("WebSocket connection for sessionId %s closed.", sessionId)
+    finally:
+        WEBSOCKET_ACTIVE.dec()
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,170 @@
+"""
+This module keeps a long-lived Chromium browser for the worker and hands
+out an isolated BrowserContext per crawl job, recycling the browser after
+a number of pages or once its memory grows past a limit.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "500"))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1500"))
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "false").lower() == "true"
+BROWSER_SLOW_MO_MS = int(os.getenv("BROWSER_SLOW_MO_MS", "1000"))
+
+
+def process_tree_rss(pid):
+    """Resident set size in bytes of the descendants of a process, Linux only"""
+    total = 0
+    pending = [pid]
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+            if current != pid:
+                with open(f"/proc/{current}/statm") as statm:
+                    total += int(statm.read().split()[1]) * page_size
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class BrowserPool:
+    """
+    Share one browser across crawl jobs. Each checkout gets a fresh context
+    with a random user agent; browsers past their page or memory budget are
+    retired once their last context is returned.
+    """
+
+    def __init__(
+        self,
+        user_agents,
+        max_pages=BROWSER_MAX_PAGES,
+        max_rss_mb=BROWSER_MAX_RSS_MB,
+        headless=BROWSER_HEADLESS,
+        slow_mo=BROWSER_SLOW_MO_MS,
+    ):
+        self.user_agents = user_agents
+        self.max_pages = max_pages
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.headless = headless
+        self.slow_mo = slow_mo
+        self._playwright = None
+        self._browser = None
+        self._pages = 0
+        self._active = {}
+        self._lock = None
+        self._checkout_seconds = []
+        self._checkouts = 0
+        self._launches = 0
+
+    @property
+    def lock(self):
+        """Lock guarding browser launches, created inside the running event loop"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _launch(self):
+        """Start playwright if needed and launch a new browser"""
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        for browser, active in list(self._active.items()):
+            if not active and not browser.is_connected():
+                del self._active[browser]
+        self._browser = await self._playwright.chromium.launch(
+            headless=self.headless, slow_mo=self.slow_mo
+        )
+        self._pages = 0
+        self._active[self._browser] = 0
+        self._launches += 1
+        logger.info("Launched browser #%s", self._launches)
+
+    def _count_page(self, _page):
+        self._pages += 1
+
+    def browser_rss(self):
+        """Resident memory of the browser processes started by this worker"""
+        return process_tree_rss(os.getpid())
+
+    def _needs_recycle(self):
+        return (
+            self._pages >= self.max_pages
+            or self.browser_rss() >= self.max_rss_bytes
+        )
+
+    @asynccontextmanager
+    async def context(self):
+        """Check out an isolated browser context for the duration of a job"""
+        start_time = time.perf_counter()
+        async with self.lock:
+            if self._browser is None or not self._browser.is_connected():
+                await self._launch()
+            browser = self._browser
+            self._active[browser] += 1
+        try:
+            context = await browser.new_context(user_agent=random.choice(self.user_agents))
+        except BaseException:
+            await self._release(browser)
+            raise
+        context.on("page", self._count_page)
+        self._checkouts += 1
+        self._checkout_seconds.append(time.perf_counter() - start_time)
+        del self._checkout_seconds[:-1000]
+        try:
+            yield context
+        finally:
+            try:
+                await context.close()
+            finally:
+                await self._release(browser)
+
+    async def _release(self, browser):
+        """Return a browser checkout and retire the browser if it is over budget"""
+        async with self.lock:
+            self._active[browser] -= 1
+            if browser is self._browser and self._needs_recycle():
+                logger.info(
+                    "Recycling browser after %s pages (%s bytes RSS)",
+                    self._pages,
+                    self.browser_rss(),
+                )
+                self._browser = None
+            if browser is not self._browser and not self._active[browser]:
+                del self._active[browser]
+                await browser.close()
+
+    def metrics(self):
+        """Checkout latency and browser memory statistics"""
+        latencies = sorted(self._checkout_seconds)
+        return {
+            "browser_launches": self._launches,
+            "browser_pages": self._pages,
+            "browser_rss_bytes": self.browser_rss(),
+            "context_checkouts": self._checkouts,
+            "context_checkout_seconds_avg": (
+                sum(latencies) / len(latencies) if latencies else 0.0
+            ),
+            "context_checkout_seconds_max": latencies[-1] if latencies else 0.0,
+        }
+
+    async def close(self):
+        """Close every browser and stop playwright"""
+        async with self.lock:
+            for browser in list(self._active):
+                await browser.close()
+            self._active.clear()
+            self._browser = None
+            self._lock = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
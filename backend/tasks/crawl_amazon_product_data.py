@@ -1,20 +1,49 @@
 """
 This module contains functions to crawl Amazon product data,
-batch store in database and return data to worker.
+batch store in database and return data to worker. Product pages are
+only opened by the deferred image enrichment step, after the search
+result data has been stored.
 """
 import asyncio
 import time
-import random
 import logging
 import os
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from urllib.parse import urlparse
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from mysql.connector import Error
 from dotenv import load_dotenv
-from backend.utils.utils import store_data, update_progress, get_progress
+from backend.utils.utils import (
+    store_data,
+    update_progress,
+    get_progress,
+    get_crawl_state,
+    save_crawl_state,
+    new_crawl_state,
+    get_stored_products,
+    update_product_metrics,
+    extract_asin,
+    get_products_missing_images,
+    store_product_images,
+    get_product_image_urls,
+    MARKETPLACES,
+    DEFAULT_MARKETPLACE,
+)
+from backend.tasks.browser_pool import BrowserPool
+from backend.tasks.pacing import PacingController, CrawlTimings, is_throttled
+from backend.tasks.http_fetcher import HttpFetcher, HTTP_FIRST
+from backend.tasks.rate_limiter import DomainRateLimiter
+from backend.utils.image_cache import ImageCache
+from backend.tasks.tracing import (
+    tracer,
+    traced,
+    current_span,
+    worker_registry,
+    ThroughputWindow,
+)
 
 load_dotenv()
 
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 # os.environ['PWDEBUG'] = '1'
 
@@ -38,15 +67,42 @@ user_agents = [
     ),
 ]
 
+browser_pool = BrowserPool(user_agents)
+http_fetcher = HttpFetcher(user_agents)
+rate_limiter = DomainRateLimiter()
+image_cache = ImageCache()
 
+ITEMS_PROCESSED = worker_registry.counter(
+    "crawler_items_total", "Search result items processed by outcome", ("outcome",)
+)
+ROWS_STORED = worker_registry.counter(
+    "crawler_rows_stored_total", "Product rows written to the database"
+)
+PAGES_CRAWLED = worker_registry.counter(
+    "crawler_pages_total", "Search result pages crawled", ("marketplace",)
+)
+stored_window = ThroughputWindow()
+worker_registry.add_collector(
+    lambda: [
+        (
+            "crawler_rows_stored_per_second",
+            "gauge",
+            "Product rows stored per second over the last minute",
+            stored_window.rate(),
+        )
+    ]
+)
+
+
+@traced("extract_product_images", "product_page_url")
 async def extract_product_images(context, product_page_url):
     """Extract product images from product page"""
+    current_span().set(source="http" if context is http_fetcher else "browser")
     product_page = await context.new_page()
     await product_page.goto(product_page_url, wait_until="domcontentloaded")
 
     try:
         await product_page.wait_for_selector("#imgTagWrapperId img", timeout=20000)
-        print("Main image loaded")
 
         main_image_element = await product_page.query_selector("#imgTagWrapperId img")
         main_image_url = (
@@ -63,6 +119,7 @@ async def extract_product_images(context, product_page_url):
             if img and await img.get_attribute("src") != main_image_url
         ]
         await product_page.close()
+        current_span().set(image_count=len(set(other_image_urls)) + 1)
         return main_image_url, list(set(other_image_urls))
     except PlaywrightTimeoutError:
         logger.error(f"Timeout waiting for the main image on {product_page_url}")
@@ -74,7 +131,24 @@ async def extract_product_images(context, product_page_url):
         return None, []
 
 
-async def extract_product_details(item):
+async def fetch_product_images(context, product_page_url):
+    """
+    Extract product images over plain HTTP first and fall back to the
+    browser context only when the static page lacks the main image
+    """
+    await rate_limiter.acquire(product_page_url)
+    if HTTP_FIRST:
+        main_image_url, other_image_urls = await extract_product_images(
+            http_fetcher, product_page_url
+        )
+        if main_image_url is not None:
+            return main_image_url, other_image_urls
+        logger.info(f"Falling back to browser for {product_page_url}")
+        await rate_limiter.acquire(product_page_url)
+    return await extract_product_images(context, product_page_url)
+
+
+async def extract_product_details(item, base_url=None):
     """Extract product details from an item element"""
     span_elements = await item.query_selector_all("h2 a span")
     title_parts = [
@@ -86,7 +160,7 @@ async def extract_product_details(item):
     link_element = await item.query_selector("h2 a")
     url = await link_element.get_attribute("href") if link_element else None
     if url and not url.startswith("http"):
-        url = f"https://www.amazon.com{url}"
+        url = f"{base_url or MARKETPLACES[DEFAULT_MARKETPLACE]}{url}"
 
     price_whole_element = await item.query_selector(".a-price-whole")
     price_whole = (
@@ -120,104 +194,228 @@ async def extract_product_details(item):
     return title, url, price_whole, price_fraction, rating, reviews
 
 
+async def extract_search_image(item):
+    """Extract the thumbnail shown for an item on the search result page"""
+    image_element = await item.query_selector("img.s-image")
+    return await image_element.get_attribute("src") if image_element else None
+
+
 def is_valid_product(details):
     """Check if product details are valid"""
     return all(details)
 
 
-async def process_item(item, context, keyword, batch_products):
-    """Process an individual item"""
-    details = await extract_product_details(item)
+@traced("process_item", "keyword")
+async def process_item(
+    item,
+    keyword,
+    batch_products,
+    seen_asins=None,
+    details=None,
+    marketplace=DEFAULT_MARKETPLACE,
+):
+    """
+    Process an individual item from the search result alone. Returns False
+    when the item is a product already seen in this crawl.
+    """
+    span = current_span()
+    if details is None:
+        details = await extract_product_details(item, MARKETPLACES[marketplace])
     if is_valid_product(details):
         title, url, price_whole, price_fraction, rating, reviews = details
-        try:
-            main_image_url, other_image_urls = await extract_product_images(
-                context, url
-            )
-            if main_image_url is not None:
-                other_images_url_str = ",".join(other_image_urls)
-                product_data = {
-                    "title": title,
-                    "price_whole": price_whole,
-                    "price_fraction": price_fraction,
-                    "rating": rating,
-                    "reviews": reviews,
-                    "keyword": keyword,
-                    "url": url,
-                    "mainImage_url": main_image_url,
-                    "otherImages_url": other_images_url_str,
-                }
-                print("Extracted product data: %s", product_data)
-                batch_products.append(product_data)
-            else:
-                print("skipping product at %s due to missing main image.", url)
-        except TimeoutError:
-            print(
-                "Timeout waiting for the main image on %s. Skipping this product.", url
-            )
+        asin = extract_asin(url)
+        span.set(asin=asin)
+        if seen_asins is not None and asin:
+            if asin in seen_asins:
+                logger.debug("Skipping duplicate product %s", asin)
+                span.set(outcome="duplicate")
+                ITEMS_PROCESSED.inc(outcome="duplicate")
+                return False
+            seen_asins.add(asin)
+        product_data = {
+            "title": title,
+            "price_whole": price_whole,
+            "price_fraction": price_fraction,
+            "rating": rating,
+            "reviews": reviews,
+            "keyword": keyword,
+            "url": url,
+            "mainImage_url": await extract_search_image(item),
+            "asin": asin,
+            "marketplace": marketplace,
+        }
+        logger.debug("Extracted product data: %s", product_data)
+        batch_products.append(product_data)
+        span.set(outcome="extracted")
+        ITEMS_PROCESSED.inc(outcome="extracted")
     else:
-        print("Invalid product details for item: %s", details)
+        logger.debug("Invalid product details for item: %s", details)
+        span.set(outcome="invalid")
+        ITEMS_PROCESSED.inc(outcome="invalid")
+    return True
 
 
-async def crawl_page(page, context, keyword: str, batch_size=2):
-    """Crawl a page for product information"""
+def store_batch(products, crawl_state=None):
+    """Store a batch of products in a store_data span"""
+    with tracer.span("store_data", rows=len(products)):
+        store_data(products, crawl_state=crawl_state)
+    ROWS_STORED.inc(len(products))
+    stored_window.add(len(products))
+
+
+@traced("crawl_page", "keyword")
+async def crawl_page(page, keyword: str, batch_size=2, state=None):
+    """
+    Crawl a page for product information, starting at the item offset of the
+    crawl state. The state is checkpointed together with every stored batch,
+    so a crawl that dies mid-page resumes after the last stored item.
+    """
+    if state is None:
+        state = new_crawl_state(keyword)
     items = await page.query_selector_all(".s-result-item")
     products = []
-    items_crawled = 0
+    items_crawled_before = state["items_crawled"]
+    items_stored_before = state["items_stored"]
+    marketplace = state.get("marketplace", DEFAULT_MARKETPLACE)
+    span = current_span()
+    span.set(
+        marketplace=marketplace,
+        page=state["current_page"],
+        items=len(items),
+        item_offset=state["item_offset"],
+    )
 
-    for item in items:
+    for index in range(state["item_offset"], len(items)):
         try:
-            await process_item(item, context, keyword, products)
-            items_crawled += 1
+            if await process_item(
+                items[index],
+                keyword,
+                products,
+                state["seen_asins"],
+                marketplace=marketplace,
+            ):
+                state["items_crawled"] += 1
             if len(products) >= batch_size:
-                store_data(products)
+                state["item_offset"] = index + 1
+                state["items_stored"] += len(products)
+                store_batch(products, crawl_state=state)
                 products = []
         except (AttributeError, TypeError, ValueError) as err:
-            print("Error processing item: %s", err)
+            logger.error("Error processing item: %s", err)
+            span.add("item_errors")
+    state["item_offset"] = len(items)
     if products:
-        store_data(products)
-    return items_crawled
-
-async def fetch_product_info(keyword: str, batch_size=2, min_items_to_store=80, max_retries=3):
-    """Fetch product information for a given keyword"""
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=False, slow_mo=1000)
-        context = await browser.new_context(user_agent=random.choice(user_agents))
+        state["items_stored"] += len(products)
+        store_batch(products, crawl_state=state)
+    PAGES_CRAWLED.inc(marketplace=marketplace)
+    span.set(
+        items_crawled=state["items_crawled"] - items_crawled_before,
+        items_stored=state["items_stored"] - items_stored_before,
+    )
+    return state["items_crawled"] - items_crawled_before
+
+
+async def is_complete_search_page(page, response, base_url=None):
+    """Check that a statically fetched search page holds valid result items"""
+    if response is None or response.status != 200 or is_throttled(page, response):
+        return False
+    for item in await page.query_selector_all(".s-result-item"):
+        if is_valid_product(await extract_product_details(item, base_url)):
+            return True
+    return False
+
+
+def base_url(url):
+    """Scheme and host of a URL, used to complete relative product links"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+async def load_search_page(page, url, pacing, timings):
+    """
+    Load a search result page, over plain HTTP first and in the browser page
+    when the static content is incomplete. Returns the page holding the
+    results, or None if the results never became ready. Every request waits
+    for a token of its marketplace domain first.
+    """
+    if HTTP_FIRST:
+        static_page = await http_fetcher.new_page()
+        with timings.measure("rate_limit"):
+            await rate_limiter.acquire(url)
+        with timings.measure("navigation"):
+            response = await static_page.goto(url)
+        if await is_complete_search_page(static_page, response, base_url(url)):
+            pacing.record(True)
+            with timings.measure("wait"):
+                await pacing.pause()
+            return static_page
+        logger.info(f"Falling back to browser for {url}")
+
+    with timings.measure("rate_limit"):
+        await rate_limiter.acquire(url)
+    with timings.measure("navigation"):
+        response = await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    with timings.measure("wait"):
+        ready = await pacing.settle(page, response)
+    return page if ready else None
+
+
+@traced("fetch_product_info", "keyword", "marketplace")
+async def fetch_product_info(
+    keyword: str,
+    batch_size=2,
+    min_items_to_store=80,
+    max_retries=3,
+    marketplace=DEFAULT_MARKETPLACE,
+):
+    """Fetch product information for a given keyword in a marketplace"""
+    async with browser_pool.context() as context:
         page = await context.new_page()
-        base_url = f"https://www.amazon.com/s?k={keyword}"
-        current_page = get_progress(keyword)
-        total_items_crawled = 0
+        search_url = f"{MARKETPLACES[marketplace]}/s?k={keyword}"
+        state = get_crawl_state(keyword, marketplace)
+        current_page = state["current_page"]
+        total_items_crawled = state["items_crawled"]
         retries = 0
+        pacing = PacingController()
+        timings = CrawlTimings()
 
         try:
             while True:
-                url = f"{base_url}&page={current_page}"
-                logger.debug(f"Navigating to URL: {url}")
+                url = f"{search_url}&page={current_page}"
+                logger.debug("Navigating to URL: %s", url)
                 try:
-                    await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+                    search_page = await load_search_page(page, url, pacing, timings)
                 except PlaywrightTimeoutError:
                     logger.error(f"Timeout navigating to URL: {url}")
+                    pacing.record(False)
+                    search_page = None
+                if search_page is None:
                     retries += 1
                     if retries >= max_retries:
                         logger.error("Max retries reached, exiting...")
                         break
                     continue
 
-                await page.wait_for_timeout(random.randint(3000, 10000))
-                items_crawled = await crawl_page(page, context, keyword, batch_size)
+                with timings.measure("extraction"):
+                    items_crawled = await crawl_page(
+                        search_page, keyword, batch_size, state
+                    )
                 total_items_crawled += items_crawled
-                update_progress(keyword, current_page)
+                if marketplace == DEFAULT_MARKETPLACE:
+                    update_progress(keyword, current_page)
+                state["current_page"] = current_page + 1
+                state["item_offset"] = 0
+                save_crawl_state(state)
 
                 if total_items_crawled >= min_items_to_store:
                     logger.info(f"Crawled {total_items_crawled} items, exceeding the threshold.")
                     break
 
                 try:
-                    next_button = await page.query_selector("a.s-pagination-next")
+                    next_button = await search_page.query_selector(
+                        "a.s-pagination-next"
+                    )
                     if next_button:
-                        await next_button.click()
-                        await page.wait_for_load_state("domcontentloaded")
-                        await page.wait_for_timeout(5000)
                         current_page += 1
                     else:
                         break
@@ -231,20 +429,188 @@ async def fetch_product_info(keyword: str, batch_size=2, min_items_to_store=80,
                 return total_items_crawled
             raise err
         finally:
-            await browser.close()
+            current_span().set(
+                items_crawled=total_items_crawled,
+                last_page=current_page,
+                retries=retries,
+                timings=timings.summary(),
+            )
+            logger.info(
+                f"Timing breakdown for {keyword} ({marketplace}): {timings.summary()}"
+            )
         return total_items_crawled
 
+
+METRIC_FIELDS = ("price_whole", "price_fraction", "rating", "reviews")
+
+
+def changed_metrics(stored, details):
+    """Return the product's new metrics if they differ from the stored ones"""
+    _, _, price_whole, price_fraction, rating, reviews = details
+    current = dict(zip(METRIC_FIELDS, (price_whole, price_fraction, rating, reviews)))
+    if all(str(stored[field]) == str(current[field]) for field in METRIC_FIELDS):
+        return None
+    return {"id": stored["id"], **current}
+
+
+async def refresh_page(
+    page,
+    keyword,
+    stored,
+    seen_asins,
+    batch_size=2,
+    marketplace=DEFAULT_MARKETPLACE,
+):
+    """
+    Refresh the products on a search result page. Known products are updated
+    in place and new products are stored, all from the search result alone.
+    Products are matched by ASIN, so items without one are skipped: they
+    would be stored again on every refresh.
+    """
+    items = await page.query_selector_all(".s-result-item")
+    updates = []
+    new_products = []
+    counts = {"updated": 0, "unchanged": 0, "new": 0, "skipped": 0}
+
+    for item in items:
+        try:
+            details = await extract_product_details(item, MARKETPLACES[marketplace])
+            if not is_valid_product(details):
+                continue
+            asin = extract_asin(details[1])
+            if asin is None:
+                counts["skipped"] += 1
+                continue
+            if asin in stored:
+                if asin in seen_asins:
+                    continue
+                seen_asins.add(asin)
+                update = changed_metrics(stored[asin], details)
+                if update:
+                    updates.append(update)
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+                continue
+            stored_before = len(new_products)
+            await process_item(
+                item, keyword, new_products, seen_asins, details, marketplace
+            )
+            counts["new"] += len(new_products) - stored_before
+            if len(new_products) >= batch_size:
+                store_batch(new_products)
+                new_products = []
+        except (AttributeError, TypeError, ValueError) as err:
+            logger.error("Error refreshing item: %s", err)
+
+    update_product_metrics(updates, keyword, marketplace)
+    if new_products:
+        store_batch(new_products)
+    return counts
+
+
+@traced("refresh_product_info", "keyword", "marketplace")
+async def refresh_product_info(
+    keyword: str, batch_size=2, max_retries=3, marketplace=DEFAULT_MARKETPLACE
+):
+    """
+    Revisit the search result pages already crawled for a keyword and
+    update stored products in place, crawling only products not seen before
+    """
+    stored = get_stored_products(keyword, marketplace)
+    if marketplace == DEFAULT_MARKETPLACE:
+        last_page = get_progress(keyword)
+    else:
+        last_page = get_crawl_state(keyword, marketplace)["current_page"] - 1
+    totals = {"updated": 0, "unchanged": 0, "new": 0, "skipped": 0}
+
+    async with browser_pool.context() as context:
+        page = await context.new_page()
+        search_url = f"{MARKETPLACES[marketplace]}/s?k={keyword}"
+        seen_asins = set()
+        pacing = PacingController()
+        timings = CrawlTimings()
+
+        for current_page in range(1, last_page + 1):
+            url = f"{search_url}&page={current_page}"
+            logger.debug("Refreshing URL: %s", url)
+            for attempt in range(1, max_retries + 1):
+                try:
+                    search_page = await load_search_page(page, url, pacing, timings)
+                    if search_page is not None:
+                        break
+                    logger.error(f"Results not ready or throttled on URL: {url}")
+                except PlaywrightTimeoutError:
+                    logger.error(f"Timeout navigating to URL: {url}")
+                    pacing.record(False)
+                if attempt == max_retries:
+                    logger.error("Max retries reached, exiting...")
+                    return totals
+            with timings.measure("extraction"):
+                counts = await refresh_page(
+                    search_page,
+                    keyword,
+                    stored,
+                    seen_asins,
+                    batch_size,
+                    marketplace,
+                )
+            for name, count in counts.items():
+                totals[name] += count
+        logger.info(f"Refreshed keyword {keyword}: {totals}, timings: {timings.summary()}")
+        return totals
+
+
+@traced("enrich_product_images", "keyword", "marketplace")
+async def enrich_product_images(keyword: str, marketplace=DEFAULT_MARKETPLACE, limit=None):
+    """
+    Deferred enrichment step: open the product page of every stored product
+    of a keyword that has no image rows yet and store its images. Returns
+    the number of products enriched.
+    """
+    products = get_products_missing_images(keyword, marketplace, limit)
+    if not products:
+        return 0
+    enriched = 0
+    timings = CrawlTimings()
+    async with browser_pool.context() as context:
+        for product in products:
+            with timings.measure("images"):
+                main_image_url, other_image_urls = await fetch_product_images(
+                    context, product["url"]
+                )
+            if main_image_url is None:
+                logger.info(f"No images found for product {product['id']}")
+                continue
+            store_product_images(product["id"], main_image_url, other_image_urls)
+            enriched += 1
+    logger.info(
+        f"Enriched images of {enriched}/{len(products)} products for {keyword} "
+        f"({marketplace}), timings: {timings.summary()}"
+    )
+    return enriched
+
+
+async def warm_thumbnails(keyword: str, marketplace=DEFAULT_MARKETPLACE):
+    """Generate the cached thumbnails of a keyword's products before the API is asked for them"""
+    urls = get_product_image_urls(keyword, marketplace)
+    warmed = await image_cache.warm(urls)
+    logger.info(f"Warmed {warmed}/{len(urls)} thumbnails for {keyword} ({marketplace})")
+    return warmed
+
+
 async def main():
     """Main function to run the keyword crawl"""
     keywords = []
     start_time = time.time()
     for keyword in keywords:
-        print("Crawling data on US Amazon website")
+        logger.info("Crawling data on US Amazon website")
         await fetch_product_info(keyword)
 
     end_time = time.time()
     elapsed_time = end_time - start_time
-    print("Crawling completed in %s seconds.", elapsed_time)
+    logger.info("Crawling completed in %s seconds.", elapsed_time)
+    tracer.flush()
 
 
 if __name__ == "__main__":
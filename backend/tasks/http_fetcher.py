@@ -0,0 +1,136 @@
+"""
+This module fetches pages over a pooled async HTTP client and parses them
+with selectolax. StaticPage and StaticElement mirror the small part of the
+Playwright page API the crawler uses, so the same extraction code and CSS
+selectors run against server-rendered HTML without launching a browser.
+"""
+import os
+import random
+import logging
+import httpx
+from selectolax.lexbor import LexborHTMLParser
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HTTP_FIRST = os.getenv("CRAWL_HTTP_FIRST", "true").lower() == "true"
+INNER_TEXT = "el => el.innerText"
+
+
+class StaticResponse:
+    """Status of a page fetched over HTTP"""
+
+    def __init__(self, status):
+        self.status = status
+
+
+class StaticElement:
+    """Read-only element handle over a parsed HTML node"""
+
+    def __init__(self, node):
+        self.node = node
+
+    async def query_selector(self, selector):
+        node = self.node.css_first(selector)
+        return StaticElement(node) if node is not None else None
+
+    async def query_selector_all(self, selector):
+        return [StaticElement(node) for node in self.node.css(selector)]
+
+    async def get_attribute(self, name):
+        return self.node.attributes.get(name)
+
+    async def inner_text(self):
+        return self.node.text()
+
+    async def evaluate(self, expression):
+        if expression != INNER_TEXT:
+            raise ValueError(f"Unsupported expression for static page: {expression}")
+        return self.node.text()
+
+
+class StaticPage:
+    """Page fetched over HTTP, supporting the navigation and query calls of the crawler"""
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+        self.url = ""
+        self.tree = LexborHTMLParser("")
+
+    def load_html(self, html, url=""):
+        """Load already fetched HTML into the page"""
+        self.url = url
+        self.tree = LexborHTMLParser(html)
+
+    async def goto(self, url, **_kwargs):
+        """Fetch a URL, returning None if the request failed"""
+        self.url = url
+        try:
+            response = await self.fetcher.get(url)
+        except httpx.HTTPError as err:
+            logger.warning("HTTP fetch failed for %s: %s", url, err)
+            self.tree = LexborHTMLParser("")
+            return None
+        self.url = str(response.url)
+        self.tree = LexborHTMLParser(response.text)
+        return StaticResponse(response.status_code)
+
+    async def query_selector(self, selector):
+        return await StaticElement(self.tree.root).query_selector(selector)
+
+    async def query_selector_all(self, selector):
+        return await StaticElement(self.tree.root).query_selector_all(selector)
+
+    async def wait_for_selector(self, selector, timeout=None, state=None):
+        """Static content never changes, so a missing selector fails immediately"""
+        element = await self.query_selector(selector)
+        if element is None:
+            raise PlaywrightTimeoutError(f"{selector} not present in static HTML")
+        return element
+
+    async def wait_for_load_state(self, state=None, timeout=None):
+        return None
+
+    async def close(self):
+        return None
+
+
+class HttpFetcher:
+    """Pooled async HTTP client presenting itself with one of the crawler user agents"""
+
+    def __init__(self, user_agents, max_connections=10, timeout=20.0, transport=None):
+        self.user_agents = user_agents
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.transport = transport
+        self._client = None
+
+    @property
+    def client(self):
+        """The shared client, created on first use inside the running event loop"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={
+                    "User-Agent": random.choice(self.user_agents),
+                    "Accept-Language": "en-US,en;q=0.9",
+                    "Accept": "text/html,application/xhtml+xml",
+                },
+                limits=httpx.Limits(max_connections=self.max_connections),
+                timeout=self.timeout,
+                follow_redirects=True,
+                transport=self.transport,
+            )
+        return self._client
+
+    async def get(self, url):
+        return await self.client.get(url)
+
+    async def new_page(self):
+        """Open a static page, mirroring BrowserContext.new_page"""
+        return StaticPage(self)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
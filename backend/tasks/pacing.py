@@ -0,0 +1,116 @@
+"""
+This module paces crawler navigation. Instead of fixed sleeps it waits for
+concrete readiness signals on the page, then adds a jitter budget that grows
+when errors or throttling are observed and shrinks again while requests succeed.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+from contextlib import contextmanager
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CRAWL_JITTER_MIN_MS = int(os.getenv("CRAWL_JITTER_MIN_MS", "500"))
+CRAWL_JITTER_MAX_MS = int(os.getenv("CRAWL_JITTER_MAX_MS", "2000"))
+RESULT_GRID_SELECTOR = "div.s-main-slot .s-result-item"
+THROTTLE_STATUSES = {429, 503}
+
+
+def is_throttled(page, response=None):
+    """Detect a throttling response or Amazon's robot check page"""
+    if response is not None and response.status in THROTTLE_STATUSES:
+        return True
+    return "validateCaptcha" in page.url
+
+
+class PacingController:
+    """
+    Adaptive wait policy for a crawl job. The jitter budget is multiplied
+    up on every error or throttle and decays back towards the base range
+    on success.
+    """
+
+    def __init__(
+        self,
+        min_ms=CRAWL_JITTER_MIN_MS,
+        max_ms=CRAWL_JITTER_MAX_MS,
+        backoff=2.0,
+        decay=0.8,
+        max_multiplier=16.0,
+    ):
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.backoff = backoff
+        self.decay = decay
+        self.max_multiplier = max_multiplier
+        self.multiplier = 1.0
+        self.successes = 0
+        self.failures = 0
+
+    def record(self, success):
+        """Adjust the jitter budget to the outcome of a request"""
+        if success:
+            self.successes += 1
+            self.multiplier = max(1.0, self.multiplier * self.decay)
+        else:
+            self.failures += 1
+            self.multiplier = min(self.max_multiplier, self.multiplier * self.backoff)
+
+    def jitter_seconds(self):
+        """Draw the next pause from the current jitter budget"""
+        return random.uniform(self.min_ms, self.max_ms) * self.multiplier / 1000
+
+    async def pause(self):
+        """Sleep for the current jitter budget"""
+        await asyncio.sleep(self.jitter_seconds())
+
+    async def wait_ready(self, page, selector=RESULT_GRID_SELECTOR, timeout=20000):
+        """
+        Wait until the selector is attached, then give the network a short
+        chance to go idle. Returns False if the page never became ready.
+        """
+        try:
+            await page.wait_for_selector(selector, state="attached", timeout=timeout)
+        except PlaywrightTimeoutError:
+            logger.warning("Timeout waiting for %s on %s", selector, page.url)
+            return False
+        try:
+            await page.wait_for_load_state("networkidle", timeout=3000)
+        except PlaywrightTimeoutError:
+            pass
+        return True
+
+    async def settle(self, page, response=None, selector=RESULT_GRID_SELECTOR):
+        """Wait for the page to be ready, record the outcome and add jitter"""
+        ready = not is_throttled(page, response) and await self.wait_ready(
+            page, selector
+        )
+        self.record(ready)
+        await self.pause()
+        return ready
+
+
+class CrawlTimings:
+    """Accumulate wall-clock time per crawl stage"""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def measure(self, stage):
+        """Add the duration of the enclosed block to a stage"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = (
+                self.seconds.get(stage, 0.0) + time.perf_counter() - start_time
+            )
+
+    def summary(self):
+        """Seconds per stage rounded for logging"""
+        return {stage: round(seconds, 3) for stage, seconds in self.seconds.items()}
@@ -0,0 +1,278 @@
+"""
+This module provides the task queue backends shared by the API and the
+worker. Every backend sends batches of message bodies and hands out messages
+shaped like SQS messages (Body, MessageId, ReceiptHandle, Attributes), so the
+worker code is the same whether it consumes from SQS, a SQLite file on a
+single node or an in-process queue in tests. Received messages stay invisible
+for a visibility timeout and reappear unless they are deleted.
+"""
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from collections import deque
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "sqs")
+QUEUE_SQLITE_PATH = os.getenv("QUEUE_SQLITE_PATH", "crawl_tasks.sqlite3")
+QUEUE_VISIBILITY_TIMEOUT = int(os.getenv("QUEUE_VISIBILITY_TIMEOUT", "900"))
+MAX_BATCH_SIZE = 10
+
+
+class QueueError(Exception):
+    """Raised when a backend cannot reach its queue"""
+
+
+class SQSBackend:
+    """Amazon SQS queue"""
+
+    def __init__(self, queue_url=None, client=None):
+        self.queue_url = queue_url or os.getenv("AWS_SQS_QUEUE_URL")
+        self.client = client or boto3.client(
+            "sqs",
+            region_name=os.getenv("AWS_REGION"),
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        )
+
+    def send_batch(self, bodies):
+        """Send up to 10 bodies, returning the indices that failed"""
+        try:
+            response = self.client.send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": str(index), "MessageBody": body}
+                    for index, body in enumerate(bodies)
+                ],
+            )
+        except (BotoCoreError, ClientError) as err:
+            raise QueueError(str(err)) from err
+        return [int(failed["Id"]) for failed in response.get("Failed", [])]
+
+    def receive(self, max_messages=10, wait_seconds=10):
+        """Receive up to max_messages, long polling for wait_seconds"""
+        try:
+            response = self.client.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=max_messages,
+                WaitTimeSeconds=wait_seconds,
+                AttributeNames=["SentTimestamp"],
+            )
+        except (BotoCoreError, ClientError) as err:
+            raise QueueError(str(err)) from err
+        return response.get("Messages", [])
+
+    def delete(self, receipt_handle):
+        """Delete a handled message"""
+        try:
+            self.client.delete_message(
+                QueueUrl=self.queue_url, ReceiptHandle=receipt_handle
+            )
+        except (BotoCoreError, ClientError) as err:
+            raise QueueError(str(err)) from err
+
+    def depth(self):
+        """Approximate number of messages waiting in the queue"""
+        try:
+            attributes = self.client.get_queue_attributes(
+                QueueUrl=self.queue_url,
+                AttributeNames=["ApproximateNumberOfMessages"],
+            )["Attributes"]
+        except (BotoCoreError, ClientError, KeyError) as err:
+            raise QueueError(str(err)) from err
+        return int(attributes["ApproximateNumberOfMessages"])
+
+
+def make_message(message_id, body, sent_at, receipt_handle):
+    """A message shaped like those SQS returns"""
+    return {
+        "MessageId": str(message_id),
+        "Body": body,
+        "ReceiptHandle": receipt_handle,
+        "Attributes": {"SentTimestamp": str(int(sent_at * 1000))},
+    }
+
+
+class MemoryBackend:
+    """In-process queue for tests and single-process deployments"""
+
+    def __init__(self, visibility_timeout=QUEUE_VISIBILITY_TIMEOUT, clock=time.time):
+        self.visibility_timeout = visibility_timeout
+        self.clock = clock
+        self.messages = deque()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.next_id = 1
+
+    def send_batch(self, bodies):
+        """Append the bodies to the queue; nothing fails in memory"""
+        with self.condition:
+            for body in bodies:
+                self.messages.append((self.next_id, body, self.clock()))
+                self.next_id += 1
+            self.condition.notify_all()
+        return []
+
+    def _requeue_expired(self):
+        """Make messages whose visibility timeout ran out visible again"""
+        now = self.clock()
+        for receipt, (deadline, message) in list(self.in_flight.items()):
+            if deadline <= now:
+                del self.in_flight[receipt]
+                self.messages.appendleft(message)
+
+    def receive(self, max_messages=10, wait_seconds=10):
+        """Receive up to max_messages, waiting up to wait_seconds for one"""
+        deadline = time.monotonic() + wait_seconds
+        with self.condition:
+            self._requeue_expired()
+            while not self.messages:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self.condition.wait(remaining)
+                self._requeue_expired()
+            received = []
+            while self.messages and len(received) < max_messages:
+                message = self.messages.popleft()
+                receipt = uuid.uuid4().hex
+                self.in_flight[receipt] = (self.clock() + self.visibility_timeout, message)
+                received.append(make_message(*message, receipt))
+            return received
+
+    def delete(self, receipt_handle):
+        """Delete a handled message"""
+        with self.lock:
+            self.in_flight.pop(receipt_handle, None)
+
+    def depth(self):
+        """Number of messages waiting in the queue"""
+        with self.lock:
+            return len(self.messages)
+
+
+class SQLiteBackend:
+    """Queue in a SQLite file, shared by an API and a worker on the same host"""
+
+    def __init__(
+        self,
+        path=QUEUE_SQLITE_PATH,
+        visibility_timeout=QUEUE_VISIBILITY_TIMEOUT,
+        poll_interval=0.2,
+    ):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        with self.connect() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    body TEXT NOT NULL,
+                    sent_at REAL NOT NULL,
+                    visible_at REAL NOT NULL,
+                    receipt TEXT
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_visible_at ON messages (visible_at)"
+            )
+
+    def connect(self):
+        """A connection per call, so the backend can be used from any thread"""
+        try:
+            return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        except sqlite3.Error as err:
+            raise QueueError(str(err)) from err
+
+    def send_batch(self, bodies):
+        """Insert the bodies in one transaction, returning the indices that failed"""
+        now = time.time()
+        connection = self.connect()
+        try:
+            connection.executemany(
+                "INSERT INTO messages (body, sent_at, visible_at) VALUES (?, ?, ?)",
+                [(body, now, now) for body in bodies],
+            )
+        except sqlite3.Error as err:
+            raise QueueError(str(err)) from err
+        finally:
+            connection.close()
+        return []
+
+    def _claim(self, max_messages):
+        """Atomically make up to max_messages visible messages invisible and return them"""
+        now = time.time()
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            rows = connection.execute(
+                "SELECT id, body, sent_at FROM messages WHERE visible_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (now, max_messages),
+            ).fetchall()
+            received = []
+            for message_id, body, sent_at in rows:
+                receipt = uuid.uuid4().hex
+                connection.execute(
+                    "UPDATE messages SET visible_at = ?, receipt = ? WHERE id = ?",
+                    (now + self.visibility_timeout, receipt, message_id),
+                )
+                received.append(make_message(message_id, body, sent_at, receipt))
+            connection.execute("COMMIT")
+            return received
+        except sqlite3.Error as err:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise QueueError(str(err)) from err
+        finally:
+            connection.close()
+
+    def receive(self, max_messages=10, wait_seconds=10):
+        """Receive up to max_messages, polling for up to wait_seconds"""
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            received = self._claim(max_messages)
+            if received or time.monotonic() >= deadline:
+                return received
+            time.sleep(self.poll_interval)
+
+    def delete(self, receipt_handle):
+        """Delete a handled message"""
+        connection = self.connect()
+        try:
+            connection.execute("DELETE FROM messages WHERE receipt = ?", (receipt_handle,))
+        except sqlite3.Error as err:
+            raise QueueError(str(err)) from err
+        finally:
+            connection.close()
+
+    def depth(self):
+        """Number of messages waiting in the queue"""
+        connection = self.connect()
+        try:
+            return connection.execute(
+                "SELECT COUNT(*) FROM messages WHERE visible_at <= ?", (time.time(),)
+            ).fetchone()[0]
+        except sqlite3.Error as err:
+            raise QueueError(str(err)) from err
+        finally:
+            connection.close()
+
+
+def create_queue_backend(name=QUEUE_BACKEND):
+    """Create the backend selected by QUEUE_BACKEND: sqs, sqlite or memory"""
+    if name == "sqs":
+        return SQSBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown queue backend: {name}")
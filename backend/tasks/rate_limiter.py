@@ -0,0 +1,78 @@
+"""
+This module limits the request rate of the crawler per marketplace domain.
+Each domain gets its own token bucket, so crawl jobs for different
+marketplaces run concurrently while every domain stays within its budget.
+"""
+import os
+import time
+import asyncio
+from urllib.parse import urlparse
+
+CRAWL_RATE_PER_DOMAIN = float(os.getenv("CRAWL_RATE_PER_DOMAIN", "1.0"))
+CRAWL_BURST_PER_DOMAIN = int(os.getenv("CRAWL_BURST_PER_DOMAIN", "3"))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at rate tokens per second up to capacity. Callers
+    reserve a token immediately and sleep until it is due, so concurrent
+    callers are served in order without a lock.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def reserve(self):
+        """Take a token and return the seconds until it is available"""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    async def acquire(self):
+        """Wait for a token, returning the seconds waited"""
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class DomainRateLimiter:
+    """Token bucket per domain, created on the first request to the domain"""
+
+    def __init__(self, rate=CRAWL_RATE_PER_DOMAIN, burst=CRAWL_BURST_PER_DOMAIN):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.requests = {}
+        self.wait_seconds = {}
+
+    def bucket(self, domain):
+        if domain not in self.buckets:
+            self.buckets[domain] = TokenBucket(self.rate, self.burst)
+        return self.buckets[domain]
+
+    async def acquire(self, url):
+        """Wait until a request to the domain of url is within its budget"""
+        domain = urlparse(url).netloc
+        waited = await self.bucket(domain).acquire()
+        self.requests[domain] = self.requests.get(domain, 0) + 1
+        self.wait_seconds[domain] = self.wait_seconds.get(domain, 0.0) + waited
+        return waited
+
+    def metrics(self):
+        """Requests and total throttling wait per domain"""
+        return {
+            domain: {
+                "requests": self.requests[domain],
+                "wait_seconds": round(self.wait_seconds[domain], 3),
+            }
+            for domain in self.requests
+        }
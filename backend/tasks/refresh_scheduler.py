@@ -0,0 +1,37 @@
+"""
+Enqueue refresh jobs for the keywords whose products are the stalest,
+so prices and review counts are kept current without full recrawls.
+
+Usage: python -m backend.tasks.refresh_scheduler --limit 10 --max-age-hours 24
+"""
+import argparse
+import logging
+from backend.utils.utils import get_stalest_keywords
+from backend.utils.migrations import migrate
+from backend.tasks.tasks import add_crawl_task
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def schedule_refreshes(limit=10, max_age_hours=24):
+    """Enqueue refresh jobs for the stalest keywords and return them"""
+    keywords = get_stalest_keywords(limit, max_age_hours)
+    for keyword, marketplace in keywords:
+        add_crawl_task(keyword, None, mode="refresh", marketplace=marketplace)
+    logger.info("Scheduled refresh for %s keywords", len(keywords))
+    return keywords
+
+
+def main():
+    """Parse command line arguments and schedule refresh jobs"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--max-age-hours", type=int, default=24)
+    args = parser.parse_args()
+    migrate()
+    schedule_refreshes(args.limit, args.max_age_hours)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Score the market saturation and opportunity of crawled keywords into the
+keyword_scores ranking table behind the leaderboard. Runs are incremental:
+only keywords whose data version moved past the version they were scored
+at are rescored, so the worker runs it after every crawl or refresh.
+
+Usage: python -m backend.tasks.score_keywords [--full] [--batch-size 200]
+"""
+import argparse
+import logging
+from mysql.connector import Error
+from backend.utils.utils import create_connection
+from backend.utils.keyword_stats import market_scores
+from backend.utils.migrations import migrate
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCORE_COLUMNS = (
+    "product_count",
+    "total_reviews",
+    "median_reviews",
+    "review_hhi",
+    "price_cv",
+    "rating_std",
+    "average_price",
+    "average_rating",
+    "saturation",
+    "opportunity",
+)
+
+
+def find_stale_keywords(cursor, full=False):
+    """
+    (keyword, marketplace, version) of stored keywords never scored or
+    scored at an older data version, or of all stored keywords when full
+    """
+    cursor.execute(
+        f"""
+        SELECT k.keyword, k.marketplace, COALESCE(v.version, 0)
+        FROM keywords k
+        LEFT JOIN keyword_versions v
+            ON v.keyword = k.keyword AND v.marketplace = k.marketplace
+        LEFT JOIN keyword_scores s
+            ON s.keyword = k.keyword AND s.marketplace = k.marketplace
+        {"" if full else "WHERE s.keyword IS NULL OR s.data_version < COALESCE(v.version, 0)"}
+        """
+    )
+    return cursor.fetchall()
+
+
+def fetch_keyword_rows(cursor, marketplace, keywords):
+    """(keyword, price, rating, reviews) rows of keywords in a marketplace"""
+    cursor.execute(
+        f"""
+        SELECT keyword,
+        CONCAT(REPLACE(
+            REPLACE(price_whole, '\n', ''), ',', ''),
+            '.', LPAD(price_fraction, 2, '0')) AS price,
+        SUBSTRING_INDEX(rating, ' ', 1) as rating,
+        REPLACE(reviews, ',', '') as reviews
+        FROM products
+        WHERE marketplace = %s AND keyword IN ({", ".join(["%s"] * len(keywords))})
+        """,
+        (marketplace, *keywords),
+    )
+    return cursor.fetchall()
+
+
+def empty_score(keyword):
+    """
+    The score of a keyword without any parseable product. Storing it records
+    the version the keyword was scored at and replaces its previous ranking.
+    """
+    return {"keyword": keyword, **{column: 0 for column in SCORE_COLUMNS}}
+
+
+def write_scores(cursor, marketplace, scores, versions):
+    """Upsert the scores of a batch of keywords with the version they were computed at"""
+    columns = ", ".join(SCORE_COLUMNS)
+    updates = ", ".join(f"{column} = VALUES({column})" for column in SCORE_COLUMNS)
+    cursor.executemany(
+        f"""
+        INSERT INTO keyword_scores
+            (keyword, marketplace, {columns}, data_version)
+        VALUES (%s, %s, {", ".join(["%s"] * len(SCORE_COLUMNS))}, %s)
+        ON DUPLICATE KEY UPDATE {updates}, data_version = VALUES(data_version)
+        """,
+        [
+            (
+                score["keyword"],
+                marketplace,
+                *(score[column] for column in SCORE_COLUMNS),
+                versions[score["keyword"]],
+            )
+            for score in scores
+        ],
+    )
+
+
+def score_keywords(full=False, batch_size=200):
+    """
+    Rescore stale keywords, or all of them when full, and return how many were
+    scored. Keywords without parseable products get an empty score.
+    """
+    connection = create_connection()
+    if not connection:
+        logger.error("Failed to connect to the database.")
+        return 0
+    cursor = connection.cursor()
+    scored = emptied = 0
+    try:
+        by_marketplace = {}
+        for keyword, marketplace, version in find_stale_keywords(cursor, full):
+            by_marketplace.setdefault(marketplace, {})[keyword] = version
+        for marketplace, versions in by_marketplace.items():
+            keywords = list(versions)
+            for start in range(0, len(keywords), batch_size):
+                batch = keywords[start : start + batch_size]
+                scores = market_scores(fetch_keyword_rows(cursor, marketplace, batch))
+                scored += len(scores)
+                found = {score["keyword"] for score in scores}
+                empty = [empty_score(keyword) for keyword in batch if keyword not in found]
+                emptied += len(empty)
+                write_scores(cursor, marketplace, scores + empty, versions)
+                connection.commit()
+        logger.info("Scored %s keywords, %s without products", scored, emptied)
+        return scored
+    except Error as err:
+        connection.rollback()
+        logger.error("Error scoring keywords: %s", err)
+        return scored
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def main():
+    """Parse command line arguments and score keywords"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument(
+        "--full", action="store_true", help="rescore every keyword, not only stale ones"
+    )
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+    migrate()
+    score_keywords(args.full, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,180 @@
 """
-This module handles the SQS configuration and job submission
+This module handles the task queue configuration and job submission. The
+API enqueues crawl tasks without blocking: tasks are buffered in memory and
+a background task sends them in batches of up to 10, a few milliseconds
+after the first task of a batch arrives. The queue itself is pluggable, see
+backend.tasks.queue_backends.
 """
 import os
 import json
+import asyncio
 import logging
-import boto3
 from dotenv import load_dotenv
+from backend.utils.metrics import CRAWL_TASKS
+from backend.tasks.queue_backends import (
+    QueueError,
+    MAX_BATCH_SIZE,
+    create_queue_backend,
+)
 
 load_dotenv()
 
-aws_sqs_queue_url = os.getenv("AWS_SQS_QUEUE_URL")
+QUEUE_FLUSH_MS = float(os.getenv("QUEUE_FLUSH_MS", "5"))
+QUEUE_MAX_RETRIES = int(os.getenv("QUEUE_MAX_RETRIES", "3"))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-sqs = boto3.client(
-    "sqs",
-    region_name=os.getenv("AWS_REGION"),
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-)
+queue_backend = create_queue_backend()
 
 
-def add_crawl_task(keyword, sessionId):
-    """send message to SQS queue"""
-    response = sqs.send_message(
-        QueueUrl=aws_sqs_queue_url,
-        MessageBody=json.dumps({"keyword": keyword, "sessionId": sessionId}),
+def task_body(keyword, sessionId, mode="crawl", marketplace="us"):
+    """JSON body of a task message"""
+    return json.dumps(
+        {
+            "keyword": keyword,
+            "sessionId": sessionId,
+            "mode": mode,
+            "marketplace": marketplace,
+        }
     )
-    logger.info("Message sent to SQS queue for keyword: %s", keyword)
-    logger.info("SQS Response: %s", response)
-    return response
+
+
+class TaskBatcher:
+    """
+    Buffer message bodies and send them to a queue backend in batches from a
+    background task. Entries the backend rejects are retried with
+    exponential backoff; every enqueue returns a future resolving to True
+    once its message is accepted, or False once it is given up on. The
+    events and the background task are created on first use, inside the
+    running event loop.
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_batch=MAX_BATCH_SIZE,
+        flush_interval=QUEUE_FLUSH_MS / 1000,
+        max_retries=QUEUE_MAX_RETRIES,
+        retry_delay=0.1,
+    ):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.buffer = []
+        self.batches_sent = 0
+        self.messages_sent = 0
+        self.messages_failed = 0
+        self._pending = None
+        self._full = None
+        self._task = None
+
+    def _start(self):
+        if self._task is None or self._task.done():
+            self._pending = asyncio.Event()
+            self._full = asyncio.Event()
+            if self.buffer:
+                self._pending.set()
+            self._task = asyncio.ensure_future(self._run())
+
+    def enqueue(self, body):
+        """Buffer a message body, returning a future of its delivery"""
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        self._add((body, future, 0))
+        return future
+
+    def _add(self, entry):
+        self.buffer.append(entry)
+        self._pending.set()
+        if len(self.buffer) >= self.max_batch:
+            self._full.set()
+
+    async def _run(self):
+        while True:
+            await self._pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        """Send everything buffered, one batch at a time"""
+        while self.buffer:
+            batch = self.buffer[: self.max_batch]
+            self.buffer = self.buffer[self.max_batch :]
+            await self._send(batch)
+        self._pending.clear()
+        self._full.clear()
+
+    async def _send(self, batch):
+        try:
+            failed = await asyncio.to_thread(
+                self.backend.send_batch, [body for body, _, _ in batch]
+            )
+        except Exception as err:
+            # Whatever the backend raised, keep the batch and retry its entries
+            logger.warning("Failed to send a batch of %s tasks: %s", len(batch), err)
+            failed = range(len(batch))
+        self.batches_sent += 1
+        failed = set(failed)
+        for index, (body, future, attempt) in enumerate(batch):
+            if index not in failed:
+                self.messages_sent += 1
+                if not future.done():
+                    future.set_result(True)
+            elif attempt < self.max_retries:
+                delay = self.retry_delay * 2 ** attempt
+                asyncio.get_running_loop().call_later(
+                    delay, self._add, (body, future, attempt + 1)
+                )
+            else:
+                self.messages_failed += 1
+                logger.error("Giving up on task after %s retries: %s", attempt, body)
+                if not future.done():
+                    future.set_result(False)
+
+    def metrics(self):
+        return {
+            "queue_batches_sent": self.batches_sent,
+            "queue_messages_sent": self.messages_sent,
+            "queue_messages_failed": self.messages_failed,
+            "queue_buffered": len(self.buffer),
+        }
+
+    async def close(self):
+        """Send the remaining buffered tasks and stop the background task"""
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+task_batcher = TaskBatcher(queue_backend)
+
+
+async def enqueue_crawl_task(keyword, sessionId, mode="crawl", marketplace="us"):
+    """
+    Buffer a task for the next batch without waiting for the queue; mode is
+    'crawl', 'refresh' or 'images'
+    """
+    task_batcher.enqueue(task_body(keyword, sessionId, mode, marketplace))
+    CRAWL_TASKS.inc(mode=mode)
+    logger.info("Task queued for keyword: %s", keyword)
+
+
+def add_crawl_task(keyword, sessionId, mode="crawl", marketplace="us"):
+    """Send a task right away, for callers outside an event loop such as the scheduler"""
+    failed = queue_backend.send_batch([task_body(keyword, sessionId, mode, marketplace)])
+    if failed:
+        raise QueueError(f"Queue rejected task for keyword: {keyword}")
+    CRAWL_TASKS.inc(mode=mode)
+    logger.info("Message sent to queue for keyword: %s", keyword)
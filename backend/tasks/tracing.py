@@ -0,0 +1,229 @@
+"""
+This module records tracing spans for the worker and crawler. A span
+measures one unit of work (a message, a page, an item), carries attributes
+such as keyword, page number and item counts, and links to its parent
+through a context variable, so nesting survives awaits. Finished spans are
+appended as JSON lines to a local file that a collector can tail, and their
+durations feed the worker's metrics registry.
+"""
+import os
+import json
+import time
+import uuid
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from backend.utils.metrics import MetricsRegistry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("traces", "worker.jsonl"))
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed unit of work with attributes, finished by its context manager"""
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, name, amount=1):
+        """Add to a numeric attribute, such as an item count"""
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_seconds": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class JsonLinesExporter:
+    """Buffer finished spans and append them to a file as JSON lines"""
+
+    def __init__(self, path=TRACE_FILE, flush_every=100):
+        self.path = path
+        self.flush_every = flush_every
+        self.buffer = []
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        with self.lock:
+            self.buffer.append(span.to_dict())
+            if len(self.buffer) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.path, "a", encoding="utf-8") as trace_file:
+                for record in self.buffer:
+                    trace_file.write(json.dumps(record, default=str) + "\n")
+        except OSError as err:
+            logger.error("Error writing spans to %s: %s", self.path, err)
+        self.buffer = []
+
+
+class NullExporter:
+    """Drop spans, used when tracing is disabled"""
+
+    def export(self, span):
+        pass
+
+    def flush(self):
+        pass
+
+
+class Tracer:
+    """Create nested spans, export them and observe their durations"""
+
+    def __init__(self, exporter, registry=None):
+        self.exporter = exporter
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.span_seconds = self.registry.histogram(
+            "worker_span_duration_seconds",
+            "Duration of worker and crawler spans",
+            ("span", "status"),
+            buckets=(
+                0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+            ),
+        )
+        self.span_errors = self.registry.counter(
+            "worker_span_errors_total", "Spans ended by an exception", ("span", "error")
+        )
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Run the enclosed block as a child of the current span"""
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        start_time = time.perf_counter()
+        try:
+            yield span
+        except BaseException as err:
+            span.status = "error"
+            span.error = type(err).__name__
+            self.span_errors.inc(span=name, error=span.error)
+            raise
+        finally:
+            span.duration = time.perf_counter() - start_time
+            _current_span.reset(token)
+            self.span_seconds.observe(span.duration, span=name, status=span.status)
+            self.exporter.export(span)
+
+    def flush(self):
+        self.exporter.flush()
+
+
+class ThroughputWindow:
+    """Count events over a sliding time window"""
+
+    def __init__(self, seconds=60, clock=time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.events = deque()
+
+    def add(self, count=1):
+        self.events.append((self.clock(), count))
+
+    def rate(self):
+        """Events per second over the window"""
+        horizon = self.clock() - self.seconds
+        while self.events and self.events[0][0] < horizon:
+            self.events.popleft()
+        return sum(count for _, count in self.events) / self.seconds
+
+
+worker_registry = MetricsRegistry()
+tracer = Tracer(
+    JsonLinesExporter() if TRACE_ENABLED else NullExporter(), worker_registry
+)
+
+
+def current_span():
+    """The innermost running span, or None outside any span"""
+    return _current_span.get()
+
+
+def traced(name, *argnames):
+    """
+    Decorator running every call of a coroutine function in a span, with the
+    named arguments as attributes. The function can add attributes to the
+    span through current_span().
+    """
+
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            attributes = {argname: bound.arguments[argname] for argname in argnames}
+            with tracer.span(name, **attributes):
+                return await function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def serve_metrics(registry=worker_registry, port=WORKER_METRICS_PORT):
+    """Serve the registry on /metrics from a background thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            payload = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving worker metrics on port %s", server.server_port)
+    return server
@@ -1,33 +1,69 @@
 """
-Process messages from the SQS queue and performs crawling operations,
+Process messages from the task queue (SQS, SQLite or in-memory) and performs crawling operations,
 including storing crawled data into database and delete message after it is processed successfully.
 """
 import os
 import json
+import time
 import logging
 import asyncio
 import requests
-import boto3
 from dotenv import load_dotenv
-from backend.utils.utils import keyword_exists, store_keyword
-from backend.tasks.crawl_amazon_product_data import fetch_product_info
+from backend.utils.utils import (
+    keyword_exists,
+    store_keyword,
+    mark_keyword_refreshed,
+    fetch_keyword_version,
+    MARKETPLACES,
+    DEFAULT_MARKETPLACE,
+)
+from backend.tasks.crawl_amazon_product_data import (
+    fetch_product_info,
+    refresh_product_info,
+    enrich_product_images,
+    warm_thumbnails,
+    image_cache,
+    browser_pool,
+    http_fetcher,
+    rate_limiter,
+)
+from backend.tasks.queue_backends import QueueError, create_queue_backend
+from backend.tasks.score_keywords import score_keywords
+from backend.utils.metric_snapshots import refresh_snapshot
+from backend.utils.migrations import migrate
+from backend.tasks.tracing import (
+    tracer,
+    traced,
+    current_span,
+    worker_registry,
+    serve_metrics,
+)
 
 
 load_dotenv()
 NOTIFY_URL = os.getenv("NOTIFY_URL")
 
-AWS_SQS_QUEUE_URL = os.getenv("AWS_SQS_QUEUE_URL")
 WEBSOCKET_URL = os.getenv("WEBSOCKET_URL")
+IMAGE_ENRICHMENT = os.getenv("CRAWL_IMAGE_ENRICHMENT", "true").lower() == "true"
+IMAGE_CACHE_WARM = os.getenv("IMAGE_CACHE_WARM", "true").lower() == "true"
+METRIC_SNAPSHOTS = os.getenv("METRIC_SNAPSHOTS", "true").lower() == "true"
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-sqs = boto3.client(
-    "sqs",
-    region_name=os.getenv("AWS_REGION"),
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+MESSAGES = worker_registry.counter(
+    "worker_messages_total", "Queue messages handled by mode and result", ("mode", "result")
+)
+QUEUE_LAG = worker_registry.histogram(
+    "worker_queue_lag_seconds",
+    "Time between a message being sent and received by the worker",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
 )
+QUEUE_DEPTH = worker_registry.gauge(
+    "worker_queue_depth", "Approximate number of messages waiting in the queue"
+)
+
+queue = create_queue_backend()
 
 
 async def notify_app(sessionId, keyword, status="completed", message=None):
@@ -45,26 +81,107 @@ async def notify_app(sessionId, keyword, status="completed", message=None):
         logger.error("Error notifying websocket server: %s", err)
 
 
+async def invalidate_app_cache(keyword, marketplace=None):
+    """Tell the API that the stored products of a keyword changed"""
+    try:
+        response = await asyncio.to_thread(
+            requests.post,
+            f"{NOTIFY_URL}/api/invalidate",
+            json={"keyword": keyword, "marketplace": marketplace},
+            timeout=5,
+        )
+        response.raise_for_status()
+    except requests.RequestException as err:
+        logger.error("Error invalidating cached products of %s: %s", keyword, err)
+
+
+async def process_images(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Fetch the product page images of a keyword's products lacking them"""
+    try:
+        enriched = await enrich_product_images(keyword, marketplace)
+    except Exception as err:
+        logger.error("Error enriching images for keyword %s: %s", keyword, err)
+        return False
+    logger.info("Enriched images of %s products for keyword %s", enriched, keyword)
+    if IMAGE_CACHE_WARM:
+        await process_thumbnails(keyword, marketplace)
+    return True
+
+
+async def process_thumbnails(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Warm the API's thumbnail cache with a keyword's product images"""
+    try:
+        await warm_thumbnails(keyword, marketplace)
+    except Exception as err:
+        logger.error("Error warming thumbnails for keyword %s: %s", keyword, err)
+
+
+async def process_new_products(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Deferred image work for products stored by a crawl or refresh"""
+    if IMAGE_ENRICHMENT:
+        await process_images(keyword, marketplace)
+    elif IMAGE_CACHE_WARM:
+        await process_thumbnails(keyword, marketplace)
+
+
+async def process_refresh(keyword, sessionId=None, marketplace=DEFAULT_MARKETPLACE):
+    """Refresh the stored products of an existing keyword"""
+    if not keyword_exists(keyword, marketplace):
+        logger.info("Keyword %s is not stored, nothing to refresh.", keyword)
+        return True
+    try:
+        totals = await refresh_product_info(keyword, marketplace=marketplace)
+    except Exception as err:
+        logger.error("Error refreshing keyword %s: %s", keyword, err)
+        return False
+    mark_keyword_refreshed(keyword, marketplace)
+    logger.info("Keyword %s refreshed: %s", keyword, totals)
+    if sessionId:
+        message = f"The refresh job for keyword '{keyword}' is completed."
+        await notify_app(sessionId, keyword, status="refreshed", message=message)
+    if totals["new"]:
+        await process_new_products(keyword, marketplace)
+    return True
+
+
+@traced("process_message")
 async def process_message(message):
     """Process a single SQS message"""
     body = json.loads(message["Body"])
     keyword = body.get("keyword")
     sessionId = body.get("sessionId")
-    logger.info("Processing keyword: %s for sessionId: %s", keyword, sessionId)
+    marketplace = body.get("marketplace", DEFAULT_MARKETPLACE)
+    current_span().set(
+        keyword=keyword,
+        mode=body.get("mode", "crawl"),
+        marketplace=marketplace,
+        message_id=message.get("MessageId"),
+    )
+    logger.info(
+        "Processing keyword: %s (%s) for sessionId: %s", keyword, marketplace, sessionId
+    )
+    if marketplace not in MARKETPLACES:
+        logger.error("Unknown marketplace %s, dropping message.", marketplace)
+        return True
+
+    if body.get("mode") == "refresh":
+        return await process_refresh(keyword, sessionId, marketplace)
+    if body.get("mode") == "images":
+        return await process_images(keyword, marketplace)
 
     if not sessionId:
         logger.error("Session ID is missing in the message.")
         return False
 
-    if not keyword_exists(keyword):
+    if not keyword_exists(keyword, marketplace):
         logger.info("Starting to fetch product info for keyword: %s", keyword)
         total_crawled_items = 0
         try:
             total_crawled_items = await fetch_product_info(
-                keyword, min_items_to_store=80
+                keyword, min_items_to_store=80, marketplace=marketplace
             )
             if total_crawled_items >= 80:
-                store_keyword(keyword)
+                store_keyword(keyword, marketplace)
                 logger.info("Keyword %s stored successfully.", keyword)
                 message = f"The crawling job for keyword '{keyword}' is completed successfully."
                 await notify_app(
@@ -73,6 +190,7 @@ async def process_message(message):
                 logger.info(
                     "Job crawling keyword: %s completed. User is informed.", keyword
                 )
+                await process_new_products(keyword, marketplace)
                 return True
             message = (
                 f"Failed to fetch sufficient product info for keyword '{keyword}'. Please try a valid keyword"
@@ -82,7 +200,7 @@ async def process_message(message):
             return False
         except Exception as err:
             if total_crawled_items >= 80:
-                store_keyword(keyword)
+                store_keyword(keyword, marketplace)
                 message = f"The crawling job for keyword '{keyword}' is completed with error: {err}"
                 await notify_app(sessionId, keyword, status="completed_with_errors", message=message)
                 logger.error(f"Error processing keyword {keyword}: {err}")
@@ -95,36 +213,127 @@ async def process_message(message):
         return True
 
 
+def message_marketplace(message):
+    """Marketplace a message targets, used to group messages into lanes"""
+    try:
+        return json.loads(message["Body"]).get("marketplace", DEFAULT_MARKETPLACE)
+    except (ValueError, AttributeError):
+        return DEFAULT_MARKETPLACE
+
+
+def message_mode(message):
+    """Mode of a message, "unknown" when its body cannot be parsed"""
+    try:
+        return json.loads(message["Body"]).get("mode", "crawl")
+    except (ValueError, AttributeError):
+        return "unknown"
+
+
+def message_keyword(message):
+    """Keyword of a message, None when its body cannot be parsed"""
+    try:
+        return json.loads(message["Body"]).get("keyword")
+    except (ValueError, AttributeError):
+        return None
+
+
+def record_queue_lag(message):
+    """Observe how long a message waited in the queue"""
+    sent = message.get("Attributes", {}).get("SentTimestamp")
+    if sent is not None:
+        QUEUE_LAG.observe(max(0.0, time.time() - int(sent) / 1000))
+
+
+async def record_queue_depth():
+    """Sample the approximate queue depth"""
+    try:
+        QUEUE_DEPTH.set(await asyncio.to_thread(queue.depth))
+    except QueueError as err:
+        logger.warning("Could not read queue depth: %s", err)
+
+
+async def handle_message(message):
+    """Process a message and delete it from the queue once handled"""
+    record_queue_lag(message)
+    keyword, marketplace = message_keyword(message), message_marketplace(message)
+    stores = message_mode(message) in ("crawl", "refresh", "images") and keyword
+    if stores:
+        version = await asyncio.to_thread(fetch_keyword_version, keyword, marketplace)
+    try:
+        success = await process_message(message)
+    except Exception:
+        MESSAGES.inc(mode=message_mode(message), result="error")
+        raise
+    finally:
+        # Crawls, refreshes and image enrichment store products batch by batch,
+        # bumping the keyword's data version, so once it moved the API's cached
+        # responses, the keyword's scores and its metric snapshot are stale
+        # whatever the outcome. The API reloads the keyword's popularity from
+        # its score on invalidation, so scoring comes first.
+        if stores:
+            stored = await asyncio.to_thread(fetch_keyword_version, keyword, marketplace)
+            if version is None or stored is None or stored != version:
+                await asyncio.to_thread(score_keywords)
+                await invalidate_app_cache(keyword, marketplace)
+                if METRIC_SNAPSHOTS:
+                    await asyncio.to_thread(refresh_snapshot, keyword, marketplace)
+    MESSAGES.inc(mode=message_mode(message), result="success" if success else "failure")
+    if success or "Keyword already exists" in message["Body"]:
+        await asyncio.to_thread(queue.delete, message["ReceiptHandle"])
+        logger.info("Message Processed and Deleted: %s", message["MessageId"])
+    else:
+        logger.error("Failed to process message: %s", message["MessageId"])
+
+
+async def process_lane(messages):
+    """Process the messages of one marketplace one after another"""
+    for message in messages:
+        await handle_message(message)
+
+
 async def process_sqs_messages():
     """
-    Continuously poll the SQS queue for messages, process messages,
-    delete successfully processed messages from the queue.
+    Continuously poll the task queue for messages, process messages,
+    delete successfully processed messages from the queue. Messages for
+    different marketplaces are processed concurrently, each marketplace
+    domain being paced by its own rate limit.
     """
     while True:
         logger.info("Polling for messages...")
 
-        response = sqs.receive_message(
-            QueueUrl=AWS_SQS_QUEUE_URL, MaxNumberOfMessages=10, WaitTimeSeconds=10
-        )
+        try:
+            messages = await asyncio.to_thread(queue.receive, 10, 10)
+        except QueueError as err:
+            logger.error("Error receiving messages: %s", err)
+            await asyncio.sleep(5)
+            continue
+        await record_queue_depth()
 
-        messages = response.get("Messages", [])
-        logger.info("Received %s messages from SQS queue.", len(messages))
+        logger.info("Received %s messages from the queue.", len(messages))
+        lanes = {}
         for message in messages:
-            success = await process_message(message)
-            if success or "Keyword already exists" in message["Body"]:
-                sqs.delete_message(
-                    QueueUrl=AWS_SQS_QUEUE_URL, ReceiptHandle=message["ReceiptHandle"]
-                )
-                logger.info("Message Processed and Deleted: %s", message["MessageId"])
-            else:
-                logger.error("Failed to process message: %s", message["MessageId"])
+            lanes.setdefault(message_marketplace(message), []).append(message)
+        await asyncio.gather(*(process_lane(lane) for lane in lanes.values()))
+        if messages:
+            tracer.flush()
+            logger.info("Browser pool metrics: %s", browser_pool.metrics())
+            logger.info("Rate limiter metrics: %s", rate_limiter.metrics())
+            logger.info("Image cache metrics: %s", image_cache.metrics())
 
 
 async def main():
     """
     Entry point for the asynchronous SQS message processing loop
     """
-    await process_sqs_messages()
+    migrate()
+    serve_metrics()
+    try:
+        await process_sqs_messages()
+    finally:
+        await browser_pool.close()
+        await http_fetcher.close()
+        await image_cache.close()
+        tracer.flush()
 
 
 if __name__ == "__main__":
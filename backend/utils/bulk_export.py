@@ -0,0 +1,282 @@
+"""
+Stream products or keyword statistics of a set of keywords as CSV, Parquet
+or Arrow IPC. Rows are read from an unbuffered cursor, so MySQL streams the
+result set and only one chunk of rows is held at a time whatever the size
+of the export. Each chunk gets typed columns (prices and ratings as floats,
+review counts as integers, crawl times as timestamps) and is written as one
+CSV block, Parquet row group or Arrow record batch.
+
+Usage: python -m backend.utils.bulk_export --format parquet --output products.parquet
+       [--kind products] [--marketplace us] [--keywords camera laptop]
+       [--since 2024-01-01] [--until 2024-02-01] [--chunk-size 50000]
+"""
+import io
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from mysql.connector import Error
+from backend.utils.utils import create_connection, DEFAULT_MARKETPLACE
+from backend.utils.migrations import migrate
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+MAX_EXPORT_KEYWORDS = 5000
+PARQUET_COMPRESSION = "zstd"
+
+# Column names and types of each export kind, in output order
+SCHEMAS = {
+    "products": pa.schema(
+        [
+            ("id", pa.int64()),
+            ("keyword", pa.string()),
+            ("marketplace", pa.string()),
+            ("asin", pa.string()),
+            ("title", pa.string()),
+            ("price", pa.float64()),
+            ("rating", pa.float64()),
+            ("reviews", pa.int64()),
+            ("url", pa.string()),
+            ("main_image_url", pa.string()),
+            ("crawled_at", pa.timestamp("ms")),
+        ]
+    ),
+    "statistics": pa.schema(
+        [
+            ("keyword", pa.string()),
+            ("marketplace", pa.string()),
+            ("product_count", pa.int64()),
+            ("total_reviews", pa.int64()),
+            ("median_reviews", pa.float64()),
+            ("review_hhi", pa.float64()),
+            ("price_cv", pa.float64()),
+            ("rating_std", pa.float64()),
+            ("average_price", pa.float64()),
+            ("average_rating", pa.float64()),
+            ("saturation", pa.float64()),
+            ("opportunity", pa.float64()),
+            ("scored_at", pa.timestamp("ms")),
+        ]
+    ),
+}
+
+# Table, select list and time column the date filters apply to, per kind
+QUERIES = {
+    "products": (
+        "products",
+        """
+        id, keyword, marketplace, asin, title,
+        CONCAT(REPLACE(
+            REPLACE(price_whole, '\n', ''), ',', ''),
+            '.', LPAD(price_fraction, 2, '0')) AS price,
+        SUBSTRING_INDEX(rating, ' ', 1) AS rating,
+        REPLACE(reviews, ',', '') AS reviews,
+        url, mainImage_url AS main_image_url, crawled_at
+        """,
+        "crawled_at",
+    ),
+    "statistics": (
+        "keyword_scores",
+        """
+        keyword, marketplace, product_count, total_reviews, median_reviews,
+        review_hhi, price_cv, rating_std, average_price, average_rating,
+        saturation, opportunity, scored_at
+        """,
+        "scored_at",
+    ),
+}
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def export_query(kind, marketplace, keywords=None, since=None, until=None):
+    """
+    SQL and parameters selecting the rows of an export kind in a marketplace,
+    restricted to keywords when given and to crawl (or scoring) times in
+    [since, until)
+    """
+    table, columns, time_column = QUERIES[kind]
+    conditions = ["marketplace = %s"]
+    params = [marketplace]
+    if keywords:
+        conditions.append(f"keyword IN ({', '.join(['%s'] * len(keywords))})")
+        params.extend(keywords)
+    if since is not None:
+        conditions.append(f"{time_column} >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append(f"{time_column} < %s")
+        params.append(until)
+    return (
+        f"SELECT {columns} FROM {table} WHERE {' AND '.join(conditions)}",
+        tuple(params),
+    )
+
+
+def to_frame(kind, rows):
+    """
+    A chunk of rows as a frame with the column types of the export kind.
+    Numbers that do not parse become nulls.
+    """
+    schema = SCHEMAS[kind]
+    frame = pd.DataFrame(rows, columns=schema.names)
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            frame[field.name] = pd.to_numeric(frame[field.name], errors="coerce").astype(
+                "Int64"
+            )
+        elif pa.types.is_floating(field.type):
+            frame[field.name] = pd.to_numeric(frame[field.name], errors="coerce").astype(
+                float
+            )
+        elif pa.types.is_timestamp(field.type):
+            frame[field.name] = pd.to_datetime(frame[field.name])
+    return frame
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file collecting what a writer produces until it is drained"""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        """Bytes written since the last drain"""
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def csv_chunks(kind, frames):
+    """CSV bytes of frames, the header first and then one block per frame"""
+    yield pd.DataFrame(columns=SCHEMAS[kind].names).to_csv(index=False).encode()
+    for frame in frames:
+        yield frame.to_csv(
+            index=False, header=False, date_format="%Y-%m-%dT%H:%M:%S"
+        ).encode()
+
+
+def arrow_chunks(kind, frames, file_format):
+    """Parquet or Arrow IPC stream bytes of frames, one row group or batch per frame"""
+    schema = SCHEMAS[kind]
+    sink = ChunkSink()
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression=PARQUET_COMPRESSION)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for frame in frames:
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def encode_frames(kind, frames, file_format):
+    if file_format == "csv":
+        return csv_chunks(kind, frames)
+    return arrow_chunks(kind, frames, file_format)
+
+
+def start_export(
+    connection,
+    kind,
+    file_format,
+    marketplace=DEFAULT_MARKETPLACE,
+    keywords=None,
+    since=None,
+    until=None,
+    chunk_size=EXPORT_CHUNK_ROWS,
+):
+    """
+    Run the export query and return a generator of the encoded export. The
+    query runs before the first chunk is requested so that database errors
+    surface to the caller; the generator closes the connection when done.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(*export_query(kind, marketplace, keywords, since, until))
+    except Error:
+        cursor.close()
+        connection.close()
+        raise
+    return stream_export(connection, cursor, kind, file_format, chunk_size)
+
+
+def stream_export(connection, cursor, kind, file_format, chunk_size):
+    frames = (
+        to_frame(kind, rows) for rows in iter(lambda: cursor.fetchmany(chunk_size), [])
+    )
+    try:
+        yield from encode_frames(kind, frames, file_format)
+    finally:
+        try:
+            cursor.close()
+        except Error:
+            # The reader stopped before the end and rows are still unread
+            pass
+        connection.close()
+
+
+def main():
+    """Parse command line arguments and write an export to a file or stdout"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--kind", choices=sorted(SCHEMAS), default="products")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--marketplace", default=DEFAULT_MARKETPLACE)
+    parser.add_argument("--keywords", nargs="+", help="stored keywords to export, all if omitted")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_ROWS)
+    parser.add_argument("--output", help="file to write, stdout if omitted")
+    args = parser.parse_args()
+    migrate()
+    connection = create_connection()
+    if not connection:
+        logger.error("Failed to connect to the database.")
+        sys.exit(1)
+    chunks = start_export(
+        connection,
+        args.kind,
+        args.format,
+        args.marketplace,
+        args.keywords,
+        args.since,
+        args.until,
+        args.chunk_size,
+    )
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
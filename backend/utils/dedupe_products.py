@@ -0,0 +1,134 @@
+"""
+One-shot tool that compacts duplicate product rows. It backfills the ASIN of
+every product from its URL, keeps the oldest row of each (keyword, marketplace,
+ASIN) triple,
+repoints saved lists to it, deletes the rest and adds the unique key that
+store_data relies on for upserts. The same steps run as a schema migration;
+the tool remains for reporting duplicates with --dry-run.
+
+Usage: python -m backend.utils.dedupe_products [--dry-run]
+"""
+import argparse
+import logging
+from mysql.connector import Error
+from backend.utils.utils import create_connection, extract_asin
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UNIQUE_KEY_NAME = "uq_products_keyword_marketplace_asin"
+LEGACY_UNIQUE_KEY_NAME = "uq_products_keyword_asin"
+
+
+def ensure_asin_column(cursor):
+    """Add the asin column to the products table if it does not exist yet"""
+    cursor.execute("SHOW COLUMNS FROM products LIKE 'asin'")
+    if cursor.fetchone() is None:
+        cursor.execute("ALTER TABLE products ADD COLUMN asin VARCHAR(10) NULL")
+        logger.info("Added asin column to products")
+
+
+def backfill_asins(cursor):
+    """Fill in the asin column of products stored before it existed"""
+    cursor.execute("SELECT id, url FROM products WHERE asin IS NULL")
+    updates = [
+        (asin, product_id)
+        for product_id, url in cursor.fetchall()
+        if (asin := extract_asin(url))
+    ]
+    if updates:
+        cursor.executemany("UPDATE products SET asin = %s WHERE id = %s", updates)
+    logger.info("Backfilled ASIN for %s products", len(updates))
+    return len(updates)
+
+
+def find_duplicates(cursor):
+    """Map each duplicate product id to the id of the row that is kept"""
+    cursor.execute(
+        "SELECT id, keyword, marketplace, asin FROM products "
+        "WHERE asin IS NOT NULL ORDER BY id"
+    )
+    kept = {}
+    duplicates = {}
+    for product_id, keyword, marketplace, asin in cursor.fetchall():
+        key = (keyword, marketplace, asin)
+        if key in kept:
+            duplicates[product_id] = kept[key]
+        else:
+            kept[key] = product_id
+    return duplicates
+
+
+def remove_duplicates(cursor, duplicates):
+    """Repoint saved lists to the kept rows and delete the duplicates"""
+    pairs = [(kept_id, duplicate_id) for duplicate_id, kept_id in duplicates.items()]
+    cursor.executemany(
+        "UPDATE IGNORE savedLists SET product_id = %s WHERE product_id = %s", pairs
+    )
+    ids = [(duplicate_id,) for duplicate_id in duplicates]
+    cursor.executemany("DELETE FROM savedLists WHERE product_id = %s", ids)
+    cursor.executemany("DELETE FROM products WHERE id = %s", ids)
+
+
+def ensure_unique_key(cursor):
+    """
+    Add the (keyword, marketplace, asin) unique key to the products table if
+    missing, replacing the single-marketplace key added by earlier runs
+    """
+    cursor.execute("SHOW INDEX FROM products WHERE Key_name = %s", (UNIQUE_KEY_NAME,))
+    if not cursor.fetchall():
+        cursor.execute(
+            f"ALTER TABLE products ADD UNIQUE KEY {UNIQUE_KEY_NAME} "
+            "(keyword, marketplace, asin)"
+        )
+        logger.info("Added unique key %s", UNIQUE_KEY_NAME)
+    cursor.execute(
+        "SHOW INDEX FROM products WHERE Key_name = %s", (LEGACY_UNIQUE_KEY_NAME,)
+    )
+    if cursor.fetchall():
+        cursor.execute(f"ALTER TABLE products DROP INDEX {LEGACY_UNIQUE_KEY_NAME}")
+        logger.info("Dropped unique key %s", LEGACY_UNIQUE_KEY_NAME)
+
+
+def compact_products(dry_run=False):
+    """Run the compaction and return the number of duplicate rows found"""
+    connection = create_connection()
+    if not connection:
+        logger.error("Failed to connect to the database.")
+        return None
+    cursor = connection.cursor()
+    try:
+        ensure_asin_column(cursor)
+        backfill_asins(cursor)
+        duplicates = find_duplicates(cursor)
+        logger.info("Found %s duplicate products", len(duplicates))
+        if dry_run:
+            connection.rollback()
+            return len(duplicates)
+        remove_duplicates(cursor, duplicates)
+        connection.commit()
+        ensure_unique_key(cursor)
+        return len(duplicates)
+    except Error as err:
+        connection.rollback()
+        logger.error("Error compacting products: %s", err)
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def main():
+    """Parse command line arguments and compact the products table"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="report duplicates without deleting them",
+    )
+    args = parser.parse_args()
+    compact_products(dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
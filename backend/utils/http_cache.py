@@ -0,0 +1,95 @@
+"""
+This module implements conditional GET and response compression for JSON
+endpoints. ETags are derived from the data version of a keyword, which the
+crawler bumps whenever it stores the keyword's products, so a revalidation
+needs a primary key lookup instead of the product query. Bodies above a
+size threshold are compressed with brotli or gzip, whichever the client
+prefers.
+"""
+import os
+import gzip
+import hashlib
+import brotli
+from fastapi import Response
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ENCODERS = {
+    "br": lambda body: brotli.compress(body, quality=BROTLI_QUALITY),
+    "gzip": lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+}
+
+
+def version_etag(resource, keyword, marketplace, version):
+    """Strong ETag of a resource of a keyword at a data version"""
+    digest = hashlib.sha1(
+        f"{resource}|{keyword}|{marketplace}|{version}".encode()
+    ).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header matches an ETag, using weak comparison"""
+    if not if_none_match or etag is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    The preferred encoding among br and gzip accepted by an Accept-Encoding
+    header, or None for an uncompressed response
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    wildcard = weights.get("*", 0.0)
+    best = None
+    for coding in ENCODERS:
+        quality = weights.get(coding, wildcard)
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (coding, quality)
+    return best[0] if best else None
+
+
+def encode_body(body, encoding):
+    return ENCODERS[encoding](body)
+
+
+def preferred_encoding(request, size):
+    """The encoding to send a body of size bytes in, None if not worth compressing"""
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    return negotiate_encoding(request.headers.get("accept-encoding"))
+
+
+def not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def json_response(body, etag=None, encoding=None):
+    """
+    A JSON response of an already serialized, and possibly encoded, body.
+    Clients must revalidate, which costs them a 304 while the data version
+    is unchanged.
+    """
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag is not None:
+        headers["ETag"] = etag
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
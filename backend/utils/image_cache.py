@@ -0,0 +1,250 @@
+"""
+This module keeps resized product thumbnails in a size-limited disk cache.
+Thumbnails are stored under the hash of their content, so identical images
+behind different URLs are kept once, and the hash doubles as a strong ETag.
+A small key file per (url, width) points at the thumbnail; evicting the
+least recently used thumbnails leaves those key files dangling, which reads
+treat as a miss. Both the API and the worker use the same directory, so the
+crawler can warm the cache for the API.
+"""
+import io
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+from PIL import Image
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join("cache", "images"))
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "512"))
+IMAGE_CACHE_WORKERS = int(os.getenv("IMAGE_CACHE_WORKERS", "2"))
+THUMBNAIL_WIDTHS = (160, 320, 640)
+DEFAULT_THUMBNAIL_WIDTH = 320
+THUMBNAIL_QUALITY = 85
+IMAGE_HOSTS = ("media-amazon.com", "ssl-images-amazon.com", "images-amazon.com")
+
+
+class ImageCacheError(Exception):
+    """Raised when an image cannot be fetched or decoded"""
+
+
+def is_allowed_image_url(url):
+    """Only proxy images served by Amazon's CDN"""
+    parsed = urlparse(url)
+    host = parsed.hostname or ""
+    return parsed.scheme in ("http", "https") and any(
+        host == allowed or host.endswith(f".{allowed}") for allowed in IMAGE_HOSTS
+    )
+
+
+def make_thumbnail(data, width, quality=THUMBNAIL_QUALITY):
+    """Resize an image to at most width pixels wide and encode it as JPEG"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+        return output.getvalue()
+
+
+def atomic_write(path, data):
+    """Write a file under a temporary name and move it into place"""
+    directory = os.path.dirname(path)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as output:
+            output.write(data)
+        os.replace(temporary, path)
+    except OSError:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+class ImageCache:
+    """
+    Disk cache of thumbnails with LRU eviction by file modification time.
+    Thumbnails are generated in a process pool so resizing never blocks the
+    event loop; concurrent requests for the same thumbnail share one fetch.
+    """
+
+    def __init__(
+        self,
+        directory=IMAGE_CACHE_DIR,
+        max_mb=IMAGE_CACHE_MAX_MB,
+        workers=IMAGE_CACHE_WORKERS,
+        executor=None,
+        transport=None,
+        timeout=20.0,
+    ):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.key_dir = os.path.join(directory, "keys")
+        self.max_bytes = max_mb * 1024 * 1024
+        self.workers = workers
+        self.transport = transport
+        self.timeout = timeout
+        self._executor = executor
+        self._client = None
+        self._size = None
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    @property
+    def client(self):
+        """The shared client, created on first use inside the running event loop"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout, follow_redirects=True, transport=self.transport
+            )
+        return self._client
+
+    def key_path(self, url, width):
+        key = hashlib.sha256(f"{url}|{width}".encode()).hexdigest()
+        return os.path.join(self.key_dir, key)
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.blob_dir, f"{content_hash}.jpg")
+
+    def size(self):
+        """Bytes of thumbnails on disk, scanned once and tracked afterwards"""
+        if self._size is None:
+            os.makedirs(self.blob_dir, exist_ok=True)
+            with os.scandir(self.blob_dir) as entries:
+                self._size = sum(
+                    entry.stat().st_size
+                    for entry in entries
+                    if entry.name.endswith(".jpg")
+                )
+        return self._size
+
+    def lookup(self, url, width):
+        """
+        Return (path, etag) of a cached thumbnail and mark it recently used,
+        or None on a miss
+        """
+        try:
+            with open(self.key_path(url, width), encoding="utf-8") as key_file:
+                content_hash = key_file.read().strip()
+            path = self.blob_path(content_hash)
+            os.utime(path)
+        except OSError:
+            return None
+        return path, f'"{content_hash}"'
+
+    async def get(self, url, width=DEFAULT_THUMBNAIL_WIDTH):
+        """Return (path, etag) of the thumbnail of url, generating it on a miss"""
+        cached = self.lookup(url, width)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        key = (url, width)
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self._generate(url, width))
+            self._pending[key].add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(self._pending[key])
+
+    async def _generate(self, url, width):
+        try:
+            response = await self.client.get(url)
+            response.raise_for_status()
+        except httpx.HTTPError as err:
+            raise ImageCacheError(f"Failed to fetch {url}: {err}") from err
+        loop = asyncio.get_running_loop()
+        try:
+            thumbnail = await loop.run_in_executor(
+                self.executor, make_thumbnail, response.content, width
+            )
+        except (OSError, ValueError, Image.DecompressionBombError) as err:
+            raise ImageCacheError(f"Failed to decode {url}: {err}") from err
+        return self.store(url, width, thumbnail)
+
+    def store(self, url, width, thumbnail):
+        """Write a thumbnail under its content hash and point the key at it"""
+        content_hash = hashlib.sha256(thumbnail).hexdigest()
+        path = self.blob_path(content_hash)
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.key_dir, exist_ok=True)
+        size = self.size()
+        if not os.path.exists(path):
+            atomic_write(path, thumbnail)
+            self._size = size + len(thumbnail)
+        atomic_write(self.key_path(url, width), content_hash.encode())
+        if self._size > self.max_bytes:
+            self.evict()
+        return path, f'"{content_hash}"'
+
+    def evict(self, target_ratio=0.9):
+        """Delete least recently used thumbnails until below target_ratio of the limit"""
+        with os.scandir(self.blob_dir) as entries:
+            blobs = sorted(
+                (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                for entry in entries
+                if entry.name.endswith(".jpg")
+            )
+        size = sum(blob_size for _, blob_size, _ in blobs)
+        target = self.max_bytes * target_ratio
+        for _, blob_size, path in blobs:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= blob_size
+            self.evictions += 1
+        self._size = size
+        logger.info("Evicted thumbnails down to %s bytes", size)
+
+    async def warm(self, urls, width=DEFAULT_THUMBNAIL_WIDTH, concurrency=8):
+        """Generate the thumbnails of urls ahead of the first request, returning how many succeeded"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm_one(url):
+            async with semaphore:
+                return await self.get(url, width)
+
+        results = await asyncio.gather(
+            *(warm_one(url) for url in set(urls) if is_allowed_image_url(url)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("Failed to warm thumbnail: %s", result)
+        return sum(not isinstance(result, Exception) for result in results)
+
+    def metrics(self):
+        """Hit ratio and disk usage of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "image_cache_hits": self.hits,
+            "image_cache_misses": self.misses,
+            "image_cache_hit_ratio": self.hits / lookups if lookups else 0.0,
+            "image_cache_evictions": self.evictions,
+            "image_cache_bytes": self.size(),
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
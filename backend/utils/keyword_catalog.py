@@ -0,0 +1,128 @@
+"""
+This module keeps the catalog of crawled keywords in memory, for membership
+tests during keyword validation and for type-ahead completion. Keywords are
+held as a sorted list of normalized keys, so the completions of a prefix are
+one contiguous range found by binary search, and a parallel array of
+popularity scores is ranked within that range with numpy.
+"""
+import bisect
+from array import array
+import numpy as np
+
+# Sorts after any character a keyword can continue a prefix with
+PREFIX_END = "\U0010ffff"
+
+
+def keyword_key(keyword):
+    """Lowercase a keyword and collapse its whitespace"""
+    return " ".join(keyword.lower().split())
+
+
+def prefix_key(prefix):
+    """Normalize a typed prefix like a keyword, keeping one trailing space"""
+    key = keyword_key(prefix)
+    return f"{key} " if key and prefix[-1:].isspace() else key
+
+
+class KeywordCatalog:
+    """
+    Sorted keys of known keywords with their popularity. Adding a keyword
+    inserts it in place, so the catalog can follow crawls one at a time.
+    Catalogs are not locked, so they must be changed on the thread reading them.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._popularity = array("d")
+        self._keywords = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, keyword):
+        return keyword_key(keyword) in self._keywords
+
+    def add(self, keyword, popularity=0.0):
+        """Add a keyword, or update the popularity of a known one; True when it is new"""
+        key = keyword_key(keyword)
+        if not key:
+            return False
+        index = bisect.bisect_left(self._keys, key)
+        if key in self._keywords:
+            self._popularity[index] = popularity
+            return False
+        self._keys.insert(index, key)
+        self._popularity.insert(index, popularity)
+        self._keywords[key] = keyword
+        return True
+
+    def add_many(self, rows):
+        """
+        Add (keyword, popularity) rows, sorting the keys once rather than
+        inserting them one by one, and return how many keywords were new
+        """
+        popularity = dict(zip(self._keys, self._popularity))
+        added = 0
+        for keyword, score in rows:
+            key = keyword_key(keyword)
+            if not key:
+                continue
+            if key not in self._keywords:
+                self._keywords[key] = keyword
+                added += 1
+            popularity[key] = score
+        self._keys = sorted(popularity)
+        self._popularity = array("d", (popularity[key] for key in self._keys))
+        return added
+
+    def complete(self, prefix, limit=10):
+        """
+        The most popular keywords starting with a prefix, as (keyword,
+        popularity) pairs, ties in alphabetical order
+        """
+        key = prefix_key(prefix)
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_left(self._keys, key + PREFIX_END, start)
+        if start == end or limit < 1:
+            return []
+        # The view pins the array's buffer, so it must not outlive this call
+        scores = np.frombuffer(self._popularity, dtype=np.float64)[start:end]
+        # Positions in the range follow the keys, so sorting by (-score,
+        # position) puts ties in alphabetical order
+        top = np.lexsort((np.arange(len(scores)), -scores))[:limit]
+        completions = [
+            (self._keywords[self._keys[start + index]], float(scores[index]))
+            for index in top.tolist()
+        ]
+        del scores
+        return completions
+
+
+def load_keyword_rows(connection, keyword=None, marketplace=None):
+    """
+    (keyword, marketplace, popularity) of the stored keywords, optionally of
+    one keyword and marketplace. Popularity is the total review count of the
+    keyword's products as last scored, 0 for keywords not scored yet.
+    """
+    conditions, params = [], []
+    if keyword is not None:
+        conditions.append("k.keyword = %s")
+        params.append(keyword)
+    if marketplace is not None:
+        conditions.append("k.marketplace = %s")
+        params.append(marketplace)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"""
+            SELECT k.keyword, k.marketplace, COALESCE(s.total_reviews, 0)
+            FROM keywords k
+            LEFT JOIN keyword_scores s
+                ON s.keyword = k.keyword AND s.marketplace = k.marketplace
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            """,
+            params,
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
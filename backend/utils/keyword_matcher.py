@@ -0,0 +1,119 @@
+"""
+This module provides nearest-neighbour matching of search keywords against
+the keywords that have already been crawled, so that close variants can
+reuse an existing crawl instead of enqueueing a new one.
+"""
+import zlib
+from difflib import get_close_matches
+import numpy as np
+
+DEFAULT_DIMENSIONS = 512
+WORD_MATCH_CUTOFF = 0.85
+
+
+def hashed_ngram_vector(text, dimensions=DEFAULT_DIMENSIONS, ngram_size=3):
+    """
+    Embed text as a unit vector of hashed character n-grams and whole words,
+    a lightweight local embedding that needs no model download.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    words = text.lower().split()
+    for word in words:
+        vector[zlib.crc32(f"w:{word}".encode()) % dimensions] += 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - ngram_size + 1):
+            ngram = padded[i:i + ngram_size]
+            vector[zlib.crc32(ngram.encode()) % dimensions] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def same_words(query, keyword, cutoff=WORD_MATCH_CUTOFF, similar_words=None):
+    """
+    Whether two keywords are made of the same words up to spelling or, given
+    similar_words, meaning: as many words, each with a counterpart in the
+    other at least cutoff similar in spelling or that similar_words accepts.
+    Plurals, typos, synonyms and word order pass; a narrower niche, such as
+    "laptop stand" for "laptop", does not.
+    """
+    query_words = query.lower().split()
+    keyword_words = keyword.lower().split()
+    if len(query_words) != len(keyword_words):
+        return False
+    pairs = ((query_words, keyword_words), (keyword_words, query_words))
+    return all(
+        get_close_matches(word, others, n=1, cutoff=cutoff)
+        or (similar_words and any(similar_words(word, other) for other in others))
+        for words, others in pairs
+        for word in words
+    )
+
+
+class KeywordMatcher:
+    """
+    Keep one embedding row per known keyword and answer top-k cosine
+    similarity lookups with a single matrix-vector product. With word
+    vectors, embed keywords by meaning and pass similar_words, a predicate
+    telling whether two words mean the same, so synonyms match too.
+    """
+
+    def __init__(self, embed=hashed_ngram_vector, similar_words=None):
+        self.embed = embed
+        self.similar_words = similar_words
+        self._keywords = []
+        self._known = set()
+        self._vectors = []
+        self._matrix = None
+
+    def __len__(self):
+        return len(self._keywords)
+
+    def __contains__(self, keyword):
+        return keyword.lower() in self._known
+
+    def add(self, keyword):
+        """Add a keyword to the matcher, ignoring ones already known"""
+        key = keyword.lower()
+        if not key.strip() or key in self._known:
+            return False
+        vector = np.asarray(self.embed(key), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        self._keywords.append(keyword)
+        self._known.add(key)
+        self._vectors.append(vector / norm if norm else vector)
+        self._matrix = None
+        return True
+
+    def add_many(self, keywords):
+        """Add several keywords and return how many were new"""
+        return sum(1 for keyword in keywords if self.add(keyword))
+
+    def top_k(self, query, k=5):
+        """Return up to k (keyword, similarity) pairs ordered by similarity"""
+        if not self._keywords or not query.strip():
+            return []
+        if self._matrix is None:
+            self._matrix = np.vstack(self._vectors)
+        vector = np.asarray(self.embed(query.lower()), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return []
+        similarities = self._matrix @ (vector / norm)
+        k = min(k, len(self._keywords))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return [(self._keywords[i], float(similarities[i])) for i in top]
+
+    def matches(self, query, threshold, k=5):
+        """
+        Return the top-k matches whose similarity reaches the threshold and
+        that are made of the same words as the query, see same_words.
+        Keyword similarity alone also matches distinct niches sharing most of
+        their letters or their topic, such as "laptop stand" and "laptop".
+        """
+        return [
+            (keyword, similarity)
+            for keyword, similarity in self.top_k(query, k)
+            if similarity >= threshold
+            and same_words(query, keyword, similar_words=self.similar_words)
+        ]
@@ -0,0 +1,226 @@
+"""
+This module computes product statistics of many keywords at once. Rows of
+all keywords are turned into numpy arrays, or taken as arrays from their
+metric snapshots, and every statistic is computed in one pass grouped by
+keyword with bincount: comparisons on bin edges shared by all keywords so
+their distributions line up, and the market saturation and opportunity
+scores of the keyword leaderboard.
+"""
+import numpy as np
+import pandas as pd
+
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+
+def calculate_bins(data, num_bins=10, round_up=False):
+    """Bin edges with integer steps covering the data"""
+    min_val = np.floor(np.min(data)) if not round_up else np.ceil(np.min(data))
+    max_val = np.ceil(np.max(data)) + 1e-6
+    step = np.ceil((max_val - min_val) / num_bins)
+    bins = np.arange(min_val, max_val + step, step)
+    return bins
+
+
+def bin_labels(bins, prefix=""):
+    return [
+        f"{prefix}{int(bins[i])}-{prefix}{int(bins[i + 1])}" for i in range(len(bins) - 1)
+    ]
+
+
+def grouped_histogram(codes, values, bins, groups):
+    """
+    Count values per group in the half-open intervals [bins[i], bins[i+1]),
+    as a (groups, len(bins) - 1) array; values outside the edges are ignored
+    """
+    width = len(bins) - 1
+    index = np.searchsorted(bins, values, side="right") - 1
+    inside = (index >= 0) & (index < width)
+    counts = np.bincount(
+        codes[inside] * width + index[inside], minlength=groups * width
+    )
+    return counts.reshape(groups, width)
+
+
+def parse_rows(rows):
+    """
+    Keyword codes, the sorted unique keywords and float arrays of price,
+    rating and reviews of (keyword, price, rating, reviews) rows, skipping
+    rows whose values do not parse
+    """
+    frame = pd.DataFrame(rows, columns=["keyword", "price", "rating", "reviews"])
+    for column in ("price", "rating", "reviews"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    frame = frame.dropna()
+    keywords, codes = np.unique(frame["keyword"].to_numpy(dtype=str), return_inverse=True)
+    return (
+        keywords,
+        codes,
+        frame["price"].to_numpy(dtype=float),
+        frame["rating"].to_numpy(dtype=float),
+        frame["reviews"].to_numpy(dtype=float),
+    )
+
+
+def row_parts(rows):
+    """
+    (keyword, prices, ratings, reviews) parts of (keyword, price, rating,
+    reviews) rows, one per keyword, skipping rows whose values do not parse
+    """
+    keywords, codes, *columns = parse_rows(rows)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.cumsum(np.bincount(codes, minlength=len(keywords)))[:-1]
+    split = [np.split(values[order], bounds) for values in columns]
+    return list(zip(keywords.tolist(), *split))
+
+
+def merge_parts(parts):
+    """
+    Keyword codes, the sorted keywords and value arrays of (keyword, prices,
+    ratings, reviews) parts, as parse_rows returns them for rows
+    """
+    parts = sorted((part for part in parts if len(part[1])), key=lambda part: part[0])
+    keywords = np.array([part[0] for part in parts], dtype=str)
+    codes = np.repeat(np.arange(len(parts)), [len(part[1]) for part in parts])
+    columns = [
+        np.concatenate([np.asarray(part[index], dtype=float) for part in parts])
+        if parts
+        else np.zeros(0)
+        for index in (1, 2, 3)
+    ]
+    return (keywords, codes, *columns)
+
+
+def compare_statistics(rows, num_bins=10):
+    """
+    Statistics of (keyword, price, rating, reviews) rows for each keyword.
+    Rows whose values do not parse are skipped. Returns the shared price and
+    review bin labels and, per keyword, its averages and distributions
+    aligned on those labels.
+    """
+    return compare_columns(*parse_rows(rows), num_bins=num_bins)
+
+
+def compare_columns(keywords, codes, prices, ratings, reviews, num_bins=10):
+    """compare_statistics of keyword codes and value arrays shaped like parse_rows"""
+    groups = len(keywords)
+    if not groups:
+        return {"price_bins": [], "review_bins": [], "keywords": {}}
+
+    counts = np.bincount(codes, minlength=groups)
+    price_sums = np.bincount(codes, weights=prices, minlength=groups)
+    rating_sums = np.bincount(codes, weights=ratings, minlength=groups)
+    review_sums = np.bincount(codes, weights=reviews, minlength=groups)
+    price_min = np.full(groups, np.inf)
+    np.minimum.at(price_min, codes, prices)
+    price_max = np.full(groups, -np.inf)
+    np.maximum.at(price_max, codes, prices)
+
+    price_bins = calculate_bins(prices, num_bins, round_up=True)
+    review_bins = calculate_bins(reviews, num_bins, round_up=True)
+    price_histogram = grouped_histogram(codes, prices, price_bins, groups)
+    review_histogram = grouped_histogram(codes, reviews, review_bins, groups)
+    rating_histogram = np.stack(
+        [np.bincount(codes[ratings == value], minlength=groups) for value in RATING_VALUES],
+        axis=1,
+    )
+
+    return {
+        "price_bins": bin_labels(price_bins, "$"),
+        "review_bins": bin_labels(review_bins),
+        "keywords": {
+            keyword: {
+                "seller_count": int(counts[index]),
+                "price_range": (float(price_min[index]), float(price_max[index])),
+                "average_price": float(price_sums[index] / counts[index]),
+                "average_rating": float(rating_sums[index] / counts[index]),
+                "average_reviews": float(review_sums[index] / counts[index]),
+                "price_range_distribution": price_histogram[index].tolist(),
+                "review_range_distribution": review_histogram[index].tolist(),
+                "rating_distribution": dict(
+                    zip(map(str, RATING_VALUES), rating_histogram[index].tolist())
+                ),
+            }
+            for index, keyword in enumerate(keywords.tolist())
+        },
+    }
+
+
+def grouped_median(codes, values, groups):
+    """Median of values per group, for groups with at least one value"""
+    order = np.lexsort((values, codes))
+    counts = np.bincount(codes, minlength=groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ordered = values[order]
+    lower = ordered[np.minimum(starts + (counts - 1) // 2, len(ordered) - 1)]
+    upper = ordered[np.minimum(starts + counts // 2, len(ordered) - 1)]
+    return (lower + upper) / 2
+
+
+def grouped_std(codes, values, counts):
+    """Population standard deviation of values per group"""
+    groups = len(counts)
+    means = np.bincount(codes, weights=values, minlength=groups) / counts
+    squares = np.bincount(codes, weights=values * values, minlength=groups) / counts
+    return np.sqrt(np.maximum(squares - means * means, 0.0)), means
+
+
+def market_scores(rows):
+    """
+    Saturation and opportunity of every keyword of (keyword, price, rating,
+    reviews) rows, in one pass grouped by keyword. The scores use absolute
+    scales rather than ranks among keywords, so a keyword can be rescored on
+    its own when its products change.
+
+    - saturation (0 to 1) grows with the median review count of the listed
+      products (how entrenched incumbents are), the concentration of reviews
+      on few products (Herfindahl index of review shares) and the average
+      rating (how well buyers are already served).
+    - opportunity (0 to 100) is demand, the total review count on a log
+      scale, discounted by saturation and raised by price dispersion and
+      rating spread, which leave room to differentiate.
+
+    Returns a list of dicts, one per keyword.
+    """
+    keywords, codes, prices, ratings, reviews = parse_rows(rows)
+    groups = len(keywords)
+    if not groups:
+        return []
+    counts = np.bincount(codes, minlength=groups).astype(float)
+    total_reviews = np.bincount(codes, weights=reviews, minlength=groups)
+    shares = np.divide(
+        reviews,
+        total_reviews[codes],
+        out=np.zeros_like(reviews),
+        where=total_reviews[codes] > 0,
+    )
+    review_hhi = np.bincount(codes, weights=shares * shares, minlength=groups)
+    median_reviews = grouped_median(codes, reviews, groups)
+    price_std, average_price = grouped_std(codes, prices, counts)
+    rating_std, average_rating = grouped_std(codes, ratings, counts)
+    price_cv = np.divide(
+        price_std, average_price, out=np.zeros(groups), where=average_price > 0
+    )
+
+    demand = np.clip(np.log10(1 + total_reviews) / 6, 0, 1)
+    incumbency = np.clip(np.log10(1 + median_reviews) / 4, 0, 1)
+    quality = np.clip((average_rating - 1) / 4, 0, 1)
+    saturation = 0.5 * incumbency + 0.3 * review_hhi + 0.2 * quality
+    differentiation = (np.clip(price_cv, 0, 1) + np.clip(rating_std / 2, 0, 1)) / 2
+    opportunity = 100 * demand * (1 - saturation) * (0.75 + 0.25 * differentiation)
+
+    columns = {
+        "product_count": counts.astype(int),
+        "total_reviews": total_reviews.astype(np.int64),
+        "median_reviews": median_reviews,
+        "review_hhi": review_hhi,
+        "price_cv": price_cv,
+        "rating_std": rating_std,
+        "average_price": average_price,
+        "average_rating": average_rating,
+        "saturation": saturation,
+        "opportunity": opportunity,
+    }
+    return [
+        {"keyword": keyword, **{name: values[index].item() for name, values in columns.items()}}
+        for index, keyword in enumerate(keywords.tolist())
+    ]
@@ -0,0 +1,292 @@
+"""
+This module keeps a columnar snapshot of the product metrics of every
+keyword on disk: product ids, prices, ratings and review counts as typed
+arrays in one file per (keyword, marketplace), which the worker rewrites
+after each crawl or refresh. Readers map the files read-only, so analytics
+work on the arrays in place instead of parsing strings row by row, and all
+API processes share the same pages of the OS page cache. A snapshot records
+the data version of its keyword; readers only use it while that version is
+current and fall back to the products table otherwise. Like the thumbnail
+cache, the directory has to be shared by the API and the worker.
+
+Usage: python -m backend.utils.metric_snapshots [--marketplace us] [--keyword KEYWORD]
+"""
+import os
+import mmap
+import struct
+import hashlib
+import logging
+import argparse
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from mysql.connector import Error
+from backend.utils.utils import create_connection, get_keyword_version
+from backend.utils.image_cache import atomic_write
+from backend.utils.migrations import migrate
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+METRIC_SNAPSHOT_DIR = os.getenv(
+    "METRIC_SNAPSHOT_DIR", os.path.join("cache", "snapshots")
+)
+# Each mapping holds a file descriptor, so keep well below the process limit
+METRIC_SNAPSHOT_MAX_OPEN = int(os.getenv("METRIC_SNAPSHOT_MAX_OPEN", "256"))
+
+# A 64 byte header (magic, data version, row count) followed by each column
+# in turn; all columns are 8 bytes wide so every one of them stays aligned
+MAGIC = b"KWSNAP01"
+HEADER = struct.Struct("<8sqq")
+HEADER_SIZE = 64
+COLUMNS = (
+    ("product_ids", np.dtype("<i8")),
+    ("prices", np.dtype("<f8")),
+    ("ratings", np.dtype("<f8")),
+    ("reviews", np.dtype("<i8")),
+)
+ROW_SIZE = sum(dtype.itemsize for _, dtype in COLUMNS)
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is truncated or not a snapshot"""
+
+
+def fetch_metric_rows(cursor, keyword, marketplace):
+    """(id, price, rating, reviews) rows of the products of a keyword"""
+    cursor.execute(
+        """
+        SELECT id,
+        CONCAT(REPLACE(
+            REPLACE(price_whole, '\n', ''), ',', ''),
+            '.', LPAD(price_fraction, 2, '0')) AS price,
+        SUBSTRING_INDEX(rating, ' ', 1) as rating,
+        REPLACE(reviews, ',', '') as reviews
+        FROM products
+        WHERE keyword = %s AND marketplace = %s
+        """,
+        (keyword, marketplace),
+    )
+    return cursor.fetchall()
+
+
+def parse_metric_rows(rows):
+    """
+    Typed columns of (id, price, rating, reviews) rows, skipping rows whose
+    values do not parse
+    """
+    frame = pd.DataFrame(list(rows), columns=["id", "price", "rating", "reviews"])
+    for column in ("price", "rating", "reviews"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    frame = frame.dropna()
+    return {
+        "product_ids": frame["id"].to_numpy(dtype=np.int64),
+        "prices": frame["price"].to_numpy(dtype=np.float64),
+        "ratings": frame["rating"].to_numpy(dtype=np.float64),
+        "reviews": frame["reviews"].to_numpy(dtype=np.int64),
+    }
+
+
+def encode_snapshot(version, columns):
+    """The bytes of a snapshot file holding columns at a data version"""
+    rows = len(columns["product_ids"])
+    header = HEADER.pack(MAGIC, version, rows).ljust(HEADER_SIZE, b"\0")
+    return header + b"".join(
+        np.ascontiguousarray(columns[name], dtype=dtype).tobytes()
+        for name, dtype in COLUMNS
+    )
+
+
+class MetricSnapshot:
+    """
+    Read-only view of a snapshot file. Its columns, shaped like those of
+    parse_metric_rows, point into the mapped file, so nothing is copied and
+    pages are only read from disk on first access.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as source:
+            self._mapping = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mapping) < HEADER_SIZE:
+            raise SnapshotError(f"{path} is too short for a snapshot header")
+        magic, self.version, rows = HEADER.unpack_from(self._mapping)
+        if magic != MAGIC or len(self._mapping) != HEADER_SIZE + rows * ROW_SIZE:
+            raise SnapshotError(f"{path} is not a complete metric snapshot")
+        self.columns = {}
+        offset = HEADER_SIZE
+        for name, dtype in COLUMNS:
+            self.columns[name] = np.frombuffer(
+                self._mapping, dtype=dtype, count=rows, offset=offset
+            )
+            offset += rows * dtype.itemsize
+
+    def __len__(self):
+        return len(self.columns["product_ids"])
+
+
+class SnapshotStore:
+    """
+    Directory of metric snapshots. Mapped snapshots are kept open, least
+    recently used first out, and remapped when their file is replaced.
+    """
+
+    def __init__(self, directory=METRIC_SNAPSHOT_DIR, max_open=METRIC_SNAPSHOT_MAX_OPEN):
+        self.directory = directory
+        self.max_open = max_open
+        self._open = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def path(self, keyword, marketplace):
+        """Snapshot file of a keyword in a marketplace"""
+        key = hashlib.sha256(f"{marketplace}|{keyword}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.snap")
+
+    def write(self, keyword, marketplace, version, columns):
+        """Replace the snapshot of a keyword; readers of the old file keep their mapping"""
+        path = self.path(keyword, marketplace)
+        os.makedirs(self.directory, exist_ok=True)
+        atomic_write(path, encode_snapshot(version, columns))
+        return path
+
+    def load(self, keyword, marketplace, version=None):
+        """
+        The snapshot of a keyword, or None when there is none, it cannot be
+        read or it was built at another data version than the given one
+        """
+        path = self.path(keyword, marketplace)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = self._open.get(path)
+        if cached is not None and cached[0] == identity:
+            snapshot = cached[1]
+            self._open.move_to_end(path)
+        else:
+            try:
+                snapshot = MetricSnapshot(path)
+            except (OSError, ValueError, SnapshotError) as err:
+                logger.warning("Ignoring metric snapshot %s: %s", path, err)
+                self._open.pop(path, None)
+                self.misses += 1
+                return None
+            self._open[path] = (identity, snapshot)
+            self._open.move_to_end(path)
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        if version is not None and snapshot.version != version:
+            self.stale += 1
+            return None
+        self.hits += 1
+        return snapshot
+
+    def prune(self, keep):
+        """Remove snapshot files other than the paths to keep, returning how many"""
+        removed = 0
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            path = os.path.join(self.directory, name)
+            if name.endswith(".snap") and path not in keep:
+                os.remove(path)
+                self._open.pop(path, None)
+                removed += 1
+        return removed
+
+    def metrics(self):
+        """Hit ratio of the snapshot store"""
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "metric_snapshot_hits": self.hits,
+            "metric_snapshot_misses": self.misses,
+            "metric_snapshot_stale": self.stale,
+            "metric_snapshot_hit_ratio": self.hits / lookups if lookups else 0.0,
+            "metric_snapshot_open": len(self._open),
+        }
+
+
+def build_snapshot(cursor, store, keyword, marketplace):
+    """
+    Write the snapshot of a keyword from the products table and return its
+    path. The version is read before the rows, so rows stored in between
+    leave a snapshot older than the current version, which readers skip.
+    """
+    version = get_keyword_version(cursor, keyword, marketplace)
+    columns = parse_metric_rows(fetch_metric_rows(cursor, keyword, marketplace))
+    return store.write(keyword, marketplace, version, columns)
+
+
+def refresh_snapshot(keyword, marketplace, store=None):
+    """Rebuild the snapshot of one keyword, as the worker does after a crawl"""
+    connection = create_connection()
+    if not connection:
+        logger.error("Failed to connect to the database.")
+        return False
+    cursor = connection.cursor()
+    try:
+        build_snapshot(cursor, store or SnapshotStore(), keyword, marketplace)
+        return True
+    except (Error, OSError) as err:
+        logger.error("Error writing the metric snapshot of %s: %s", keyword, err)
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def rebuild_snapshots(marketplace=None, keyword=None, store=None):
+    """
+    Rebuild the snapshots of the stored keywords, optionally of one
+    marketplace or keyword, and return how many were written. A rebuild of
+    every keyword also removes the snapshots of keywords no longer stored.
+    """
+    store = store or SnapshotStore()
+    connection = create_connection()
+    if not connection:
+        logger.error("Failed to connect to the database.")
+        return 0
+    cursor = connection.cursor()
+    conditions, params = [], []
+    if marketplace:
+        conditions.append("marketplace = %s")
+        params.append(marketplace)
+    if keyword:
+        conditions.append("keyword = %s")
+        params.append(keyword)
+    written = set()
+    try:
+        cursor.execute(
+            f"""
+            SELECT keyword, marketplace FROM keywords
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            """,
+            params,
+        )
+        for stored_keyword, stored_marketplace in cursor.fetchall():
+            written.add(build_snapshot(cursor, store, stored_keyword, stored_marketplace))
+        if not conditions:
+            logger.info("Removed %s orphaned snapshots", store.prune(written))
+    except (Error, OSError) as err:
+        logger.error("Error rebuilding metric snapshots: %s", err)
+    finally:
+        cursor.close()
+        connection.close()
+    logger.info("Wrote %s metric snapshots", len(written))
+    return len(written)
+
+
+def main():
+    """Parse command line arguments and rebuild the snapshots"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--marketplace", help="only rebuild keywords of this marketplace")
+    parser.add_argument("--keyword", help="only rebuild this keyword")
+    parser.add_argument("--directory", default=METRIC_SNAPSHOT_DIR)
+    args = parser.parse_args()
+    migrate()
+    rebuild_snapshots(args.marketplace, args.keyword, SnapshotStore(args.directory))
+
+
+if __name__ == "__main__":
+    main()
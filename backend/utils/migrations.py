@@ -0,0 +1,601 @@
+"""
+Versioned migrations of the MySQL schema. Each migration applies one
+schema change and is written to be idempotent, so a database created from
+the old dump, one partly upgraded by earlier releases and an empty one all
+reach the same schema. Applied versions are recorded in schema_migrations
+and migrate() applies the pending ones in order under a named lock, so the
+API and the worker starting together do not race. MySQL commits DDL
+statements implicitly, so a migration that fails halfway is simply
+re-run by the next deploy.
+
+check_query_plans() runs EXPLAIN on the hot queries and reports those that
+no longer use the index they were given; run it against a database of
+production size, as the optimizer prefers full scans of tiny tables.
+
+Usage: python -m backend.utils.migrations [--status] [--check-plans]
+"""
+import argparse
+import logging
+import sys
+from mysql.connector import Error
+from backend.utils.utils import create_connection, image_rows, DEFAULT_MARKETPLACE
+from backend.utils.dedupe_products import (
+    ensure_asin_column,
+    backfill_asins,
+    find_duplicates,
+    remove_duplicates,
+    ensure_unique_key,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "schema_migrations"
+LOCK_TIMEOUT = 300
+SAVED_LISTS_UNIQUE_KEY = "uq_savedLists_user_product"
+METRIC_COLUMNS = ("price_whole", "price_fraction", "rating", "reviews")
+METRIC_COLUMN_LENGTH = 64
+
+MIGRATIONS = []
+
+
+class MigrationError(Exception):
+    """A migration cannot be applied to the database as it is"""
+
+
+def migration(version, name):
+    """Register a function applying a schema change with a cursor"""
+
+    def register(apply):
+        MIGRATIONS.append((version, name, apply))
+        return apply
+
+    return register
+
+
+def column_exists(cursor, table, column):
+    """Whether a table has a column"""
+    cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    return cursor.fetchone() is not None
+
+
+def index_exists(cursor, table, key_name):
+    """Whether a table has an index of that name"""
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (key_name,))
+    return bool(cursor.fetchall())
+
+
+@migration(1, "base schema")
+def create_base_tables(cursor):
+    """The tables of the original dump, in their original layout"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id VARCHAR(36) PRIMARY KEY,
+            name VARCHAR(255),
+            email VARCHAR(255) UNIQUE,
+            password VARCHAR(255)
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            mainImage_url VARCHAR(255),
+            otherImages_url TEXT,
+            title VARCHAR(255),
+            price_whole VARCHAR(255),
+            price_fraction VARCHAR(255),
+            rating VARCHAR(255),
+            reviews VARCHAR(255),
+            url VARCHAR(255),
+            keyword VARCHAR(255)
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS keywords (
+            keyword VARCHAR(255) NOT NULL PRIMARY KEY
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS normalized_keywords (
+            keyword VARCHAR(255) PRIMARY KEY,
+            keyword_pool TEXT
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS savedLists (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id VARCHAR(36) NOT NULL,
+            product_id INT NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS progress (
+            keyword VARCHAR(255) PRIMARY KEY,
+            current_page INT NOT NULL
+        )
+        """
+    )
+
+
+@migration(2, "crawl state")
+def create_crawl_state_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS crawl_state (
+            keyword VARCHAR(255) NOT NULL,
+            marketplace VARCHAR(8) NOT NULL DEFAULT 'us',
+            current_page INT NOT NULL,
+            item_offset INT NOT NULL,
+            items_crawled INT NOT NULL,
+            items_stored INT NOT NULL,
+            seen_asins MEDIUMTEXT NOT NULL,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+                ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (keyword, marketplace)
+        )
+        """
+    )
+
+
+@migration(3, "marketplaces")
+def add_marketplace_columns(cursor):
+    """
+    Add the marketplace column to products, keywords and crawl_state and
+    widen their keyword unique keys to include it
+    """
+    for table in ("products", "keywords", "crawl_state"):
+        if not column_exists(cursor, table, "marketplace"):
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN marketplace VARCHAR(8) "
+                f"NOT NULL DEFAULT '{DEFAULT_MARKETPLACE}'"
+            )
+    for table in ("keywords", "crawl_state"):
+        cursor.execute(f"SHOW INDEX FROM {table} WHERE Non_unique = 0")
+        columns = {}
+        for row in cursor.fetchall():
+            columns.setdefault(row[2], []).append(row[4])
+        for key_name, key_columns in columns.items():
+            if key_columns != ["keyword"]:
+                continue
+            if key_name == "PRIMARY":
+                cursor.execute(
+                    f"ALTER TABLE {table} DROP PRIMARY KEY, "
+                    "ADD PRIMARY KEY (keyword, marketplace)"
+                )
+            else:
+                cursor.execute(
+                    f"ALTER TABLE {table} DROP INDEX {key_name}, "
+                    f"ADD UNIQUE KEY {key_name} (keyword, marketplace)"
+                )
+
+
+@migration(4, "product asins")
+def add_product_asins(cursor):
+    """
+    Backfill product ASINs, compact duplicate products and add the
+    (keyword, marketplace, asin) unique key store_data upserts on
+    """
+    ensure_asin_column(cursor)
+    backfill_asins(cursor)
+    duplicates = find_duplicates(cursor)
+    if duplicates:
+        logger.info("Removing %s duplicate products", len(duplicates))
+        remove_duplicates(cursor, duplicates)
+    ensure_unique_key(cursor)
+
+
+@migration(5, "product images")
+def create_product_images_table(cursor):
+    """Create product_images and move the legacy otherImages_url lists into it"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS product_images (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            product_id INT NOT NULL,
+            position INT NOT NULL,
+            url VARCHAR(1024) NOT NULL,
+            UNIQUE KEY uq_product_images_product_position (product_id, position)
+        )
+        """
+    )
+    cursor.execute("SELECT 1 FROM product_images LIMIT 1")
+    if cursor.fetchone() is not None:
+        return
+    cursor.execute(
+        """
+        SELECT id, mainImage_url, otherImages_url FROM products
+        WHERE otherImages_url IS NOT NULL AND otherImages_url != ''
+        """
+    )
+    rows = [
+        row
+        for product_id, main_image_url, other_images_url in cursor.fetchall()
+        for row in image_rows(product_id, main_image_url, other_images_url.split(","))
+    ]
+    if rows:
+        cursor.executemany(
+            "INSERT INTO product_images (product_id, position, url) VALUES (%s, %s, %s)",
+            rows,
+        )
+    logger.info("Moved %s legacy image URLs to product_images", len(rows))
+
+
+@migration(6, "refresh history")
+def create_refresh_schema(cursor):
+    """Create the product history table and the keyword refresh column"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS product_history (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            product_id INT NOT NULL,
+            price_whole VARCHAR(255),
+            price_fraction VARCHAR(255),
+            rating VARCHAR(255),
+            reviews VARCHAR(255),
+            recorded_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_product_history_product (product_id, recorded_at)
+        )
+        """
+    )
+    if not column_exists(cursor, "keywords", "refreshed_at"):
+        cursor.execute("ALTER TABLE keywords ADD COLUMN refreshed_at DATETIME NULL")
+
+
+@migration(7, "keyword versions")
+def create_keyword_versions_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS keyword_versions (
+            keyword VARCHAR(255) NOT NULL,
+            marketplace VARCHAR(8) NOT NULL DEFAULT 'us',
+            version INT NOT NULL DEFAULT 0,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+                ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (keyword, marketplace)
+        )
+        """
+    )
+
+
+@migration(8, "saved lists unique key")
+def add_saved_lists_unique_key(cursor):
+    """
+    Add the (user_id, product_id) unique key bulk saves rely on. Lists
+    holding duplicate rows are first rebuilt without them.
+    """
+    if index_exists(cursor, "savedLists", SAVED_LISTS_UNIQUE_KEY):
+        return
+    cursor.execute(
+        """
+        SELECT 1 FROM savedLists
+        GROUP BY user_id, product_id HAVING COUNT(*) > 1 LIMIT 1
+        """
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(
+            f"ALTER TABLE savedLists ADD UNIQUE KEY {SAVED_LISTS_UNIQUE_KEY} "
+            "(user_id, product_id)"
+        )
+        return
+    cursor.execute("DROP TABLE IF EXISTS savedLists_dedup")
+    cursor.execute("CREATE TABLE savedLists_dedup LIKE savedLists")
+    cursor.execute(
+        f"ALTER TABLE savedLists_dedup ADD UNIQUE KEY {SAVED_LISTS_UNIQUE_KEY} "
+        "(user_id, product_id)"
+    )
+    cursor.execute("INSERT IGNORE INTO savedLists_dedup SELECT * FROM savedLists")
+    cursor.execute(
+        "RENAME TABLE savedLists TO savedLists_old, savedLists_dedup TO savedLists"
+    )
+    cursor.execute("DROP TABLE savedLists_old")
+
+
+@migration(9, "keyword scores")
+def create_scores_table(cursor):
+    """The ranking table behind the leaderboard, with an index per sort order"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS keyword_scores (
+            keyword VARCHAR(255) NOT NULL,
+            marketplace VARCHAR(8) NOT NULL DEFAULT 'us',
+            product_count INT NOT NULL,
+            total_reviews BIGINT NOT NULL,
+            median_reviews DOUBLE NOT NULL,
+            review_hhi DOUBLE NOT NULL,
+            price_cv DOUBLE NOT NULL,
+            rating_std DOUBLE NOT NULL,
+            average_price DOUBLE NOT NULL,
+            average_rating DOUBLE NOT NULL,
+            saturation DOUBLE NOT NULL,
+            opportunity DOUBLE NOT NULL,
+            data_version INT NOT NULL DEFAULT 0,
+            scored_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+                ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (keyword, marketplace),
+            KEY idx_keyword_scores_opportunity (marketplace, opportunity),
+            KEY idx_keyword_scores_saturation (marketplace, saturation)
+        )
+        """
+    )
+
+
+@migration(10, "product crawl times")
+def add_crawled_at_column(cursor):
+    """The last time the crawler stored or refreshed a product, for exports"""
+    if not column_exists(cursor, "products", "crawled_at"):
+        cursor.execute(
+            """
+            ALTER TABLE products
+            ADD COLUMN crawled_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            ADD KEY idx_products_crawled_at (marketplace, crawled_at)
+            """
+        )
+
+
+@migration(11, "product metrics index")
+def add_product_metrics_index(cursor):
+    """
+    Add a covering index of the keyword lookups. The statistics, comparison
+    and scoring queries read only the metric columns of a keyword's
+    products, so they are answered from the index alone, and the product
+    listing finds its rows through the index prefix. The metric columns are
+    narrowed first for the index to fit InnoDB's 3072 byte key limit.
+    """
+    if index_exists(cursor, "products", "idx_products_metrics"):
+        return
+    for column in METRIC_COLUMNS:
+        cursor.execute(f"SELECT COALESCE(MAX(CHAR_LENGTH({column})), 0) FROM products")
+        longest = cursor.fetchone()[0]
+        if longest > METRIC_COLUMN_LENGTH:
+            raise MigrationError(
+                f"products.{column} holds values of {longest} characters, "
+                f"more than the {METRIC_COLUMN_LENGTH} the metrics index allows"
+            )
+    modify = ", ".join(
+        f"MODIFY {column} VARCHAR({METRIC_COLUMN_LENGTH})" for column in METRIC_COLUMNS
+    )
+    cursor.execute(
+        f"""
+        ALTER TABLE products {modify},
+        ADD KEY idx_products_metrics (keyword, marketplace, {", ".join(METRIC_COLUMNS)})
+        """
+    )
+
+
+@migration(12, "image requests")
+def create_image_requests_table(cursor):
+    """When the API last queued an image task per keyword, to queue it once"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS image_requests (
+            keyword VARCHAR(255) NOT NULL,
+            marketplace VARCHAR(8) NOT NULL DEFAULT 'us',
+            requested_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (keyword, marketplace)
+        )
+        """
+    )
+
+
+@migration(13, "keyword version change index")
+def add_keyword_versions_updated_index(cursor):
+    """Let the API poll the keyword versions changed since its last poll"""
+    if not index_exists(cursor, "keyword_versions", "idx_keyword_versions_updated_at"):
+        cursor.execute(
+            "ALTER TABLE keyword_versions ADD KEY idx_keyword_versions_updated_at (updated_at)"
+        )
+
+
+def applied_versions(cursor):
+    """Versions of the applied migrations, creating their table if needed"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migrations(connection, cursor, migrations=None):
+    """Apply the migrations not yet recorded, in version order, and return their versions"""
+    applied = applied_versions(cursor)
+    done = []
+    for version, name, apply in sorted(migrations or MIGRATIONS):
+        if version in applied:
+            continue
+        logger.info("Applying migration %s: %s", version, name)
+        apply(cursor)
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+            (version, name),
+        )
+        connection.commit()
+        done.append(version)
+    return done
+
+
+def migrate():
+    """
+    Bring the database schema up to date and return the versions applied.
+    Raises MigrationError or mysql.connector.Error if a migration fails.
+    """
+    connection = create_connection()
+    if not connection:
+        logger.error("Failed to connect to the database.")
+        return []
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if not cursor.fetchone()[0]:
+            raise MigrationError("Timed out waiting for another migration run")
+        try:
+            done = apply_migrations(connection, cursor)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+        if done:
+            logger.info("Applied migrations %s", done)
+        return done
+    except (Error, MigrationError) as err:
+        connection.rollback()
+        logger.error("Error migrating the schema: %s", err)
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+# Hot queries, a query picking parameters of rows that exist (lookups of
+# missing keys are planned without any index), the indexes that may serve
+# them and whether the index must cover the query
+PRODUCT_KEY_SAMPLE = "SELECT keyword, marketplace FROM products LIMIT 1"
+SAVED_LIST_SAMPLE = "SELECT user_id, product_id FROM savedLists LIMIT 1"
+HOT_QUERIES = (
+    (
+        "products_listing",
+        """
+        SELECT id, mainImage_url, title, price_whole, price_fraction, rating, reviews, url
+        FROM products WHERE keyword = %s AND marketplace = %s
+        """,
+        PRODUCT_KEY_SAMPLE,
+        ("idx_products_metrics", "uq_products_keyword_marketplace_asin"),
+        False,
+    ),
+    (
+        "product_metrics",
+        """
+        SELECT price_whole, price_fraction, rating, reviews
+        FROM products WHERE keyword = %s AND marketplace = %s
+        """,
+        PRODUCT_KEY_SAMPLE,
+        ("idx_products_metrics",),
+        True,
+    ),
+    (
+        "saved_list_lookup",
+        "SELECT 1 FROM savedLists WHERE user_id = %s AND product_id = %s",
+        SAVED_LIST_SAMPLE,
+        (SAVED_LISTS_UNIQUE_KEY,),
+        True,
+    ),
+    (
+        "saved_list_page",
+        "SELECT product_id FROM savedLists WHERE user_id = %s ORDER BY product_id",
+        "SELECT user_id FROM savedLists LIMIT 1",
+        (SAVED_LISTS_UNIQUE_KEY,),
+        True,
+    ),
+    (
+        "keyword_version",
+        "SELECT version FROM keyword_versions WHERE keyword = %s AND marketplace = %s",
+        "SELECT keyword, marketplace FROM keyword_versions LIMIT 1",
+        ("PRIMARY",),
+        False,
+    ),
+    (
+        "leaderboard",
+        """
+        SELECT keyword, opportunity FROM keyword_scores
+        WHERE marketplace = %s ORDER BY opportunity DESC LIMIT 20
+        """,
+        "SELECT marketplace FROM keyword_scores LIMIT 1",
+        ("idx_keyword_scores_opportunity",),
+        False,
+    ),
+    (
+        "product_history",
+        """
+        SELECT recorded_at, price_whole, price_fraction FROM product_history
+        WHERE product_id = %s ORDER BY recorded_at
+        """,
+        "SELECT product_id FROM product_history LIMIT 1",
+        ("idx_product_history_product",),
+        False,
+    ),
+)
+
+
+def plan_problem(plan, indexes, covering):
+    """What is wrong with an EXPLAIN row of a query given its indexes, None if fine"""
+    if plan["key"] not in indexes:
+        return f"uses {plan['key'] or 'no index'} ({plan['type']}), expected {indexes[0]}"
+    if covering and "Using index" not in (plan.get("Extra") or ""):
+        return f"reads rows besides {plan['key']}, expected an index-only read"
+    return None
+
+
+def check_query_plans(cursor):
+    """
+    EXPLAIN the hot queries and return {query name: problem} for those off
+    their index. Queries over empty tables are skipped.
+    """
+    problems = {}
+    for name, query, sample, indexes, covering in HOT_QUERIES:
+        cursor.execute(sample)
+        params = cursor.fetchone()
+        if params is None:
+            logger.info("Skipping plan check of %s: no rows to sample", name)
+            continue
+        cursor.execute(f"EXPLAIN {query}", tuple(params.values()))
+        problem = plan_problem(cursor.fetchall()[0], indexes, covering)
+        if problem:
+            problems[name] = problem
+    return problems
+
+
+def main():
+    """Parse command line arguments and migrate, report or check the schema"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument(
+        "--status", action="store_true", help="list pending migrations without applying"
+    )
+    parser.add_argument(
+        "--check-plans",
+        action="store_true",
+        help="exit with status 1 if a hot query does not use its index",
+    )
+    args = parser.parse_args()
+    if args.status:
+        connection = create_connection()
+        if not connection:
+            sys.exit(1)
+        cursor = connection.cursor()
+        applied = applied_versions(cursor)
+        for version, name, _ in sorted(MIGRATIONS):
+            print(f"{version:4d} {'applied' if version in applied else 'pending'} {name}")
+        cursor.close()
+        connection.close()
+        return
+    migrate()
+    if args.check_plans:
+        connection = create_connection()
+        if not connection:
+            sys.exit(1)
+        cursor = connection.cursor(dictionary=True)
+        problems = check_query_plans(cursor)
+        connection.close()
+        for name, problem in problems.items():
+            logger.error("Query %s %s", name, problem)
+        if problems:
+            sys.exit(1)
+        logger.info("All %s hot queries use their indexes", len(HOT_QUERIES))
+
+
+if __name__ == "__main__":
+    main()
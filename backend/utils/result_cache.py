@@ -0,0 +1,146 @@
+"""
+This module caches serialized API responses in process memory. Product
+data of a keyword only changes when the worker stores a crawl, so responses
+are kept until the worker signals that the keyword changed, and the least
+recently used responses are evicted once the cache outgrows its byte budget.
+The signal reaches a single process, so each process also polls for
+keywords whose data version changed and invalidates them.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+RESULT_CACHE_MAX_ALIASES = int(os.getenv("RESULT_CACHE_MAX_ALIASES", "50000"))
+IDENTITY = "identity"
+
+
+class ResultCache:
+    """
+    LRU cache of (body, etag) pairs keyed by (keyword, marketplace, variant),
+    bounded by the total size of the cached bodies. The variant is the
+    content encoding, so compressed bodies are kept next to the plain one.
+    Aliases map a search term to the canonical keyword it resolved to, so a
+    cached keyword is served without normalizing the term or looking up its
+    keyword pool either. Aliases are kept in their own LRU of at most
+    max_aliases terms, since every distinct search term adds one.
+    """
+
+    def __init__(self, max_mb=RESULT_CACHE_MAX_MB, max_aliases=RESULT_CACHE_MAX_ALIASES):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_aliases = max_aliases
+        self.entries = OrderedDict()
+        self.aliases = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0
+
+    def lookup(self, term, marketplace):
+        """
+        The canonical keyword, body and etag cached for a search term, or
+        None when the term or its response is not cached
+        """
+        with self.lock:
+            keyword = self.aliases.get(term)
+            if keyword is None:
+                self.misses += 1
+                return None
+            self.aliases.move_to_end(term)
+        entry = self.get(keyword, marketplace)
+        if entry is None:
+            return None
+        return (keyword,) + entry
+
+    def add_alias(self, term, keyword):
+        with self.lock:
+            self.aliases[term] = keyword
+            self.aliases.move_to_end(term)
+            while len(self.aliases) > self.max_aliases:
+                self.aliases.popitem(last=False)
+
+    def get(self, keyword, marketplace, variant=IDENTITY, record=True):
+        """The cached (body, etag) pair; record=False leaves the hit ratio alone"""
+        key = (keyword, marketplace, variant)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if record:
+                    self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            if record:
+                self.hits += 1
+            return entry
+
+    def put(
+        self, keyword, marketplace, body, generation=None, etag=None, variant=IDENTITY
+    ):
+        """
+        Cache a response body, evicting the least recently used ones over
+        budget. A body built before an invalidation, whose generation is no
+        longer current, is not cached. Replacing the plain body drops the
+        encoded variants made from the previous one.
+        """
+        if len(body) > self.max_bytes:
+            return
+        key = (keyword, marketplace, variant)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            replaced = [key]
+            if variant == IDENTITY:
+                replaced += [
+                    other
+                    for other in self.entries
+                    if other[:2] == key[:2] and other[2] != IDENTITY
+                ]
+            for other in replaced:
+                previous = self.entries.pop(other, None)
+                if previous is not None:
+                    self.size -= len(previous[0])
+            self.entries[key] = (body, etag)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, keyword, marketplace=None):
+        """Drop the responses of a keyword, in one or all marketplaces"""
+        with self.lock:
+            self.generation += 1
+            for key in [
+                key
+                for key in self.entries
+                if key[0] == keyword and marketplace in (None, key[1])
+            ]:
+                self.size -= len(self.entries.pop(key)[0])
+                self.invalidations += 1
+            if marketplace is None:
+                for term in [t for t, k in self.aliases.items() if k == keyword]:
+                    del self.aliases[term]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.aliases.clear()
+            self.size = 0
+            self.generation += 1
+
+    def metrics(self):
+        """Hit ratio and memory use of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "result_cache_hits": self.hits,
+            "result_cache_misses": self.misses,
+            "result_cache_hit_ratio": self.hits / lookups if lookups else 0.0,
+            "result_cache_evictions": self.evictions,
+            "result_cache_invalidations": self.invalidations,
+            "result_cache_entries": len(self.entries),
+            "result_cache_bytes": self.size,
+            "result_cache_aliases": len(self.aliases),
+        }
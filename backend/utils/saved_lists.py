@@ -0,0 +1,84 @@
+"""
+This module implements bulk changes to users' saved lists. Each change is a
+status query plus a single INSERT IGNORE or DELETE over all the products of
+the request, relying on the (user_id, product_id) unique key of savedLists
+so that concurrent saves of the same product cannot create duplicates.
+"""
+MAX_BULK_PRODUCTS = 500
+
+
+def placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def unique_ids(product_ids):
+    """Product ids without repetitions, in request order"""
+    return list(dict.fromkeys(product_ids))
+
+
+def save_products(cursor, user_id, product_ids):
+    """
+    Save products to a user's list in one statement. Returns (product_id,
+    status) pairs, status being saved, already_saved or not_found.
+    """
+    product_ids = unique_ids(product_ids)
+    if not product_ids:
+        return []
+    cursor.execute(
+        f"""
+        SELECT p.id, s.product_id IS NOT NULL
+        FROM products p
+        LEFT JOIN savedLists s ON s.product_id = p.id AND s.user_id = %s
+        WHERE p.id IN ({placeholders(product_ids)})
+        """,
+        (user_id, *product_ids),
+    )
+    saved = {product_id: bool(is_saved) for product_id, is_saved in cursor.fetchall()}
+    to_save = [product_id for product_id in product_ids if saved.get(product_id) is False]
+    if to_save:
+        cursor.execute(
+            f"""
+            INSERT IGNORE INTO savedLists (user_id, product_id)
+            SELECT %s, id FROM products WHERE id IN ({placeholders(to_save)})
+            """,
+            (user_id, *to_save),
+        )
+    return [
+        (
+            product_id,
+            "not_found"
+            if product_id not in saved
+            else "already_saved" if saved[product_id] else "saved",
+        )
+        for product_id in product_ids
+    ]
+
+
+def unsave_products(cursor, user_id, product_ids):
+    """
+    Remove products from a user's list in one statement. Returns
+    (product_id, status) pairs, status being unsaved or not_saved.
+    """
+    product_ids = unique_ids(product_ids)
+    if not product_ids:
+        return []
+    cursor.execute(
+        f"""
+        SELECT product_id FROM savedLists
+        WHERE user_id = %s AND product_id IN ({placeholders(product_ids)})
+        """,
+        (user_id, *product_ids),
+    )
+    saved = {row[0] for row in cursor.fetchall()}
+    if saved:
+        cursor.execute(
+            f"""
+            DELETE FROM savedLists
+            WHERE user_id = %s AND product_id IN ({placeholders(list(saved))})
+            """,
+            (user_id, *saved),
+        )
+    return [
+        (product_id, "unsaved" if product_id in saved else "not_saved")
+        for product_id in product_ids
+    ]
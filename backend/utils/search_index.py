@@ -0,0 +1,235 @@
+"""
+This module provides an in-process inverted index over product titles
+with BM25 relevance ranking and numeric filters on price and rating.
+"""
+import re
+from array import array
+from datetime import timedelta
+import numpy as np
+from backend.utils.utils import MARKETPLACES, parse_price, parse_rating
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Rows stamped shortly before a sync may commit after it, so each sync also
+# re-reads the rows crawled this long before the previous one started
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric tokens"""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class ProductSearchIndex:
+    """
+    Inverted index mapping title tokens to postings of (document, term frequency).
+    Documents are appended; re-adding a product id replaces its previous entry.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.max_id = 0
+        self.synced_at = None
+        self._postings = {}
+        self._frozen_postings = {}
+        self._product_ids = array("q")
+        self._lengths = array("I")
+        self._prices = array("d")
+        self._ratings = array("d")
+        self._live = array("b")
+        self._slots = {}
+        self._total_length = 0
+        self._columns = None
+
+    def __len__(self):
+        return len(self._slots)
+
+    def replaced(self):
+        """Number of entries superseded by a later add of the same product"""
+        return len(self._product_ids) - len(self._slots)
+
+    def add(self, product_id, title, price=None, rating=None):
+        """Index a single product, replacing any earlier entry with the same id"""
+        old_slot = self._slots.get(product_id)
+        if old_slot is not None:
+            self._live[old_slot] = 0
+            self._total_length -= self._lengths[old_slot]
+
+        slot = len(self._product_ids)
+        tokens = tokenize(title)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = (array("I"), array("H"))
+            postings[0].append(slot)
+            postings[1].append(min(count, 65535))
+            self._frozen_postings.pop(token, None)
+
+        self._product_ids.append(product_id)
+        self._lengths.append(len(tokens))
+        self._prices.append(np.nan if price is None else price)
+        self._ratings.append(np.nan if rating is None else rating)
+        self._live.append(1)
+        self._slots[product_id] = slot
+        self._total_length += len(tokens)
+        self.max_id = max(self.max_id, product_id)
+        self._columns = None
+
+    def add_rows(self, rows):
+        """
+        Index rows shaped like the products table
+        (id, title, price_whole, price_fraction, rating)
+        """
+        count = 0
+        for row in rows:
+            product_id, title, price_whole, price_fraction, rating = row
+            self.add(
+                product_id,
+                title,
+                parse_price(price_whole, price_fraction),
+                parse_rating(rating),
+            )
+            count += 1
+        return count
+
+    def _get_columns(self):
+        """Materialize per-document numeric columns as numpy arrays"""
+        if self._columns is None:
+            self._columns = {
+                "product_ids": np.array(self._product_ids, dtype=np.int64),
+                "lengths": np.array(self._lengths, dtype=np.float64),
+                "prices": np.array(self._prices, dtype=np.float64),
+                "ratings": np.array(self._ratings, dtype=np.float64),
+                "live": np.array(self._live, dtype=bool),
+            }
+        return self._columns
+
+    def _get_postings(self, token):
+        """Return the postings of a token as numpy arrays"""
+        frozen = self._frozen_postings.get(token)
+        if frozen is None:
+            postings = self._postings.get(token)
+            if postings is None:
+                return None
+            frozen = (
+                np.array(postings[0], dtype=np.int64),
+                np.array(postings[1], dtype=np.float64),
+            )
+            self._frozen_postings[token] = frozen
+        return frozen
+
+    def search(
+        self, query, limit=20, min_price=None, max_price=None, min_rating=None
+    ):
+        """
+        Rank indexed products against the query with BM25 and
+        return a list of (product_id, score) ordered by relevance.
+        """
+        doc_count = len(self._slots)
+        if not doc_count:
+            return []
+        columns = self._get_columns()
+        avg_length = self._total_length / doc_count or 1.0
+        norm = self.k1 * (1 - self.b + self.b * columns["lengths"] / avg_length)
+        scores = np.zeros(len(self._product_ids), dtype=np.float64)
+
+        for token in set(tokenize(query)):
+            postings = self._get_postings(token)
+            if postings is None:
+                continue
+            slots, freqs = postings
+            live_slots = columns["live"][slots]
+            doc_freq = int(live_slots.sum())
+            if not doc_freq:
+                continue
+            idf = np.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+            scores[slots] += (
+                idf * live_slots * freqs * (self.k1 + 1) / (freqs + norm[slots])
+            )
+
+        mask = (scores > 0) & columns["live"]
+        if min_price is not None:
+            mask &= columns["prices"] >= min_price
+        if max_price is not None:
+            mask &= columns["prices"] <= max_price
+        if min_rating is not None:
+            mask &= columns["ratings"] >= min_rating
+
+        candidates = np.flatnonzero(mask)
+        if not candidates.size:
+            return []
+        if candidates.size > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [
+            (int(columns["product_ids"][slot]), float(scores[slot]))
+            for slot in candidates
+        ]
+
+    def memory_usage(self):
+        """Approximate number of bytes held by the index structures"""
+        total = sum(
+            column.itemsize * len(column)
+            for column in (
+                self._product_ids,
+                self._lengths,
+                self._prices,
+                self._ratings,
+                self._live,
+            )
+        )
+        for slots, freqs in self._postings.values():
+            total += slots.itemsize * len(slots) + freqs.itemsize * len(freqs)
+        return total
+
+
+def load_product_rows(connection, after_id=0, changed_since=None, batch_size=10000):
+    """
+    Yield product rows with an id greater than after_id from the database,
+    and with changed_since also the rows crawled again since then
+    """
+    conditions, params = ["id > %s"], [after_id]
+    if changed_since is not None:
+        # Listing the marketplaces lets the (marketplace, crawled_at) index
+        # serve the time range
+        placeholders = ", ".join(["%s"] * len(MARKETPLACES))
+        conditions.append(f"(marketplace IN ({placeholders}) AND crawled_at >= %s)")
+        params += [*MARKETPLACES, changed_since]
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"""
+            SELECT id, title, price_whole, price_fraction, rating
+            FROM products
+            WHERE {" OR ".join(conditions)}
+            ORDER BY id
+            """,
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def changed_product_rows(connection, index):
+    """
+    Rows of the products stored since the last sync of an index and of those
+    crawled again since then, whose title, price or rating may have changed,
+    with the database time of this sync to record as the index's synced_at
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT CURRENT_TIMESTAMP")
+        synced_at = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    changed_since = None if index.synced_at is None else index.synced_at - SYNC_OVERLAP
+    return list(load_product_rows(connection, index.max_id, changed_since)), synced_at
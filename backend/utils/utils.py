@@ -4,7 +4,10 @@ including creating connections, managing keyword progress, checking for keyword
 and storing product data and keywords.
 """
 import os
+import re
+import json
 import logging
+from urllib.parse import unquote
 import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
@@ -21,6 +24,54 @@ db_config = {
 }
 
 
+DEFAULT_MARKETPLACE = "us"
+MARKETPLACES = {
+    "us": os.getenv("AMAZON_BASE_URL", "https://www.amazon.com"),
+    "uk": "https://www.amazon.co.uk",
+    "de": "https://www.amazon.de",
+    "jp": "https://www.amazon.co.jp",
+}
+
+ASIN_PATTERN = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?&]|$)")
+
+
+def extract_asin(url):
+    """
+    Extract the Amazon ASIN from a product URL, including sponsored redirect
+    URLs that carry the product path url-encoded. Returns None if absent.
+    """
+    if not url:
+        return None
+    match = ASIN_PATTERN.search(unquote(url))
+    return match.group(1) if match else None
+
+
+def parse_price(price_whole, price_fraction):
+    """Convert the scraped price parts into a float, None if unparseable"""
+    try:
+        whole = str(price_whole).replace("\n", "").replace(",", "").strip()
+        fraction = str(price_fraction or "0").strip().zfill(2)
+        return float(f"{whole}.{fraction}")
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_rating(rating):
+    """Convert a rating string such as '4.5 out of 5 stars' into a float"""
+    try:
+        return float(str(rating).split(" ", 1)[0])
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reviews(reviews):
+    """Convert a review count string such as '1,234' into an int"""
+    try:
+        return int(str(reviews).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return None
+
+
 def create_connection():
     """Create and return a mySQL database connection"""
     try:
@@ -67,14 +118,98 @@ def update_progress(keyword, current_page):
             connection.close()
 
 
-def keyword_exists(keyword):
-    """Check if a keyword exists in the database"""
+def new_crawl_state(
+    keyword, current_page=1, seen_asins=None, marketplace=DEFAULT_MARKETPLACE
+):
+    """Return the crawl state of a keyword that has not been crawled yet"""
+    return {
+        "keyword": keyword,
+        "marketplace": marketplace,
+        "current_page": current_page,
+        "item_offset": 0,
+        "items_crawled": 0,
+        "items_stored": 0,
+        "seen_asins": set(seen_asins or ()),
+    }
+
+
+def get_crawl_state(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """
+    Get the checkpointed crawl state for a keyword in a marketplace. Keywords
+    without one start from the page recorded in progress (US only) and the
+    ASINs already stored.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            query = """
+                SELECT keyword, marketplace, current_page, item_offset,
+                items_crawled, items_stored, seen_asins
+                FROM crawl_state WHERE keyword = %s AND marketplace = %s
+            """
+            cursor.execute(query, (keyword, marketplace))
+            result = cursor.fetchone()
+            if result:
+                result["seen_asins"] = set(json.loads(result["seen_asins"]))
+                return result
+        except Error as err:
+            logger.error("Error getting crawl state: %s", err)
+        finally:
+            cursor.close()
+            connection.close()
+    current_page = get_progress(keyword) if marketplace == DEFAULT_MARKETPLACE else 1
+    return new_crawl_state(
+        keyword, current_page, get_stored_asins(keyword, marketplace), marketplace
+    )
+
+
+def write_crawl_state(cursor, state):
+    """Write a crawl state with the given cursor, leaving the commit to the caller"""
+    cursor.execute(
+        """
+        REPLACE INTO crawl_state
+            (keyword, marketplace, current_page, item_offset, items_crawled,
+            items_stored, seen_asins)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """,
+        (
+            state["keyword"],
+            state.get("marketplace", DEFAULT_MARKETPLACE),
+            state["current_page"],
+            state["item_offset"],
+            state["items_crawled"],
+            state["items_stored"],
+            json.dumps(sorted(state["seen_asins"])),
+        ),
+    )
+
+
+def save_crawl_state(state):
+    """Checkpoint the crawl state of a keyword"""
     connection = create_connection()
     if connection:
         try:
             cursor = connection.cursor()
-            query = "SELECT 1 FROM keywords WHERE keyword = %s LIMIT 1"
-            cursor.execute(query, (keyword,))
+            write_crawl_state(cursor, state)
+            connection.commit()
+        except Error as err:
+            logger.error("Error saving crawl state: %s", err)
+        finally:
+            cursor.close()
+            connection.close()
+
+
+def keyword_exists(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Check if a keyword has been crawled in a marketplace"""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            query = (
+                "SELECT 1 FROM keywords WHERE keyword = %s AND marketplace = %s LIMIT 1"
+            )
+            cursor.execute(query, (keyword, marketplace))
             result = cursor.fetchone()
             return result is not None
         except Error as err:
@@ -86,17 +221,69 @@ def keyword_exists(keyword):
     return False
 
 
-def store_data(data):
-    """Store product data in database"""
+def get_stored_asins(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Get the ASINs already stored for a keyword in a marketplace"""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            query = """
+                SELECT asin FROM products
+                WHERE keyword = %s AND marketplace = %s AND asin IS NOT NULL
+            """
+            cursor.execute(query, (keyword, marketplace))
+            return {row[0] for row in cursor.fetchall()}
+        except Error as err:
+            logger.error("Error getting stored ASINs: %s", err)
+            return set()
+        finally:
+            cursor.close()
+            connection.close()
+    return set()
+
+
+def bump_keyword_versions(cursor, pairs):
+    """
+    Increment the data version of (keyword, marketplace) pairs whose products
+    changed, in the caller's transaction. The API derives its ETags from it.
+    """
+    cursor.executemany(
+        """
+        INSERT INTO keyword_versions (keyword, marketplace, version)
+        VALUES (%s, %s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+        """,
+        sorted(set(pairs)),
+    )
+
+
+def store_data(data, crawl_state=None):
+    """
+    Store product data in database. A product already stored for the same
+    marketplace, keyword and ASIN is updated in place instead of inserted again,
+    keeping a main image already set by image enrichment. Other images live in
+    product_images; the legacy otherImages_url column is left empty.
+    If a crawl state is given it is checkpointed in the same transaction,
+    as is the data version bump of the stored keywords.
+    """
     connection = create_connection()
     if connection:
         cursor = connection.cursor()
         add_product = """
             INSERT INTO products 
                 (title, price_whole, price_fraction, rating, reviews,
-                keyword, url, mainImage_url, otherImages_url)
+                keyword, url, mainImage_url, otherImages_url, asin, marketplace)
             VALUES 
-                (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                title = VALUES(title),
+                price_whole = VALUES(price_whole),
+                price_fraction = VALUES(price_fraction),
+                rating = VALUES(rating),
+                reviews = VALUES(reviews),
+                url = VALUES(url),
+                mainImage_url = COALESCE(mainImage_url, VALUES(mainImage_url)),
+                crawled_at = CURRENT_TIMESTAMP
         """
         for product in data:
             cursor.execute(
@@ -109,28 +296,303 @@ def store_data(data):
                     product["reviews"],
                     product["keyword"],
                     product["url"],
-                    product["mainImage_url"],
-                    product["otherImages_url"],
+                    product.get("mainImage_url"),
+                    product.get("otherImages_url", ""),
+                    product.get("asin") or extract_asin(product["url"]),
+                    product.get("marketplace", DEFAULT_MARKETPLACE),
                 ),
             )
+        bump_keyword_versions(
+            cursor,
+            (
+                (product["keyword"], product.get("marketplace", DEFAULT_MARKETPLACE))
+                for product in data
+            ),
+        )
+        if crawl_state is not None:
+            write_crawl_state(cursor, crawl_state)
         connection.commit()
         cursor.close()
         connection.close()
     else:
         logger.error("Failed to connect to the database.")
 
-def store_keyword(keyword):
-    """Store a keyword in database"""
-    logger.info("Storing keyword: %s", keyword)
+
+def image_rows(product_id, main_image_url, other_image_urls):
+    """(product_id, position, url) rows of a product's images, main image first"""
+    urls = [main_image_url] if main_image_url else []
+    urls += [url for url in other_image_urls if url and url not in urls]
+    return [(product_id, position, url) for position, url in enumerate(urls)]
+
+
+def store_product_images(product_id, main_image_url, other_image_urls):
+    """
+    Replace the stored images of a product with those from its product page.
+    The data version of the product's keyword is bumped in the same
+    transaction, since its product list shows the main image.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "DELETE FROM product_images WHERE product_id = %s", (product_id,)
+            )
+            rows = image_rows(product_id, main_image_url, other_image_urls)
+            if rows:
+                cursor.executemany(
+                    "INSERT INTO product_images (product_id, position, url) "
+                    "VALUES (%s, %s, %s)",
+                    rows,
+                )
+            if main_image_url:
+                cursor.execute(
+                    "UPDATE products SET mainImage_url = %s WHERE id = %s",
+                    (main_image_url, product_id),
+                )
+            cursor.execute(
+                "SELECT keyword, marketplace FROM products WHERE id = %s", (product_id,)
+            )
+            bump_keyword_versions(cursor, cursor.fetchall())
+            connection.commit()
+        except Error as err:
+            logger.error("Error storing images of product %s: %s", product_id, err)
+        finally:
+            cursor.close()
+            connection.close()
+
+
+def get_products_missing_images(keyword, marketplace=DEFAULT_MARKETPLACE, limit=None):
+    """Get the id and url of a keyword's products that have no stored images yet"""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            query = """
+                SELECT p.id, p.url FROM products p
+                LEFT JOIN product_images i ON i.product_id = p.id
+                WHERE p.keyword = %s AND p.marketplace = %s AND i.id IS NULL
+                ORDER BY p.id
+            """
+            params = (keyword, marketplace)
+            if limit is not None:
+                query += " LIMIT %s"
+                params += (limit,)
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        except Error as err:
+            logger.error("Error fetching products missing images: %s", err)
+        finally:
+            cursor.close()
+            connection.close()
+    return []
+
+
+def get_product_image_urls(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Get the main image URLs of a keyword's products"""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            query = """
+                SELECT mainImage_url FROM products
+                WHERE keyword = %s AND marketplace = %s AND mainImage_url IS NOT NULL
+            """
+            cursor.execute(query, (keyword, marketplace))
+            return [row[0] for row in cursor.fetchall()]
+        except Error as err:
+            logger.error("Error fetching image URLs: %s", err)
+        finally:
+            cursor.close()
+            connection.close()
+    return []
+
+
+def get_stored_products(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Get the stored metrics of a keyword's products keyed by ASIN"""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            query = """
+                SELECT id, asin, price_whole, price_fraction, rating, reviews
+                FROM products
+                WHERE keyword = %s AND marketplace = %s AND asin IS NOT NULL
+            """
+            cursor.execute(query, (keyword, marketplace))
+            return {row["asin"]: row for row in cursor.fetchall()}
+        except Error as err:
+            logger.error("Error getting stored products: %s", err)
+            return {}
+        finally:
+            cursor.close()
+            connection.close()
+    return {}
+
+
+def update_product_metrics(updates, keyword=None, marketplace=DEFAULT_MARKETPLACE):
+    """
+    Update price, rating and reviews of stored products in place and
+    record the new values as product history rows, bumping the data version
+    of their keyword when given
+    """
+    if not updates:
+        return
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            rows = [
+                (
+                    update["price_whole"],
+                    update["price_fraction"],
+                    update["rating"],
+                    update["reviews"],
+                    update["id"],
+                )
+                for update in updates
+            ]
+            cursor.executemany(
+                """
+                UPDATE products
+                SET price_whole = %s, price_fraction = %s, rating = %s, reviews = %s,
+                    crawled_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                """,
+                rows,
+            )
+            cursor.executemany(
+                """
+                INSERT INTO product_history
+                    (price_whole, price_fraction, rating, reviews, product_id)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                rows,
+            )
+            if keyword is not None:
+                bump_keyword_versions(cursor, [(keyword, marketplace)])
+            connection.commit()
+        except Error as err:
+            logger.error("Error updating product metrics: %s", err)
+        finally:
+            cursor.close()
+            connection.close()
+
+
+def mark_keyword_refreshed(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Record that a keyword's products have just been refreshed"""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            query = """
+                UPDATE keywords SET refreshed_at = NOW()
+                WHERE keyword = %s AND marketplace = %s
+            """
+            cursor.execute(query, (keyword, marketplace))
+            connection.commit()
+        except Error as err:
+            logger.error("Error marking keyword refreshed: %s", err)
+        finally:
+            cursor.close()
+            connection.close()
+
+
+def get_stalest_keywords(limit, max_age_hours):
+    """
+    Get up to limit (keyword, marketplace) pairs not refreshed within
+    max_age_hours, never-refreshed keywords first, then the oldest refresh first
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            query = """
+                SELECT keyword, marketplace FROM keywords
+                WHERE refreshed_at IS NULL
+                   OR refreshed_at < NOW() - INTERVAL %s HOUR
+                ORDER BY refreshed_at IS NOT NULL, refreshed_at
+                LIMIT %s
+            """
+            cursor.execute(query, (max_age_hours, limit))
+            return [(row[0], row[1]) for row in cursor.fetchall()]
+        except Error as err:
+            logger.error("Error getting stalest keywords: %s", err)
+            return []
+        finally:
+            cursor.close()
+            connection.close()
+    return []
+
+
+def get_keyword_version(cursor, keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Data version of a keyword, 0 for keywords stored before versions were kept"""
+    cursor.execute(
+        "SELECT version FROM keyword_versions WHERE keyword = %s AND marketplace = %s",
+        (keyword, marketplace),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    return row["version"] if isinstance(row, dict) else row[0]
+
+
+def fetch_keyword_version(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Data version of a keyword over a new connection, None if it cannot be read"""
+    connection = create_connection()
+    if connection:
+        cursor = connection.cursor()
+        try:
+            return get_keyword_version(cursor, keyword, marketplace)
+        except Error as err:
+            logger.error("Error reading the data version of %s: %s", keyword, err)
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+
+def get_keyword_versions(cursor, keywords, marketplace=DEFAULT_MARKETPLACE):
+    """Data versions of keywords of a marketplace, keywords without one left out"""
+    if not keywords:
+        return {}
+    cursor.execute(
+        f"""
+        SELECT keyword, version FROM keyword_versions
+        WHERE marketplace = %s AND keyword IN ({", ".join(["%s"] * len(keywords))})
+        """,
+        (marketplace, *keywords),
+    )
+    return dict(
+        (row["keyword"], row["version"]) if isinstance(row, dict) else row
+        for row in cursor.fetchall()
+    )
+
+
+def get_changed_keyword_versions(cursor, since):
+    """(keyword, marketplace, version) of keywords whose data version changed at or after since"""
+    cursor.execute(
+        "SELECT keyword, marketplace, version FROM keyword_versions WHERE updated_at >= %s",
+        (since,),
+    )
+    return [
+        (row["keyword"], row["marketplace"], row["version"]) if isinstance(row, dict) else row
+        for row in cursor.fetchall()
+    ]
+
+
+def store_keyword(keyword, marketplace=DEFAULT_MARKETPLACE):
+    """Store a keyword crawled in a marketplace in database"""
+    logger.info("Storing keyword: %s (%s)", keyword, marketplace)
     connection = create_connection()
     if connection:
         try:
             cursor = connection.cursor()
-            add_keyword = "INSERT INTO keywords (keyword) VALUES (%s)"
-            cursor.execute(add_keyword, (keyword,))
+            add_keyword = "INSERT INTO keywords (keyword, marketplace) VALUES (%s, %s)"
+            cursor.execute(add_keyword, (keyword, marketplace))
 
             add_normalized_keyword = (
-                "INSERT INTO normalized_keywords (keyword, keyword_pool) "
+                "INSERT IGNORE INTO normalized_keywords (keyword, keyword_pool) "
                 "VALUES (%s, %s)"
             )
             cursor.execute(add_normalized_keyword, (keyword, keyword))
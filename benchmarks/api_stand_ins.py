@@ -0,0 +1,89 @@
+"""
+Local stand-ins for the external services the API calls, for load tests:
+the OpenAI chat completions endpoint behind suggested_title and the Google
+Translate v2 endpoint behind translate. Each answers after a fixed latency
+so that load tests measure the API rather than the services.
+
+The app reaches them through OPENAI_BASE_URL=http://<host>:<port>/v1 and
+TRANSLATE_API_ENDPOINT=http://<host>:<port>. The crawl queue has a local
+backend of its own (QUEUE_BACKEND=sqlite).
+
+Usage: python -m benchmarks.api_stand_ins --port 8099 --latency-ms 50
+"""
+import os
+import time
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+
+LATENCY_MS = float(os.getenv("STAND_IN_LATENCY_MS", "50"))
+
+app = FastAPI()
+calls = {"chat_completions": 0, "translations": 0}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """Answer a chat completion request with a fixed product title"""
+    payload = await request.json()
+    calls["chat_completions"] += 1
+    await asyncio.sleep(LATENCY_MS / 1000)
+    content = "Premium Everyday Essential - Durable, Reliable and Ready to Go"
+    return {
+        "id": f"chatcmpl-stand-in-{calls['chat_completions']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", "stand-in"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 40, "completion_tokens": 12, "total_tokens": 52},
+    }
+
+
+@app.post("/language/translate/v2")
+async def translate(request: Request):
+    """Answer a Translate v2 request by tagging each text with the target language"""
+    payload = await request.json()
+    calls["translations"] += 1
+    await asyncio.sleep(LATENCY_MS / 1000)
+    texts = payload.get("q", [])
+    if isinstance(texts, str):
+        texts = [texts]
+    return {
+        "data": {
+            "translations": [
+                {
+                    "translatedText": f"[{payload.get('target')}] {text}",
+                    "detectedSourceLanguage": "en",
+                }
+                for text in texts
+            ]
+        }
+    }
+
+
+@app.get("/calls")
+async def call_counts():
+    return calls
+
+
+def main():
+    """Parse command line arguments and serve the stand-ins"""
+    global LATENCY_MS
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    args = parser.parse_args()
+    LATENCY_MS = args.latency_ms
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,537 @@
+"""
+End-to-end load test of the API. It creates a scratch MySQL database with
+the schema migrations and seeds it with synthetic users, keywords and
+products at a configurable scale, starts the stand-ins of OpenAI and Google
+Translate and the app under uvicorn with the SQLite crawl queue, then
+drives concurrent virtual users through each scenario for a fixed duration.
+Reported per scenario, as JSON: requests per second, p50/p95/p99 latency,
+errors and the RSS of every app worker.
+
+Scenarios: fetch_products, fetch_statistics, signin, notify (a POST to
+/api/notify delivered to the virtual user's own WebSocket, timed until the
+message arrives), translate and suggested_title. With several workers a
+notification only reaches sockets held by the worker that received it, so
+notify also reports the delivered share.
+
+With --baseline the results are compared to a saved run and the exit status
+is 1 if a scenario's throughput dropped or its p95 latency grew by more than
+--tolerance. --results compares a saved run instead of running.
+
+Usage: python -m benchmarks.bench_api_load --keywords 200 --workers 2 --concurrency 32
+       --duration 20 --save-baseline baseline.json
+       python -m benchmarks.bench_api_load --baseline baseline.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+import httpx
+import numpy as np
+import websockets
+import mysql.connector
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SCENARIOS = (
+    "fetch_products",
+    "fetch_statistics",
+    "signin",
+    "notify",
+    "translate",
+    "suggested_title",
+)
+USER_PASSWORD = "load-test-password"
+ADJECTIVES = (
+    "wireless portable electric waterproof bamboo leather organic stainless "
+    "foldable magnetic ceramic cotton vintage smart compact adjustable "
+    "rechargeable silicone wooden insulated"
+).split()
+NOUNS = (
+    "speaker blender backpack lamp kettle wallet charger pillow blanket "
+    "mirror mug bottle keyboard mouse tripod tent jacket shoe watch umbrella "
+    "cushion organizer bracket scale heater fan grill brush scissors notebook"
+).split()
+
+def connect(database=None):
+    return mysql.connector.connect(
+        host=os.getenv("MYSQL_HOST"),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        database=database,
+    )
+
+
+def keyword_names(count):
+    """count distinct keywords made of an adjective and a noun"""
+    pairs = [f"{adjective} {noun}" for noun in NOUNS for adjective in ADJECTIVES]
+    return [
+        pairs[index % len(pairs)]
+        + ("" if index < len(pairs) else f" {index // len(pairs)}")
+        for index in range(count)
+    ]
+
+
+def product_rows(keyword, count, rng):
+    for _ in range(count):
+        asin = f"B0{rng.getrandbits(32):08X}"
+        yield (
+            f"https://m.media-amazon.com/images/I/{rng.getrandbits(40):x}._AC_UL320_.jpg",
+            "",
+            f"{keyword.title()} {rng.choice(('Pro', 'Max', 'Lite', 'Plus', 'Mini'))} "
+            f"with {rng.choice(('Case', 'Stand', 'Cable', 'Cover', 'Bag'))}",
+            f"{rng.randint(5, 300):,}",
+            f"{rng.randint(0, 99):02d}",
+            f"{rng.choice((3.5, 4.0, 4.2, 4.5, 4.7, 5.0))} out of 5 stars",
+            f"{rng.randint(0, 90000):,}",
+            f"https://www.amazon.com/dp/{asin}",
+            keyword,
+            asin,
+        )
+
+
+def seed_database(database, keywords, products_per_keyword, users, seed=3):
+    """
+    Create the scratch database, bring it to the current schema with the
+    migrations and fill it with synthetic data
+    """
+    rng = random.Random(seed)
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+    cursor.execute(f"CREATE DATABASE {database}")
+    subprocess.run(
+        [sys.executable, "-m", "backend.utils.migrations"],
+        env=dict(os.environ, MYSQL_DATABASE=database),
+        cwd=REPO_ROOT,
+        check=True,
+    )
+    conn.database = database
+    password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(USER_PASSWORD)
+    cursor.executemany(
+        "INSERT INTO users (user_id, name, email, password) VALUES (%s, %s, %s, %s)",
+        [
+            (
+                str(uuid.uuid4()),
+                f"Load User {index}",
+                f"load{index}@example.com",
+                password,
+            )
+            for index in range(users)
+        ],
+    )
+    cursor.executemany(
+        "INSERT INTO keywords (keyword) VALUES (%s)",
+        [(keyword,) for keyword in keywords],
+    )
+    cursor.executemany(
+        "INSERT INTO normalized_keywords (keyword, keyword_pool) VALUES (%s, %s)",
+        [(keyword, keyword) for keyword in keywords],
+    )
+    for keyword in keywords:
+        cursor.executemany(
+            """
+            INSERT INTO products
+                (mainImage_url, otherImages_url, title, price_whole, price_fraction,
+                rating, reviews, url, keyword, asin)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            list(product_rows(keyword, products_per_keyword, rng)),
+        )
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def alias_normalized_keywords(database, base_url, keywords):
+    """
+    Add the app's normalized form of every seeded keyword to its keyword
+    pool, as the crawler does, and return the keywords the app accepts
+    """
+    accepted = []
+    conn = connect(database)
+    cursor = conn.cursor()
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        for keyword in keywords:
+            response = client.get("/api/validate_keyword", params={"keyword": keyword})
+            if response.status_code != 200:
+                continue
+            normalized = response.json()["normalized_keyword"]
+            if normalized != keyword:
+                cursor.execute(
+                    """
+                    UPDATE normalized_keywords
+                    SET keyword_pool = CONCAT(keyword_pool, ',', %s)
+                    WHERE keyword = %s
+                    """,
+                    (normalized, keyword),
+                )
+            accepted.append(keyword)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return accepted
+
+
+def start_process(command, env, port, path, timeout=180):
+    """Start a server process and wait until path answers on port"""
+    process = subprocess.Popen(command, env=env, cwd=REPO_ROOT)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{command[2]} exited with status {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}{path}", timeout=2).status_code < 500:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"{command[2]} did not answer on port {port}")
+
+
+def worker_pids(pid):
+    """Pids of the uvicorn workers under a master process, or the master itself"""
+    children = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return sorted(children) or [pid]
+
+
+def rss_mb(pid):
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class VirtualUser:
+    """One simulated client: its user, session and, for notify, its WebSocket"""
+
+    def __init__(self, index, rng):
+        self.email = f"load{index}@example.com"
+        self.session = f"load-session-{index}"
+        self.rng = rng
+        self.websocket = None
+        self.delivered = 0
+        self.undelivered = 0
+
+
+async def fetch_products(client, user, keywords):
+    response = await client.get(
+        "/api/fetch_products",
+        params={"keyword": user.rng.choice(keywords), "sessionId": user.session},
+    )
+    return response.status_code == 200
+
+
+async def fetch_statistics(client, user, keywords):
+    response = await client.get(
+        "/api/fetch_statistics", params={"keyword": user.rng.choice(keywords)}
+    )
+    return response.status_code == 200
+
+
+async def signin(client, user, keywords):
+    response = await client.post(
+        "/api/signin", data={"username": user.email, "password": USER_PASSWORD}
+    )
+    return response.status_code == 200
+
+
+async def notify(client, user, keywords):
+    message = uuid.uuid4().hex
+    response = await client.post(
+        "/api/notify",
+        json={
+            "sessionId": user.session,
+            "message": message,
+            "keyword": user.rng.choice(keywords),
+        },
+    )
+    if response.status_code != 200:
+        return False
+    if response.json()["status"] != "success":
+        user.undelivered += 1
+        return True
+    while (
+        json.loads(await asyncio.wait_for(user.websocket.recv(), 10))["message"]
+        != message
+    ):
+        pass
+    user.delivered += 1
+    return True
+
+
+async def translate(client, user, keywords):
+    response = await client.get(
+        "/api/translate",
+        params={
+            "text": user.rng.choice(keywords),
+            "dest": user.rng.choice(("de", "ja")),
+        },
+    )
+    return response.status_code == 200
+
+
+async def suggested_title(client, user, keywords):
+    response = await client.get(
+        "/api/suggested_title", params={"keyword": user.rng.choice(keywords)}
+    )
+    return response.status_code == 200
+
+
+SCENARIO_REQUESTS = {
+    "fetch_products": fetch_products,
+    "fetch_statistics": fetch_statistics,
+    "signin": signin,
+    "notify": notify,
+    "translate": translate,
+    "suggested_title": suggested_title,
+}
+
+
+def summarize(latencies, errors, elapsed):
+    """Throughput and latency percentiles of a scenario run"""
+    if not latencies:
+        return {"requests": 0, "errors": errors, "rps": 0.0}
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+    }
+
+
+async def run_scenario(name, base_url, keywords, users, duration, warmup, seed):
+    """Drive a scenario with one task per virtual user and summarize the measured part"""
+    request = SCENARIO_REQUESTS[name]
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=30, limits=limits
+    ) as client:
+        virtual_users = [
+            VirtualUser(index, random.Random(seed + index)) for index in range(users)
+        ]
+        if name == "notify":
+            ws_url = base_url.replace("http", "ws", 1)
+            for user in virtual_users:
+                user.websocket = await websockets.connect(
+                    f"{ws_url}/api/ws/{user.session}"
+                )
+        measure_from = time.perf_counter() + warmup
+        deadline = measure_from + duration
+
+        async def drive(user):
+            nonlocal errors
+            while (start := time.perf_counter()) < deadline:
+                try:
+                    ok = await request(client, user, keywords)
+                except (
+                    httpx.HTTPError,
+                    asyncio.TimeoutError,
+                    websockets.WebSocketException,
+                ):
+                    ok = False
+                if start >= measure_from:
+                    latencies.append(time.perf_counter() - start)
+                    errors += not ok
+
+        try:
+            await asyncio.gather(*(drive(user) for user in virtual_users))
+        finally:
+            for user in virtual_users:
+                if user.websocket is not None:
+                    await user.websocket.close()
+    result = summarize(latencies, errors, duration)
+    if name == "notify":
+        delivered = sum(user.delivered for user in virtual_users)
+        undelivered = sum(user.undelivered for user in virtual_users)
+        result["delivered_share"] = round(
+            delivered / max(delivered + undelivered, 1), 3
+        )
+    return result
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Relative change of throughput and p95 latency of each scenario present
+    in both runs, flagging those that got worse by more than tolerance
+    """
+    comparison = {}
+    for name, current in results["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if not previous or not previous.get("rps") or not previous.get("p95_ms"):
+            continue
+        rps, p95 = previous["rps"], previous["p95_ms"]
+        rps_change = (current.get("rps", 0) - rps) / rps
+        p95_change = (current.get("p95_ms", 0) - p95) / p95
+        comparison[name] = {
+            "rps_change": round(rps_change, 3),
+            "p95_change": round(p95_change, 3),
+            "regression": rps_change < -tolerance or p95_change > tolerance,
+        }
+    return comparison
+
+
+def run(args):
+    """Seed, start the stand-ins and the app, run the scenarios and stop everything"""
+    keywords = keyword_names(args.keywords)
+    seed_database(args.database, keywords, args.products_per_keyword, args.concurrency)
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    env = dict(
+        os.environ,
+        MYSQL_DATABASE=args.database,
+        JWT_SECRET_KEY="load-test-secret",
+        OPENAI_API_KEY="stand-in",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.stand_in_port}/v1",
+        TRANSLATE_API_ENDPOINT=f"http://127.0.0.1:{args.stand_in_port}",
+        QUEUE_BACKEND="sqlite",
+        QUEUE_SQLITE_PATH=os.path.join(workdir, "queue.db"),
+        IMAGE_CACHE_DIR=os.path.join(workdir, "images"),
+        FRONTEND_URL="http://localhost",
+    )
+    stand_ins = start_process(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.api_stand_ins",
+            "--port",
+            str(args.stand_in_port),
+            "--latency-ms",
+            str(args.stand_in_latency_ms),
+        ],
+        env,
+        args.stand_in_port,
+        "/calls",
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = None
+    try:
+        server = start_process(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "app:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(args.port),
+                "--workers",
+                str(args.workers),
+                "--log-level",
+                "warning",
+            ],
+            env,
+            args.port,
+            "/metrics",
+        )
+        keywords = alias_normalized_keywords(args.database, base_url, keywords)
+        results = {
+            "config": {
+                "keywords": len(keywords),
+                "products_per_keyword": args.products_per_keyword,
+                "workers": args.workers,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "stand_in_latency_ms": args.stand_in_latency_ms,
+            },
+            "scenarios": {},
+        }
+        for name in args.scenarios:
+            result = asyncio.run(
+                run_scenario(
+                    name,
+                    base_url,
+                    keywords,
+                    args.concurrency,
+                    args.duration,
+                    args.warmup,
+                    args.seed,
+                )
+            )
+            result["worker_rss_mb"] = [rss_mb(pid) for pid in worker_pids(server.pid)]
+            results["scenarios"][name] = result
+        return results
+    finally:
+        for process in (server, stand_ins):
+            if process is not None:
+                process.terminate()
+                process.wait(30)
+        if not args.keep_database:
+            conn = connect()
+            conn.cursor().execute(f"DROP DATABASE IF EXISTS {args.database}")
+            conn.close()
+
+
+def main():
+    """Parse command line arguments, run or load results and compare them"""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument("--keywords", type=int, default=200)
+    parser.add_argument("--products-per-keyword", type=int, default=80)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--duration", type=float, default=20, help="measured seconds per scenario"
+    )
+    parser.add_argument(
+        "--warmup", type=float, default=3, help="unmeasured seconds first"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stand-in-port", type=int, default=8099)
+    parser.add_argument("--stand-in-latency-ms", type=float, default=50)
+    parser.add_argument("--database", default="marketmaster_load")
+    parser.add_argument("--keep-database", action="store_true")
+    parser.add_argument(
+        "--results", help="compare these saved results instead of running"
+    )
+    parser.add_argument("--save-baseline", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare the results to this saved run")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.results:
+        results = json.loads(Path(args.results).read_text())
+    else:
+        results = run(args)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2))
+    regressed = False
+    if args.baseline:
+        comparison = compare_to_baseline(
+            results, json.loads(Path(args.baseline).read_text()), args.tolerance
+        )
+        results = dict(results, comparison=comparison)
+        regressed = any(change["regression"] for change in comparison.values())
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
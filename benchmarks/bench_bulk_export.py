@@ -0,0 +1,126 @@
+"""
+Benchmark bulk exports of one million product rows: throughput, bytes
+written and peak memory of streaming the rows chunk by chunk against
+fetching them all before encoding, for CSV, Parquet and Arrow. The database
+is stood in for by a cursor generating product rows as they are fetched,
+and each case runs in a fresh process so peak RSS is its own.
+
+Usage: python -m benchmarks.bench_bulk_export --rows 1000000 --chunk-size 50000
+"""
+import time
+import json
+import random
+import argparse
+import resource
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from backend.utils.bulk_export import start_export, encode_frames, to_frame
+
+FORMATS = ("csv", "parquet", "arrow")
+
+
+class GeneratedCursor:
+    """Unbuffered cursor over product rows generated on fetch"""
+
+    def __init__(self, rows, seed=5):
+        self.remaining = rows
+        self.index = 0
+        self.rng = random.Random(seed)
+        self.start = datetime(2024, 1, 1)
+
+    def execute(self, query, params):
+        pass
+
+    def row(self):
+        rng = self.rng
+        self.index += 1
+        asin = f"B0{rng.getrandbits(32):08X}"
+        return (
+            self.index,
+            f"keyword {self.index % 2000}",
+            "us",
+            asin,
+            "Wireless Bluetooth Earbuds with Charging Case and Noise Cancelling",
+            f"{rng.randint(5, 300)}.{rng.randint(0, 99):02d}",
+            f"{rng.uniform(1, 5):.1f}",
+            str(rng.randint(0, 90000)),
+            f"https://www.amazon.com/dp/{asin}",
+            f"https://m.media-amazon.com/images/I/{rng.getrandbits(40):x}._AC_UL320_.jpg",
+            self.start + timedelta(minutes=self.index % 50000),
+        )
+
+    def fetchmany(self, size):
+        count = min(size, self.remaining)
+        self.remaining -= count
+        return [self.row() for _ in range(count)]
+
+    def fetchall(self):
+        return self.fetchmany(self.remaining)
+
+    def close(self):
+        pass
+
+
+class GeneratedConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return GeneratedCursor(self.rows)
+
+    def close(self):
+        pass
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(mode, file_format, rows, chunk_size):
+    """Export rows in a mode and return its time, output size and memory"""
+    baseline = peak_rss_mb()
+    start_time = time.perf_counter()
+    if mode == "streaming":
+        chunks = start_export(
+            GeneratedConnection(rows), "products", file_format, chunk_size=chunk_size
+        )
+    else:
+        cursor = GeneratedCursor(rows)
+        chunks = encode_frames("products", [to_frame("products", cursor.fetchall())], file_format)
+    size = sum(len(chunk) for chunk in chunks)
+    elapsed = time.perf_counter() - start_time
+    return {
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed),
+        "megabytes": round(size / 2**20, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_growth_mb": round(peak_rss_mb() - baseline, 1),
+    }
+
+
+def main():
+    """Run the benchmark and print the results as JSON"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument(
+        "--skip-buffered", action="store_true", help="only measure streaming exports"
+    )
+    args = parser.parse_args()
+
+    modes = ("streaming",) if args.skip_buffered else ("streaming", "buffered")
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for file_format in args.formats:
+        for mode in modes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[f"{file_format}_{mode}"] = executor.submit(
+                    run_case, mode, file_format, args.rows, args.chunk_size
+                ).result()
+    print(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark the keyword comparison statistics: one grouped pass over the rows
+of many keywords against computing each keyword on its own, as one
+fetch_statistics request per keyword does.
+
+Usage: python -m benchmarks.bench_compare_statistics --keywords 10 50 500
+"""
+import time
+import json
+import random
+import argparse
+from backend.utils.keyword_stats import compare_statistics
+
+
+def make_rows(keywords, products_per_keyword, seed=11):
+    """(keyword, price, rating, reviews) rows as the comparison query returns them"""
+    rng = random.Random(seed)
+    return [
+        (
+            f"keyword {index}",
+            f"{rng.randint(5, 400)}.{rng.randint(0, 99):02d}",
+            str(rng.choice((1, 2, 3, 3.5, 4, 4.5, 5))),
+            str(rng.randint(0, 50000)),
+        )
+        for index in range(keywords)
+        for _ in range(products_per_keyword)
+    ]
+
+
+def main():
+    """Run the benchmark and print the results as JSON"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keywords", type=int, nargs="+", default=[10, 50, 500])
+    parser.add_argument("--products", type=int, default=80)
+    args = parser.parse_args()
+
+    results = {}
+    for keywords in args.keywords:
+        rows = make_rows(keywords, args.products)
+        start_time = time.perf_counter()
+        compare_statistics(rows)
+        grouped = time.perf_counter() - start_time
+
+        by_keyword = {}
+        for row in rows:
+            by_keyword.setdefault(row[0], []).append(row)
+        start_time = time.perf_counter()
+        for keyword_rows in by_keyword.values():
+            compare_statistics(keyword_rows)
+        separate = time.perf_counter() - start_time
+
+        results[f"{keywords}_keywords"] = {
+            "rows": len(rows),
+            "grouped_ms": round(grouped * 1000, 2),
+            "per_keyword_ms": round(separate * 1000, 2),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Offline crawler benchmark. Serves recorded search-result and product-detail
+HTML from a local HTTP server, drives fetch_product_info against it with the
+database replaced by an in-memory stand-in and prints machine-readable JSON:
+items per second, Playwright navigations per item, peak RSS and DB writes.
+With --enrich-images the deferred product-page image step is timed as well.
+
+Usage: python -m benchmarks.bench_crawler --pages 5 --items-per-page 20 --output bench.json
+"""
+import os
+import sys
+import copy
+import json
+import time
+import asyncio
+import argparse
+import threading
+import subprocess
+from contextlib import asynccontextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+os.environ.setdefault("CRAWL_JITTER_MIN_MS", "0")
+os.environ.setdefault("CRAWL_JITTER_MAX_MS", "0")
+os.environ.setdefault("BROWSER_HEADLESS", "true")
+os.environ.setdefault("BROWSER_SLOW_MO_MS", "0")
+os.environ.setdefault("CRAWL_RATE_PER_DOMAIN", "1000")
+os.environ.setdefault("CRAWL_BURST_PER_DOMAIN", "1000")
+os.environ.setdefault("TRACE_ENABLED", "false")
+
+# pylint: disable=wrong-import-position
+from backend.tasks import crawl_amazon_product_data as crawler
+from backend.tasks.browser_pool import process_tree_rss
+from backend.utils.utils import new_crawl_state, DEFAULT_MARKETPLACE
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures")
+
+SEARCH_ITEM = """
+  <div data-asin="{asin}" class="s-result-item s-asin" data-component-type="s-search-result">
+    <div class="s-product-image-container"><img class="s-image" src="/images/{asin}.jpg" alt=""></div>
+    <h2 class="a-size-mini"><a class="a-link-normal" href="/product-{number}/dp/{asin}/ref=sr_1_{number}"><span class="a-size-medium">Recorded product {number}</span> <span class="a-size-medium">{keyword}</span></a></h2>
+    <div class="a-row a-size-small"><span class="a-icon-alt">4.{rating} out of 5 stars</span><a href="#customerReviews"><span class="a-size-base s-underline-text">{reviews}</span></a></div>
+    <span class="a-price"><span class="a-price-whole">{price}<span class="a-price-decimal">.</span></span><span class="a-price-fraction">99</span></span>
+  </div>"""
+
+
+def render_search_page(keyword, page_number, pages, items_per_page):
+    """Render a search result page in the markup of the recorded fixture"""
+    items = []
+    for index in range(items_per_page):
+        number = (page_number - 1) * items_per_page + index + 1
+        items.append(SEARCH_ITEM.format(
+            asin=f"B{number:09d}",
+            number=number,
+            keyword=keyword,
+            rating=number % 10,
+            reviews=f"{number * 37:,}",
+            price=10 + number % 90,
+        ))
+    next_link = (
+        f'<a class="s-pagination-next" href="/s?k={keyword}&page={page_number + 1}">Next</a>'
+        if page_number < pages
+        else ""
+    )
+    return (
+        "<!DOCTYPE html><html><body><div class=\"s-main-slot s-result-list\">"
+        + "".join(items)
+        + f"</div><ul class=\"a-pagination\"><li class=\"a-last\">{next_link}</li></ul>"
+        + "</body></html>"
+    )
+
+
+def make_handler(pages, items_per_page, product_page, counters):
+    """Build a request handler serving search pages and product pages"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            parsed = urlparse(self.path)
+            counters["http_requests"] += 1
+            if parsed.path == "/s":
+                query = parse_qs(parsed.query)
+                page_number = int(query.get("page", ["1"])[0])
+                body = render_search_page(
+                    query.get("k", [""])[0], page_number, pages, items_per_page
+                )
+            elif "/dp/" in parsed.path:
+                body = product_page
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class LocalDatabase:
+    """In-memory stand-in for the crawler's database calls, counting writes"""
+
+    def __init__(self):
+        self.products = {}
+        self.state = None
+        self.images = {}
+        self.writes = {
+            "store_data": 0,
+            "rows": 0,
+            "crawl_state": 0,
+            "progress": 0,
+            "images": 0,
+        }
+
+    def store_data(self, data, crawl_state=None):
+        self.writes["store_data"] += 1
+        self.writes["rows"] += len(data)
+        for product in data:
+            key = (product["keyword"], product["asin"])
+            self.products.setdefault(key, {"id": len(self.products) + 1}).update(product)
+        if crawl_state is not None:
+            self.writes["crawl_state"] += 1
+            self.state = copy.deepcopy(crawl_state)
+
+    def get_crawl_state(self, keyword, marketplace=DEFAULT_MARKETPLACE):
+        return new_crawl_state(keyword, marketplace=marketplace)
+
+    def save_crawl_state(self, state):
+        self.writes["crawl_state"] += 1
+
+    def update_progress(self, keyword, current_page):
+        self.writes["progress"] += 1
+
+    def get_products_missing_images(self, keyword, marketplace=None, limit=None):
+        missing = [
+            {"id": product["id"], "url": product["url"]}
+            for product in self.products.values()
+            if product["keyword"] == keyword and product["id"] not in self.images
+        ]
+        return missing[:limit] if limit is not None else missing
+
+    def store_product_images(self, product_id, main_image_url, other_image_urls):
+        self.writes["images"] += 1
+        self.images[product_id] = [main_image_url, *other_image_urls]
+
+
+def current_rss():
+    """Resident memory of this process plus its child processes in bytes"""
+    with open("/proc/self/statm", encoding="utf-8") as statm:
+        own = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    return own + process_tree_rss(os.getpid())
+
+
+def git_revision():
+    """Current commit hash, so results can be tracked across commits"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(keyword, min_items, counters, enrich_images):
+    """Drive fetch_product_info, then optionally image enrichment, sampling peak RSS"""
+    peak = {"rss": current_rss()}
+    done = asyncio.Event()
+
+    async def sample():
+        while not done.is_set():
+            peak["rss"] = max(peak["rss"], current_rss())
+            await asyncio.sleep(0.05)
+
+    original_context = crawler.browser_pool.context
+
+    @asynccontextmanager
+    async def instrumented_context():
+        async with original_context() as context:
+            def count(request):
+                if request.is_navigation_request():
+                    counters["playwright_navigations"] += 1
+            context.on("request", count)
+            yield context
+
+    crawler.browser_pool.context = instrumented_context
+    sampler = asyncio.create_task(sample())
+    start_time = time.perf_counter()
+    enrich_elapsed = None
+    try:
+        items = await crawler.fetch_product_info(keyword, min_items_to_store=min_items)
+        elapsed = time.perf_counter() - start_time
+        if enrich_images:
+            await crawler.enrich_product_images(keyword)
+            enrich_elapsed = time.perf_counter() - start_time - elapsed
+    finally:
+        done.set()
+        await sampler
+        await crawler.browser_pool.close()
+        await crawler.http_fetcher.close()
+    return items, elapsed, enrich_elapsed, peak["rss"]
+
+
+def main():
+    """Run the benchmark and emit the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--items-per-page", type=int, default=20)
+    parser.add_argument("--min-items", type=int, default=80)
+    parser.add_argument("--keyword", default="wireless earbuds")
+    parser.add_argument("--http-first", choices=["true", "false"], default="true")
+    parser.add_argument("--enrich-images", action="store_true")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES, "product_page.html"), encoding="utf-8") as page:
+        product_page = page.read()
+    counters = {"http_requests": 0, "playwright_navigations": 0}
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        make_handler(args.pages, args.items_per_page, product_page, counters),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    database = LocalDatabase()
+    crawler.MARKETPLACES[DEFAULT_MARKETPLACE] = f"http://127.0.0.1:{server.server_port}"
+    crawler.HTTP_FIRST = args.http_first == "true"
+    crawler.store_data = database.store_data
+    crawler.get_crawl_state = database.get_crawl_state
+    crawler.save_crawl_state = database.save_crawl_state
+    crawler.update_progress = database.update_progress
+    crawler.get_products_missing_images = database.get_products_missing_images
+    crawler.store_product_images = database.store_product_images
+
+    try:
+        items, elapsed, enrich_elapsed, peak_rss = asyncio.run(
+            run(args.keyword, args.min_items, counters, args.enrich_images)
+        )
+    finally:
+        server.shutdown()
+
+    stored = len(database.products)
+    results = {
+        "benchmark": "crawler",
+        "revision": git_revision(),
+        "http_first": crawler.HTTP_FIRST,
+        "items_crawled": items,
+        "items_stored": stored,
+        "elapsed_seconds": round(elapsed, 3),
+        "items_per_second": round(stored / elapsed, 3) if elapsed else None,
+        "image_enrichment_seconds": (
+            round(enrich_elapsed, 3) if enrich_elapsed is not None else None
+        ),
+        "products_with_images": len(database.images),
+        "playwright_navigations": counters["playwright_navigations"],
+        "playwright_navigations_per_item": (
+            round(counters["playwright_navigations"] / stored, 3) if stored else None
+        ),
+        "http_requests": counters["http_requests"],
+        "peak_rss_bytes": peak_rss,
+        "db_writes": database.writes,
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as result_file:
+            result_file.write(output + "\n")
+    return 0 if stored else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Benchmark conditional GET and compression of product responses on keywords
+with 80 and 5000 products: bytes sent and per-request latency of a plain
+response, gzip and brotli responses, and a 304 revalidation, plus the cost
+of compressing each body once. The products query is stood in for by
+building and serializing the product rows, so the 304 numbers show what a
+revalidation saves before the network is even counted.
+
+Usage: python -m benchmarks.bench_http_cache --requests 200
+"""
+import time
+import json
+import random
+import argparse
+import statistics
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from backend.utils.http_cache import (
+    version_etag,
+    etag_matches,
+    preferred_encoding,
+    encode_body,
+    not_modified,
+    json_response,
+)
+
+ENCODINGS = {"identity": "identity", "gzip": "gzip", "br": "br"}
+
+
+def make_products(count, seed=7):
+    """Product rows shaped like the fetch_products payload"""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": index,
+            "main_Image": f"https://m.media-amazon.com/images/I/{rng.getrandbits(40):x}._AC_UL320_.jpg",
+            "product_title": " ".join(
+                rng.choice(("Wireless", "Earbuds", "Bluetooth", "Noise", "Cancelling",
+                            "Headphones", "Charging", "Case", "Waterproof", "Sport"))
+                for _ in range(12)
+            ),
+            "price": f"{rng.randint(5, 300)}.{rng.randint(0, 99):02d}",
+            "rating": f"{rng.uniform(1, 5):.1f} out of 5 stars",
+            "reviews": f"{rng.randint(0, 90000):,}",
+            "url": f"https://www.amazon.com/dp/B0{rng.getrandbits(32):08X}",
+        }
+        for index in range(count)
+    ]
+
+
+def build_app(products):
+    """
+    An app serving the products like fetch_products, with ETag and
+    compression; compressed bodies are kept like the product cache does
+    """
+    app = FastAPI()
+    etag = version_etag("products", "earbuds", "us", 3)
+    encoded = {}
+
+    @app.get("/api/fetch_products")
+    async def fetch_products(request: Request):
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+        body = JSONResponse(content=[dict(product) for product in products]).body
+        encoding = preferred_encoding(request, len(body))
+        if encoding is not None:
+            if encoding not in encoded:
+                encoded[encoding] = encode_body(body, encoding)
+            body = encoded[encoding]
+        return json_response(body, etag, encoding)
+
+    return app, etag
+
+
+def measure(client, headers, requests):
+    """Median latency in milliseconds and bytes on the wire of a request"""
+    response = client.get("/api/fetch_products", headers=headers)
+    size = len(response.content) if response.status_code == 304 else int(
+        response.headers["content-length"]
+    )
+    samples = []
+    for _ in range(requests):
+        start_time = time.perf_counter()
+        client.get("/api/fetch_products", headers=headers)
+        samples.append((time.perf_counter() - start_time) * 1000)
+    return {
+        "status": response.status_code,
+        "bytes": size,
+        "median_ms": round(statistics.median(samples), 3),
+    }
+
+
+def compression_cost(body, encoding, rounds=20):
+    """Milliseconds to compress a body once"""
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        encode_body(body, encoding)
+    return round((time.perf_counter() - start_time) * 1000 / rounds, 3)
+
+
+def main():
+    """Run the benchmark and print the results as JSON"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[80, 5000])
+    args = parser.parse_args()
+
+    results = {}
+    for count in args.sizes:
+        products = make_products(count)
+        app, etag = build_app(products)
+        client = TestClient(app)
+        body = JSONResponse(content=products).body
+        result = {
+            name: measure(client, {"Accept-Encoding": encoding}, args.requests)
+            for name, encoding in ENCODINGS.items()
+        }
+        result["not_modified"] = measure(
+            client, {"Accept-Encoding": "br", "If-None-Match": etag}, args.requests
+        )
+        result["compress_ms"] = {
+            encoding: compression_cost(body, encoding) for encoding in ("gzip", "br")
+        }
+        results[f"{count}_products"] = result
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
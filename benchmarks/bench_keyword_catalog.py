@@ -0,0 +1,91 @@
+"""
+Benchmark the keyword catalog behind keyword validation and type-ahead:
+loading it, membership tests, completions of prefixes of every length and
+adding keywords one at a time as crawls finish.
+
+Usage: python -m benchmarks.bench_keyword_catalog --keywords 10000 100000
+"""
+import time
+import json
+import random
+import argparse
+import numpy as np
+from backend.utils.keyword_catalog import KeywordCatalog
+
+WORDS = (
+    "wireless bluetooth portable kitchen organizer stainless steel water bottle "
+    "laptop stand phone case charger cable led lamp desk chair yoga mat running "
+    "shoes coffee maker air fryer vacuum cleaner pet toy dog bed cat litter baby "
+    "monitor camera tripod microphone headphone speaker smart watch band"
+).split()
+
+
+def make_keywords(count, seed=17):
+    """Distinct keywords of two to four words with random popularity"""
+    rng = random.Random(seed)
+    keywords = {}
+    while len(keywords) < count:
+        keyword = " ".join(rng.choices(WORDS, k=rng.randint(2, 4)))
+        keywords[keyword] = float(rng.randint(0, 200000))
+    return list(keywords.items())
+
+
+def percentiles_ms(samples):
+    samples = np.array(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+    }
+
+
+def main():
+    """Run the benchmark and print the results as JSON"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keywords", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    results = {}
+    for count in args.keywords:
+        rows = make_keywords(count)
+        catalog = KeywordCatalog()
+        start_time = time.perf_counter()
+        catalog.add_many(rows)
+        load = time.perf_counter() - start_time
+
+        keywords = [keyword for keyword, _ in rows]
+        membership = []
+        for _ in range(args.lookups):
+            keyword = rng.choice(keywords)
+            start_time = time.perf_counter()
+            keyword in catalog
+            membership.append(time.perf_counter() - start_time)
+
+        completions = {}
+        for length in (1, 3, 6, 12):
+            samples = []
+            for _ in range(args.lookups):
+                prefix = rng.choice(keywords)[:length]
+                start_time = time.perf_counter()
+                catalog.complete(prefix, 10)
+                samples.append(time.perf_counter() - start_time)
+            completions[f"prefix_{length}"] = percentiles_ms(samples)
+
+        inserts = []
+        for index in range(args.lookups):
+            start_time = time.perf_counter()
+            catalog.add(f"new keyword {index}", 1.0)
+            inserts.append(time.perf_counter() - start_time)
+
+        results[f"{count}_keywords"] = {
+            "load_ms": round(load * 1000, 1),
+            "membership": percentiles_ms(membership),
+            "complete": completions,
+            "add": percentiles_ms(inserts),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
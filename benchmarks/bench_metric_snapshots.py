@@ -0,0 +1,191 @@
+"""
+Benchmark keyword statistics read from memory-mapped metric snapshots
+against the SQL path, which fetches the metrics as strings and parses them
+on every request. Several worker processes answer requests for random
+keywords concurrently, as uvicorn workers do; each reports its request
+latencies, its RSS and how much of it is shared, and its PSS (shared pages
+split between the processes mapping them). Rows come from a stand-in cursor
+generating them as MySQL returns them, or from the database with --database.
+
+Usage: python -m benchmarks.bench_metric_snapshots --keywords 2000 --products 300 --workers 4
+"""
+import os
+import time
+import json
+import random
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from backend.utils.utils import create_connection
+from backend.utils.keyword_stats import compare_columns, merge_parts
+from backend.utils.metric_snapshots import (
+    SnapshotStore,
+    build_snapshot,
+    fetch_metric_rows,
+    parse_metric_rows,
+)
+
+MODES = ("sql", "snapshot")
+
+
+class GeneratedCursor:
+    """Cursor generating the metric rows of a keyword, and version 1 for all keywords"""
+
+    def __init__(self, products):
+        self.products = products
+        self.rows = []
+
+    def execute(self, query, params):
+        if "keyword_versions" in query:
+            self.rows = [(1,)]
+            return
+        rng = random.Random(params[0])
+        self.rows = [
+            (
+                index,
+                f"{rng.randint(5, 400)}.{rng.randint(0, 99):02d}",
+                str(rng.choice((1, 2, 3, 3.5, 4, 4.5, 5))),
+                str(rng.randint(0, 50000)),
+            )
+            for index in range(self.products)
+        ]
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def open_cursor(database, products):
+    if not database:
+        return None, GeneratedCursor(products)
+    connection = create_connection()
+    return connection, connection.cursor()
+
+
+def memory_mb():
+    """
+    Peak RSS of this process, and its current RSS, PSS and shared pages from
+    /proc (Linux only), in megabytes
+    """
+    usage = {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    try:
+        with open("/proc/self/smaps_rollup") as rollup:
+            fields = dict(line.split(":", 1) for line in rollup if ":" in line)
+    except OSError:
+        return usage
+    shared = ("Shared_Clean", "Shared_Dirty")
+    usage["rss_mb"] = int(fields["Rss"].split()[0]) / 1024
+    usage["pss_mb"] = int(fields["Pss"].split()[0]) / 1024
+    usage["shared_mb"] = sum(int(fields[name].split()[0]) for name in shared) / 1024
+    return usage
+
+
+def run_worker(mode, keywords, directory, requests, database, products, seed):
+    """Answer requests for random keywords and return latencies and memory"""
+    connection, cursor = open_cursor(database, products)
+    store = SnapshotStore(directory)
+    rng = random.Random(seed)
+    start_rss = memory_mb().get("rss_mb")
+    latencies = []
+    for _ in range(requests):
+        keyword, marketplace = rng.choice(keywords)
+        start_time = time.perf_counter()
+        snapshot = store.load(keyword, marketplace) if mode == "snapshot" else None
+        if snapshot is not None:
+            columns = snapshot.columns
+        else:
+            columns = parse_metric_rows(fetch_metric_rows(cursor, keyword, marketplace))
+        if len(columns["prices"]):
+            compare_columns(
+                *merge_parts(
+                    [(keyword, columns["prices"], columns["ratings"], columns["reviews"])]
+                )
+            )
+        latencies.append(time.perf_counter() - start_time)
+    if connection is not None:
+        cursor.close()
+        connection.close()
+    usage = memory_mb()
+    if start_rss is not None:
+        usage["rss_growth_mb"] = usage["rss_mb"] - start_rss
+    return {"latencies": latencies, **usage}
+
+
+def load_keywords(database, count):
+    if not database:
+        return [(f"keyword {index}", "us") for index in range(count)]
+    connection, cursor = open_cursor(True, 0)
+    cursor.execute("SELECT keyword, marketplace FROM keywords LIMIT %s", (count,))
+    keywords = [tuple(row) for row in cursor.fetchall()]
+    cursor.close()
+    connection.close()
+    return keywords
+
+
+def main():
+    """Run the benchmark and print the results as JSON"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keywords", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000, help="per worker")
+    parser.add_argument(
+        "--database", action="store_true", help="read keywords and rows from MySQL"
+    )
+    args = parser.parse_args()
+
+    keywords = load_keywords(args.database, args.keywords)
+    context = multiprocessing.get_context("spawn")
+    results = {"keywords": len(keywords), "workers": args.workers}
+    with tempfile.TemporaryDirectory() as directory:
+        store = SnapshotStore(directory)
+        connection, cursor = open_cursor(args.database, args.products)
+        start_time = time.perf_counter()
+        for keyword, marketplace in keywords:
+            build_snapshot(cursor, store, keyword, marketplace)
+        results["build_seconds"] = round(time.perf_counter() - start_time, 2)
+        if connection is not None:
+            cursor.close()
+            connection.close()
+        results["snapshot_mb"] = round(
+            sum(entry.stat().st_size for entry in os.scandir(directory)) / 2**20, 1
+        )
+
+        for mode in MODES:
+            with ProcessPoolExecutor(args.workers, mp_context=context) as executor:
+                futures = [
+                    executor.submit(
+                        run_worker,
+                        mode,
+                        keywords,
+                        directory,
+                        args.requests,
+                        args.database,
+                        args.products,
+                        seed,
+                    )
+                    for seed in range(args.workers)
+                ]
+                runs = [future.result() for future in futures]
+            latencies = np.array([value for run in runs for value in run["latencies"]])
+            results[mode] = {
+                "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+                "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+            }
+            for name in ("peak_rss_mb", "rss_growth_mb", "pss_mb", "shared_mb"):
+                values = [run[name] for run in runs if name in run]
+                if values:
+                    results[mode][f"{name}_per_worker"] = round(sum(values) / len(values), 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark the overhead of the metrics subsystem: the cost of a single
+counter increment and histogram observation, and the added latency per
+request of the HTTP middleware plus stage timers on a minimal FastAPI app.
+
+Usage: python -m benchmarks.bench_metrics --requests 5000
+"""
+import time
+import json
+import argparse
+import statistics
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.utils.metrics import MetricsRegistry, install_http_metrics, timed
+
+
+def time_calls(function, count):
+    """Average seconds per call of function over count calls"""
+    start_time = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start_time) / count
+
+
+def build_app(instrumented):
+    """A FastAPI app with one route shaped like fetch_products, optionally instrumented"""
+    app = FastAPI()
+    registry = MetricsRegistry()
+    histogram = registry.histogram("request_seconds", "latency", ("method", "route", "status"))
+    stages = registry.histogram("stage_seconds", "stage latency", ("stage",))
+
+    def normalize(keyword):
+        return " ".join(keyword.lower().split())
+
+    if instrumented:
+        install_http_metrics(app, histogram)
+        normalize = timed("normalize_keyword", stages)(normalize)
+
+    @app.get("/api/fetch_products")
+    async def fetch_products(keyword: str):
+        normalized = normalize(keyword)
+        if instrumented:
+            with stages.time(stage="products_query"):
+                products = [{"id": index, "keyword": normalized} for index in range(20)]
+        else:
+            products = [{"id": index, "keyword": normalized} for index in range(20)]
+        return products
+
+    return app, registry
+
+
+def request_latency(app, requests, rounds):
+    """Median over rounds of the mean per-request latency in seconds"""
+    client = TestClient(app)
+    client.get("/api/fetch_products", params={"keyword": "warm up"})
+    samples = []
+    for _ in range(rounds):
+        samples.append(
+            time_calls(
+                lambda: client.get("/api/fetch_products", params={"keyword": "Wireless Earbuds"}),
+                requests // rounds,
+            )
+        )
+    return statistics.median(samples)
+
+
+def main():
+    """Run the benchmark and print the results as JSON"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--operations", type=int, default=1000000)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter("operations_total", "operations", ("mode",))
+    histogram = registry.histogram("operation_seconds", "operations", ("stage",))
+    counter_seconds = time_calls(lambda: counter.inc(mode="crawl"), args.operations)
+    observe_seconds = time_calls(
+        lambda: histogram.observe(0.0042, stage="products_query"), args.operations
+    )
+
+    plain_app, _ = build_app(instrumented=False)
+    instrumented_app, app_registry = build_app(instrumented=True)
+    plain = request_latency(plain_app, args.requests, args.rounds)
+    instrumented = request_latency(instrumented_app, args.requests, args.rounds)
+    render_seconds = time_calls(app_registry.render, 1000)
+
+    print(json.dumps({
+        "counter_inc_ns": round(counter_seconds * 1e9, 1),
+        "histogram_observe_ns": round(observe_seconds * 1e9, 1),
+        "request_us_plain": round(plain * 1e6, 1),
+        "request_us_instrumented": round(instrumented * 1e6, 1),
+        "overhead_us_per_request": round((instrumented - plain) * 1e6, 1),
+        "overhead_percent": round((instrumented - plain) / plain * 100, 2),
+        "render_us": round(render_seconds * 1e6, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark the product search index: build time, memory footprint
+and query latency over synthetic product titles.
+
+Usage: python -m benchmarks.bench_search_index --products 300000
+"""
+import time
+import json
+import random
+import argparse
+import tracemalloc
+from backend.utils.search_index import ProductSearchIndex
+
+VOCABULARY = [
+    "wireless", "earbuds", "bluetooth", "headphones", "portable", "speaker",
+    "stainless", "steel", "water", "bottle", "kitchen", "gadgets", "air", "fryer",
+    "camera", "laptop", "stand", "usb", "charger", "cable", "led", "lamp", "desk",
+    "organizer", "pantry", "storage", "women's", "men's", "shirt", "shoes", "pro",
+    "max", "mini", "pack", "set", "black", "white", "large", "small", "premium",
+]
+
+
+def generate_rows(count, seed=0):
+    """Generate synthetic product rows shaped like the products table"""
+    rng = random.Random(seed)
+    for product_id in range(1, count + 1):
+        title = " ".join(rng.choices(VOCABULARY, k=rng.randint(6, 20)))
+        title = f"{title} {rng.randint(1, 99999)}"
+        yield (
+            product_id,
+            title,
+            str(rng.randint(1, 500)),
+            f"{rng.randint(0, 99):02d}",
+            f"{rng.randint(10, 50) / 10} out of 5 stars",
+        )
+
+
+def main():
+    """Run the benchmark and print the results as JSON"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = list(generate_rows(args.products))
+    index = ProductSearchIndex()
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    index.add_rows(rows)
+    build_seconds = time.perf_counter() - start_time
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = random.Random(1)
+    queries = [" ".join(rng.sample(VOCABULARY, 2)) for _ in range(args.queries)]
+    index.search(queries[0])  # materialize columns outside the timed loop
+    latencies = []
+    for query in queries:
+        start_time = time.perf_counter()
+        index.search(query, limit=20, min_price=20, min_rating=3.5)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    latencies.sort()
+
+    print(json.dumps({
+        "products": args.products,
+        "build_seconds": round(build_seconds, 3),
+        "index_bytes": index.memory_usage(),
+        "build_peak_traced_bytes": peak_bytes,
+        "query_ms_p50": round(latencies[len(latencies) // 2], 3),
+        "query_ms_p95": round(latencies[int(len(latencies) * 0.95)], 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
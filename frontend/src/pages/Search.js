@@ -43,6 +43,7 @@ const Search = () => {
   const [notification, setNotification] = useState("");
   const [showAlert, setShowAlert] = useState(false);
   const [crawlingInProgress, setCrawlingInProgress] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
 
   const { saveProduct } = useSavedList();
   const navigate = useNavigate();
@@ -78,12 +79,12 @@ const Search = () => {
     wsRef.current = socket;
   }, []);
 
-  const fetchProducts = async (keyword) => {
+  const fetchProducts = async (keyword, crawl = false) => {
     try {
       const sessionId = getSessionId();
       setFetching(true);
       const response = await fetch(
-        `/api/fetch_products?keyword=${encodeURIComponent(keyword)}&sessionId=${encodeURIComponent(sessionId)}`,
+        `/api/fetch_products?keyword=${encodeURIComponent(keyword)}&sessionId=${encodeURIComponent(sessionId)}${crawl ? "&crawl=true" : ""}`,
       );
 
       if (response.status === 202) {
@@ -102,6 +103,15 @@ const Search = () => {
 
       const data = await response.json();
       setCrawlingInProgress(false);
+      // Keywords close to already crawled ones come back with suggestions
+      // instead of products
+      if (!Array.isArray(data)) {
+        return {
+          products: data.products || [],
+          new_crawl: false,
+          suggestions: data.suggestions || [],
+        };
+      }
       return { products: data, new_crawl: false };
     } catch (err) {
       setError(err.message);
@@ -112,10 +122,11 @@ const Search = () => {
   };
 
   const handleSearch = useCallback(
-    async (searchKeyword, updateUrl = true) => {
+    async (searchKeyword, updateUrl = true, crawl = false) => {
       setError(null);
       setTranslatedText(null);
       setProducts([]);
+      setSuggestions([]);
       setFetching(true);
       setNotification("");
       setShowAlert(false);
@@ -147,8 +158,9 @@ const Search = () => {
           navigate(`?keyword=${encodeURIComponent(searchKeyword)}`);
         }
 
-        const fetchData = await fetchProducts(englishKeyword);
+        const fetchData = await fetchProducts(englishKeyword, crawl);
         setProducts(fetchData.products);
+        setSuggestions(fetchData.suggestions || []);
         if (fetchData.new_crawl) {
           const sessionId = getSessionId();
 
@@ -252,6 +264,15 @@ const Search = () => {
     debounceHandleSearch(keyword);
   };
 
+  const handleSuggestionClick = (suggestion) => {
+    setKeyword(suggestion);
+    debounceHandleSearch(suggestion);
+  };
+
+  const handleCrawlAnywayClick = () => {
+    handleSearch(keyword, true, true);
+  };
+
   const handleAnalysisClick = () => {
     navigate("/analysis", { state: { keyword: translatedText, crawlingInProgress } });
   };
@@ -394,6 +415,35 @@ const Search = () => {
               </Flex>
             )}
 
+            {suggestions.length > 0 && (
+              <Alert status="info" flexDirection="column" alignItems="center">
+                <AlertTitle mb={2}>
+                  Similar keywords have already been analyzed:
+                </AlertTitle>
+                <Flex wrap="wrap" justifyContent="center" gap={2}>
+                  {suggestions.map((suggestion) => (
+                    <Button
+                      key={suggestion.keyword}
+                      onClick={() => handleSuggestionClick(suggestion.keyword)}
+                      colorScheme="blue"
+                      variant="outline"
+                      size="sm"
+                    >
+                      {suggestion.keyword}
+                    </Button>
+                  ))}
+                </Flex>
+                <Button
+                  onClick={handleCrawlAnywayClick}
+                  variant="link"
+                  size="sm"
+                  mt={3}
+                >
+                  Search for &quot;{translatedText}&quot; anyway
+                </Button>
+              </Alert>
+            )}
+
             {fetching && (
               <Box display="flex" justifyContent="center" mt={4}>
                 <Spinner mr={2} />
@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+from backend.tasks.browser_pool import BrowserPool
+
+
+class FakeContext:
+    def __init__(self, user_agent):
+        self.user_agent = user_agent
+        self.closed = False
+        self.handlers = []
+
+    def on(self, event, handler):
+        self.handlers.append(handler)
+
+    async def new_page(self):
+        for handler in self.handlers:
+            handler(object())
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.closed = False
+        self.failing_contexts = 0
+
+    def is_connected(self):
+        return not self.closed
+
+    async def new_context(self, user_agent):
+        if self.failing_contexts:
+            self.failing_contexts -= 1
+            raise RuntimeError("Target page, context or browser has been closed")
+        return FakeContext(user_agent)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeChromium:
+    def __init__(self):
+        self.browsers = []
+
+    async def launch(self, headless, slow_mo):
+        self.browsers.append(FakeBrowser())
+        return self.browsers[-1]
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+
+    async def stop(self):
+        pass
+
+
+class TestBrowserPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = BrowserPool(["agent-a", "agent-b"], max_pages=3, max_rss_mb=1 << 20)
+        self.playwright = self.pool._playwright = FakePlaywright()
+
+    def run_jobs(self, pages_per_job):
+        async def jobs():
+            for pages in pages_per_job:
+                async with self.pool.context() as context:
+                    self.assertIn(context.user_agent, ["agent-a", "agent-b"])
+                    for _ in range(pages):
+                        await context.new_page()
+                self.assertTrue(context.closed)
+        asyncio.run(jobs())
+
+    def test_browser_is_reused_across_jobs(self):
+        self.run_jobs([1, 1])
+        self.assertEqual(len(self.playwright.chromium.browsers), 1)
+        self.assertEqual(self.pool.metrics()["context_checkouts"], 2)
+
+    def test_browser_is_recycled_after_max_pages(self):
+        self.run_jobs([2, 2, 1])
+        browsers = self.playwright.chromium.browsers
+        self.assertEqual(len(browsers), 2)
+        self.assertTrue(browsers[0].closed)
+        self.assertFalse(browsers[1].closed)
+
+    def test_failed_checkout_does_not_keep_browser_open(self):
+        self.run_jobs([1])
+        self.playwright.chromium.browsers[0].failing_contexts = 1
+
+        async def failing_job():
+            async with self.pool.context():
+                pass
+        with self.assertRaises(RuntimeError):
+            asyncio.run(failing_job())
+        self.run_jobs([2, 1])
+        browsers = self.playwright.chromium.browsers
+        self.assertEqual(len(browsers), 2)
+        self.assertTrue(browsers[0].closed)
+
+    def test_close(self):
+        self.run_jobs([1])
+        asyncio.run(self.pool.close())
+        self.assertTrue(self.playwright.chromium.browsers[0].closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
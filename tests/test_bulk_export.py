@@ -0,0 +1,125 @@
+import io
+import unittest
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from backend.utils.bulk_export import export_query, start_export
+
+
+class FakeCursor:
+    """Unbuffered cursor handing out rows in the sizes fetchmany asks for"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fetches = []
+        self.closed = False
+
+    def execute(self, query, params):
+        self.query = query
+        self.params = params
+
+    def fetchmany(self, size):
+        self.fetches.append(size)
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.cursor_ = FakeCursor(rows)
+        self.closed = False
+
+    def cursor(self):
+        return self.cursor_
+
+    def close(self):
+        self.closed = True
+
+
+def product_row(index, price="19.99", rating="4.5", reviews="1200"):
+    return (
+        index,
+        "camera",
+        "us",
+        f"B0000000{index:02d}",
+        f"Camera {index}",
+        price,
+        rating,
+        reviews,
+        f"https://www.amazon.com/dp/B0000000{index:02d}",
+        None,
+        datetime(2024, 1, 2, 3, 4, 5),
+    )
+
+
+class TestBulkExport(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [product_row(index) for index in range(5)] + [
+            product_row(5, price="not a price", rating="Previous", reviews="")
+        ]
+
+    def export(self, file_format, chunk_size=2):
+        connection = FakeConnection(self.rows)
+        chunks = list(
+            start_export(connection, "products", file_format, chunk_size=chunk_size)
+        )
+        self.assertTrue(connection.closed)
+        self.assertTrue(connection.cursor_.closed)
+        return connection, chunks
+
+    def test_query_filters(self):
+        query, params = export_query(
+            "products", "uk", ["camera", "laptop"], datetime(2024, 1, 1), datetime(2024, 2, 1)
+        )
+        self.assertIn("FROM products", query)
+        self.assertIn("keyword IN (%s, %s)", query)
+        self.assertIn("crawled_at >= %s AND crawled_at < %s", query)
+        self.assertEqual(
+            params, ("uk", "camera", "laptop", datetime(2024, 1, 1), datetime(2024, 2, 1))
+        )
+        query, params = export_query("statistics", "us")
+        self.assertIn("FROM keyword_scores WHERE marketplace = %s", query)
+        self.assertEqual(params, ("us",))
+
+    def test_csv_streams_chunks(self):
+        connection, chunks = self.export("csv")
+        self.assertEqual(connection.cursor_.fetches, [2, 2, 2, 2])
+        self.assertEqual(len(chunks), 4)
+        frame = pd.read_csv(io.BytesIO(b"".join(chunks)))
+        self.assertEqual(len(frame), 6)
+        self.assertAlmostEqual(frame["price"][0], 19.99)
+        self.assertEqual(frame["crawled_at"][0], "2024-01-02T03:04:05")
+        self.assertTrue(pd.isna(frame["price"][5]))
+
+    def test_parquet_has_typed_columns(self):
+        _, chunks = self.export("parquet")
+        parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+        self.assertEqual(parquet.num_row_groups, 3)
+        table = parquet.read()
+        self.assertEqual(table.schema.field("price").type, pa.float64())
+        self.assertEqual(table.schema.field("reviews").type, pa.int64())
+        self.assertEqual(table.schema.field("crawled_at").type, pa.timestamp("ms"))
+        self.assertEqual(table.column("reviews").to_pylist(), [1200] * 5 + [None])
+        self.assertEqual(table.column("rating").null_count, 1)
+
+    def test_arrow_stream(self):
+        _, chunks = self.export("arrow", chunk_size=4)
+        table = pa.ipc.open_stream(b"".join(chunks)).read_all()
+        self.assertEqual(table.num_rows, 6)
+        self.assertEqual(table.column("id").to_pylist(), list(range(6)))
+
+    def test_empty_export_keeps_schema(self):
+        self.rows = []
+        _, chunks = self.export("parquet")
+        table = pq.read_table(io.BytesIO(b"".join(chunks)))
+        self.assertEqual(table.num_rows, 0)
+        self.assertIn("price", table.schema.names)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import copy
+import unittest
+import unittest.mock
+from backend.tasks import crawl_amazon_product_data as crawler
+from backend.tasks import tracing
+from backend.utils.utils import new_crawl_state
+
+
+class SimulatedCrash(Exception):
+    """Raised to simulate the worker dying in the middle of a page"""
+
+
+class FakeItem:
+    def __init__(self, asin, valid=True):
+        self.asin = asin
+        self.valid = valid
+
+
+class FakePage:
+    def __init__(self, items):
+        self.items = items
+
+    async def query_selector_all(self, selector):
+        return self.items
+
+
+class FakeDatabase:
+    """Keeps stored products and the crawl state committed in one transaction"""
+
+    def __init__(self):
+        self.products = []
+        self.state = None
+
+    def store_data(self, data, crawl_state=None):
+        self.products.extend(product["asin"] for product in data)
+        if crawl_state is not None:
+            self.state = copy.deepcopy(crawl_state)
+
+
+class TestCrawlCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        # Item 3 repeats item 1 (sponsored result), item 5 is invalid
+        self.items = [
+            FakeItem("B000000001"),
+            FakeItem("B000000002"),
+            FakeItem("B000000003"),
+            FakeItem("B000000001"),
+            FakeItem("B000000004"),
+            FakeItem(None, valid=False),
+            FakeItem("B000000005"),
+            FakeItem("B000000006"),
+            FakeItem("B000000007"),
+        ]
+        self.expected = [f"B00000000{i}" for i in range(1, 8)]
+        self.db = FakeDatabase()
+        self.crash_at = None
+
+        async def extract_product_details(item, base_url=None):
+            if item is self.crash_at:
+                self.crash_at = None
+                raise SimulatedCrash()
+            if not item.valid:
+                return (None, None, None, None, None, None)
+            return (
+                f"Product {item.asin}",
+                f"https://www.amazon.com/dp/{item.asin}",
+                "10",
+                "99",
+                "4.5 out of 5 stars",
+                "100",
+            )
+
+        async def extract_search_image(item):
+            return "https://example.com/main.jpg"
+
+        patches = [
+            unittest.mock.patch.object(crawler, "extract_product_details", extract_product_details),
+            unittest.mock.patch.object(crawler, "extract_search_image", extract_search_image),
+            unittest.mock.patch.object(crawler, "store_data", self.db.store_data),
+            unittest.mock.patch.object(tracing.tracer, "exporter", tracing.NullExporter()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def crawl(self, state):
+        page = FakePage(self.items)
+        return asyncio.run(crawler.crawl_page(page, "camera", 2, state))
+
+    def test_uninterrupted_crawl(self):
+        state = new_crawl_state("camera")
+        self.crawl(state)
+        self.assertEqual(self.db.products, self.expected)
+        self.assertEqual(self.db.state["items_stored"], 7)
+
+    def test_resume_after_crash_mid_page(self):
+        for crash_index in range(len(self.items)):
+            with self.subTest(crash_index=crash_index):
+                self.db = FakeDatabase()
+                self.db.state = new_crawl_state("camera")
+                self.crash_at = self.items[crash_index]
+
+                with unittest.mock.patch.object(crawler, "store_data", self.db.store_data):
+                    with self.assertRaises(SimulatedCrash):
+                        self.crawl(copy.deepcopy(self.db.state))
+                    resumed = copy.deepcopy(self.db.state)
+                    self.crawl(resumed)
+
+                self.assertEqual(self.db.products, self.expected)
+                self.assertEqual(resumed["items_stored"], len(self.expected))
+                self.assertEqual(resumed["items_crawled"], 8)
+                self.assertEqual(resumed["seen_asins"], set(self.expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
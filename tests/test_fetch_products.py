@@ -3,7 +3,8 @@ from dotenv import load_dotenv
 import unittest
 import unittest.mock
 from fastapi.testclient import TestClient
-from app import app, get_db_connection
+from app import app, get_db_connection, product_cache
+from backend.utils.migrations import apply_migrations
 import mysql.connector
 
 load_dotenv()
@@ -20,26 +21,7 @@ def create_test_db():
     cursor = conn.cursor()
     cursor.execute(f"CREATE DATABASE IF NOT EXISTS {TEST_DB_NAME}")
     conn.database = TEST_DB_NAME
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS products (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            mainImage_url VARCHAR(255),
-            title VARCHAR(255),
-            price_whole VARCHAR(255),
-            price_fraction VARCHAR(255),
-            rating VARCHAR(255),
-            reviews VARCHAR(255),
-            url VARCHAR(255),
-            keyword VARCHAR(255)
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS normalized_keywords (
-            keyword VARCHAR(255) PRIMARY KEY,
-            keyword_pool TEXT
-        )
-    """)
-    conn.commit()
+    apply_migrations(conn, cursor)
     cursor.close()
     conn.close()
 
@@ -76,6 +58,7 @@ class TestFetchProductsEndpoint(unittest.TestCase):
     def setUp(self):
         self.app_deps_patch = unittest.mock.patch('app.get_db_connection', get_test_db_connection)
         self.app_deps_patch.start()
+        product_cache.clear()
         self.clear_tables()
         self.insert_test_data()
 
@@ -87,6 +70,7 @@ class TestFetchProductsEndpoint(unittest.TestCase):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM products")
         cursor.execute("DELETE FROM normalized_keywords")
+        cursor.execute("DELETE FROM keyword_versions")
         conn.commit()
         cursor.close()
         conn.close()
@@ -0,0 +1,56 @@
+import gzip
+import unittest
+import brotli
+from backend.utils.http_cache import (
+    version_etag,
+    etag_matches,
+    negotiate_encoding,
+    encode_body,
+    json_response,
+    not_modified,
+)
+
+
+class TestEtags(unittest.TestCase):
+
+    def test_etag_changes_with_version_and_resource(self):
+        etag = version_etag("products", "camera", "us", 1)
+        self.assertEqual(etag, version_etag("products", "camera", "us", 1))
+        self.assertNotEqual(etag, version_etag("products", "camera", "us", 2))
+        self.assertNotEqual(etag, version_etag("statistics", "camera", "us", 1))
+        self.assertNotEqual(etag, version_etag("products", "camera", "de", 1))
+
+    def test_if_none_match(self):
+        etag = '"abc"'
+        self.assertTrue(etag_matches('"abc"', etag))
+        self.assertTrue(etag_matches('"x", W/"abc"', etag))
+        self.assertTrue(etag_matches("*", etag))
+        self.assertFalse(etag_matches('"abd"', etag))
+        self.assertFalse(etag_matches(None, etag))
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate, br"), "br")
+        self.assertEqual(negotiate_encoding("gzip, br;q=0.5"), "gzip")
+        self.assertEqual(negotiate_encoding("br;q=0, gzip"), "gzip")
+        self.assertEqual(negotiate_encoding("*"), "br")
+        self.assertIsNone(negotiate_encoding("identity"))
+        self.assertIsNone(negotiate_encoding(None))
+
+    def test_encoded_bodies_decode(self):
+        body = b'[{"id": 1}]' * 100
+        self.assertEqual(gzip.decompress(encode_body(body, "gzip")), body)
+        self.assertEqual(brotli.decompress(encode_body(body, "br")), body)
+
+    def test_response_headers(self):
+        response = json_response(b"[]", '"abc"', "gzip")
+        self.assertEqual(response.headers["etag"], '"abc"')
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(not_modified('"abc"').status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import os
+import asyncio
+import unittest
+import unittest.mock
+import httpx
+from backend.tasks import crawl_amazon_product_data as crawler
+from backend.tasks import tracing
+from backend.tasks.http_fetcher import HttpFetcher
+from backend.tasks.pacing import PacingController, CrawlTimings
+from backend.tasks.rate_limiter import DomainRateLimiter
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as fixture:
+        return fixture.read()
+
+
+def fixture_transport(routes):
+    """Serve saved HTML fixtures by URL path, 404 for anything else"""
+    def handler(request):
+        name = routes.get(request.url.path)
+        if name is None:
+            return httpx.Response(404, text="")
+        return httpx.Response(200, text=read_fixture(name))
+    return httpx.MockTransport(handler)
+
+
+class FakeBrowserPage:
+    """Stands in for the Playwright page the fetcher falls back to"""
+
+    def __init__(self):
+        self.url = ""
+        self.visited = []
+
+    async def goto(self, url, **kwargs):
+        self.url = url
+        self.visited.append(url)
+        return None
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        return None
+
+    async def wait_for_load_state(self, state=None, timeout=None):
+        return None
+
+    async def query_selector_all(self, selector):
+        return []
+
+
+class TestHttpFirstFetch(unittest.TestCase):
+
+    def setUp(self):
+        routes = {
+            "/s": "search_results.html",
+            "/shell": "search_results_shell.html",
+            "/Soundcore-Wireless-Earbuds/dp/B0BTYCRJSS/ref=sr_1_1": "product_page.html",
+        }
+        self.fetcher = HttpFetcher(["test-agent"], transport=fixture_transport(routes))
+        patch = unittest.mock.patch.object(crawler, "http_fetcher", self.fetcher)
+        patch.start()
+        self.addCleanup(patch.stop)
+        patch = unittest.mock.patch.object(crawler, "HTTP_FIRST", True)
+        patch.start()
+        self.addCleanup(patch.stop)
+        patch = unittest.mock.patch.object(
+            crawler, "rate_limiter", DomainRateLimiter(rate=1e6, burst=1000)
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+        patch = unittest.mock.patch.object(
+            tracing.tracer, "exporter", tracing.NullExporter()
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.pacing = PacingController(min_ms=0, max_ms=0)
+
+    def tearDown(self):
+        asyncio.run(self.fetcher.close())
+
+    def load(self, url, browser_page):
+        async def load():
+            page = await crawler.load_search_page(browser_page, url, self.pacing, CrawlTimings())
+            details = []
+            for item in await page.query_selector_all(".s-result-item"):
+                details.append(await crawler.extract_product_details(item))
+            return page, details
+        return asyncio.run(load())
+
+    def test_search_page_parsed_from_static_html(self):
+        browser_page = FakeBrowserPage()
+        page, details = self.load("https://www.amazon.com/s?k=wireless+earbuds", browser_page)
+        self.assertIsNot(page, browser_page)
+        self.assertEqual(browser_page.visited, [])
+        valid = [detail for detail in details if crawler.is_valid_product(detail)]
+        self.assertEqual(len(valid), 2)
+        title, url, price_whole, price_fraction, rating, reviews = valid[0]
+        self.assertEqual(title, "Soundcore by Anker P20i True Wireless Earbuds")
+        self.assertEqual(url, "https://www.amazon.com/Soundcore-Wireless-Earbuds/dp/B0BTYCRJSS/ref=sr_1_1?keywords=wireless+earbuds")
+        self.assertEqual((price_whole, price_fraction), ("19", "99"))
+        self.assertEqual(rating, "4.5 out of 5 stars")
+        self.assertEqual(reviews, "84,729")
+        self.assertEqual(valid[1][2], "1,049")
+
+    def test_search_image_from_static_html(self):
+        async def images():
+            page = await crawler.load_search_page(
+                FakeBrowserPage(), "https://www.amazon.com/s?k=wireless+earbuds",
+                self.pacing, CrawlTimings(),
+            )
+            items = await page.query_selector_all(".s-result-item")
+            return [await crawler.extract_search_image(item) for item in items[:2]]
+        self.assertEqual(
+            asyncio.run(images()),
+            ["https://m.media-amazon.com/images/I/61main._AC_UL320_.jpg", None],
+        )
+
+    def test_incomplete_page_falls_back_to_browser(self):
+        browser_page = FakeBrowserPage()
+        page, _ = self.load("https://www.amazon.com/shell?k=wireless+earbuds", browser_page)
+        self.assertIs(page, browser_page)
+        self.assertEqual(browser_page.visited, ["https://www.amazon.com/shell?k=wireless+earbuds"])
+
+    def test_product_images_from_static_html(self):
+        url = "https://www.amazon.com/Soundcore-Wireless-Earbuds/dp/B0BTYCRJSS/ref=sr_1_1"
+        main_image, other_images = asyncio.run(crawler.fetch_product_images(None, url))
+        self.assertEqual(main_image, "https://m.media-amazon.com/images/I/61main._AC_SX679_.jpg")
+        self.assertEqual(len(other_images), 3)
+
+    def test_missing_product_page_falls_back_to_browser(self):
+        extract_product_images = crawler.extract_product_images
+        contexts = []
+
+        async def extract_images(context, product_page_url):
+            contexts.append(context)
+            if context is self.fetcher:
+                return await extract_product_images(context, product_page_url)
+            return "browser.jpg", []
+
+        url = "https://www.amazon.com/unknown/dp/B000000000"
+        with unittest.mock.patch.object(crawler, "extract_product_images", extract_images):
+            result = asyncio.run(crawler.fetch_product_images("browser-context", url))
+        self.assertEqual(result, ("browser.jpg", []))
+        self.assertEqual(contexts, [self.fetcher, "browser-context"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import io
+import os
+import asyncio
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from PIL import Image
+from backend.utils.image_cache import ImageCache, ImageCacheError, is_allowed_image_url
+
+CDN = "https://m.media-amazon.com/images/I"
+
+
+def jpeg(width, height, color):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(output, format="JPEG")
+    return output.getvalue()
+
+
+class TestImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.requests = []
+        images = {
+            "/images/I/red.jpg": jpeg(1200, 800, "red"),
+            "/images/I/red-copy.jpg": jpeg(1200, 800, "red"),
+            "/images/I/blue.jpg": jpeg(800, 800, "blue"),
+        }
+
+        def handler(request):
+            self.requests.append(request.url.path)
+            if request.url.path not in images:
+                return httpx.Response(404)
+            return httpx.Response(200, content=images[request.url.path])
+
+        self.cache = ImageCache(
+            self.directory.name,
+            executor=ThreadPoolExecutor(max_workers=1),
+            transport=httpx.MockTransport(handler),
+        )
+        self.addCleanup(lambda: asyncio.run(self.cache.close()))
+
+    def test_thumbnail_generated_once_and_resized(self):
+        async def run():
+            first = await self.cache.get(f"{CDN}/red.jpg", 160)
+            second = await self.cache.get(f"{CDN}/red.jpg", 160)
+            return first, second
+        (path, etag), second = asyncio.run(run())
+        self.assertEqual(second, (path, etag))
+        self.assertEqual(self.requests, ["/images/I/red.jpg"])
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (160, 107))
+        self.assertEqual(os.path.basename(path), etag.strip('"') + ".jpg")
+        self.assertEqual(self.cache.metrics()["image_cache_hit_ratio"], 0.5)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        async def run():
+            return await asyncio.gather(
+                *(self.cache.get(f"{CDN}/blue.jpg", 320) for _ in range(5))
+            )
+        results = asyncio.run(run())
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(self.requests, ["/images/I/blue.jpg"])
+
+    def test_identical_images_share_content_file(self):
+        async def run():
+            return (
+                await self.cache.get(f"{CDN}/red.jpg", 320),
+                await self.cache.get(f"{CDN}/red-copy.jpg", 320),
+            )
+        first, second = asyncio.run(run())
+        self.assertEqual(first, second)
+
+    def test_least_recently_used_thumbnail_evicted(self):
+        async def run():
+            red, _ = await self.cache.get(f"{CDN}/red.jpg", 640)
+            blue, _ = await self.cache.get(f"{CDN}/blue.jpg", 640)
+            os.utime(red, (1, 1))
+            self.cache.max_bytes = os.path.getsize(blue) + 1
+            self.cache.evict(target_ratio=1.0)
+            return red, blue
+        red, blue = asyncio.run(run())
+        self.assertFalse(os.path.exists(red))
+        self.assertTrue(os.path.exists(blue))
+        self.assertIsNone(self.cache.lookup(f"{CDN}/red.jpg", 640))
+
+    def test_missing_image_raises(self):
+        with self.assertRaises(ImageCacheError):
+            asyncio.run(self.cache.get(f"{CDN}/missing.jpg", 160))
+
+    def test_only_amazon_hosts_allowed(self):
+        self.assertTrue(is_allowed_image_url(f"{CDN}/red.jpg"))
+        self.assertFalse(is_allowed_image_url("https://example.com/red.jpg"))
+        self.assertFalse(is_allowed_image_url("file:///etc/passwd"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from backend.utils.keyword_catalog import KeywordCatalog, prefix_key
+
+
+class TestKeywordCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = KeywordCatalog()
+        self.catalog.add_many(
+            [
+                ("laptop", 5000),
+                ("laptop stand", 800),
+                ("laptop bag", 800),
+                ("lamp", 12000),
+                ("Apple AirTag", 9000),
+            ]
+        )
+
+    def test_membership_ignores_case_and_spacing(self):
+        self.assertIn("apple  airtag", self.catalog)
+        self.assertIn("LAPTOP", self.catalog)
+        self.assertNotIn("laptops", self.catalog)
+
+    def test_completions_ranked_by_popularity(self):
+        self.assertEqual(
+            [keyword for keyword, _ in self.catalog.complete("la")],
+            ["lamp", "laptop", "laptop bag", "laptop stand"],
+        )
+        self.assertEqual(
+            self.catalog.complete("lapt", limit=2), [("laptop", 5000.0), ("laptop bag", 800.0)]
+        )
+        self.assertEqual(self.catalog.complete("apple"), [("Apple AirTag", 9000.0)])
+        self.assertEqual(self.catalog.complete("x"), [])
+
+    def test_trailing_space_completes_words(self):
+        self.assertEqual(prefix_key("  Laptop   "), "laptop ")
+        self.assertEqual(
+            [keyword for keyword, _ in self.catalog.complete("laptop ")],
+            ["laptop bag", "laptop stand"],
+        )
+
+    def test_empty_prefix_lists_most_popular(self):
+        self.assertEqual(self.catalog.complete("", limit=1), [("lamp", 12000.0)])
+
+    def test_ties_beyond_the_limit_complete_alphabetically(self):
+        catalog = KeywordCatalog()
+        catalog.add_many([(f"cam{index:03d}", 0) for index in range(300)])
+        self.assertEqual(
+            [keyword for keyword, _ in catalog.complete("cam", 5)],
+            ["cam000", "cam001", "cam002", "cam003", "cam004"],
+        )
+
+    def test_add_updates_popularity_in_place(self):
+        self.assertFalse(self.catalog.add("laptop stand", 20000))
+        self.assertTrue(self.catalog.add("laptop sleeve", 1))
+        self.assertEqual(len(self.catalog), 6)
+        self.assertEqual(self.catalog.complete("lap", limit=1), [("laptop stand", 20000.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
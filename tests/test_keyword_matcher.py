@@ -0,0 +1,84 @@
+import unittest
+import numpy as np
+from backend.utils.keyword_matcher import KeywordMatcher
+
+# Word vectors standing in for a spaCy model's: bluetooth and wireless point
+# the same way, women and men do not
+WORD_VECTORS = {
+    "bluetooth": [1.0, 0.1, 0.0, 0.0, 0.0],
+    "wireless": [0.9, 0.2, 0.0, 0.0, 0.0],
+    "earbuds": [0.0, 1.0, 0.0, 0.0, 0.0],
+    "women's": [0.0, 0.0, 1.0, 0.3, 0.0],
+    "men's": [0.0, 0.0, 0.3, 1.0, 0.0],
+    "clothing": [0.0, 0.0, 0.2, 0.2, 1.0],
+}
+NO_VECTOR = [0.0] * 5
+
+
+def embed_words(text):
+    return np.mean([WORD_VECTORS.get(word, NO_VECTOR) for word in text.split()], axis=0)
+
+
+def similar_words(word, other):
+    vectors = [np.asarray(WORD_VECTORS.get(w, NO_VECTOR)) for w in (word, other)]
+    norms = np.linalg.norm(vectors[0]) * np.linalg.norm(vectors[1])
+    return bool(norms) and vectors[0] @ vectors[1] / norms >= 0.8
+
+
+class TestKeywordMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = KeywordMatcher()
+        self.matcher.add_many(
+            [
+                "Wireless Earbuds",
+                "camera",
+                "portable bluetooth speaker",
+                "men's clothing",
+                "laptop",
+            ]
+        )
+
+    def test_add_ignores_known_keywords(self):
+        self.assertFalse(self.matcher.add("wireless earbuds"))
+        self.assertEqual(len(self.matcher), 5)
+        self.assertIn("CAMERA", self.matcher)
+
+    def test_close_variant_matches_existing_keyword(self):
+        matches = self.matcher.matches("wireless earbud", threshold=0.6)
+        self.assertEqual(matches[0][0], "Wireless Earbuds")
+
+    def test_reordered_and_misspelled_words_match(self):
+        matches = self.matcher.matches("earbuds wireles", threshold=0.6)
+        self.assertEqual([keyword for keyword, _ in matches], ["Wireless Earbuds"])
+
+    def test_distinct_niches_sharing_letters_do_not_match(self):
+        # These score above the threshold on character n-grams alone
+        self.assertGreater(self.matcher.top_k("women's clothing", k=1)[0][1], 0.6)
+        self.assertEqual(self.matcher.matches("women's clothing", threshold=0.6), [])
+        self.assertGreater(self.matcher.top_k("laptop stand", k=1)[0][1], 0.6)
+        self.assertEqual(self.matcher.matches("laptop stand", threshold=0.6), [])
+        self.assertEqual(self.matcher.matches("bluetooth earbuds", threshold=0.6), [])
+
+    def test_synonyms_match_with_word_vectors(self):
+        matcher = KeywordMatcher(embed=embed_words, similar_words=similar_words)
+        matcher.add_many(["wireless earbuds", "men's clothing"])
+        matches = matcher.matches("bluetooth earbuds", threshold=0.6)
+        self.assertEqual([keyword for keyword, _ in matches], ["wireless earbuds"])
+        self.assertEqual(matcher.matches("women's clothing", threshold=0.6), [])
+
+    def test_unrelated_keyword_has_no_match(self):
+        self.assertEqual(self.matcher.matches("curtain", threshold=0.6), [])
+
+    def test_top_k_is_ordered(self):
+        results = self.matcher.top_k("bluetooth earbuds", k=3)
+        self.assertEqual(len(results), 3)
+        similarities = [similarity for _, similarity in results]
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+
+    def test_empty_matcher(self):
+        self.assertEqual(KeywordMatcher().top_k("camera"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import numpy as np
+from backend.utils.keyword_stats import (
+    calculate_bins,
+    compare_columns,
+    compare_statistics,
+    market_scores,
+    merge_parts,
+    row_parts,
+)
+
+
+class TestCompareStatistics(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [
+            ("camera", "10.00", "4.0", "100"),
+            ("camera", "30.50", "5.0", "300"),
+            ("laptop", "25.00", "4.5", "10"),
+            ("laptop", "15.00", "3.0", "50"),
+            ("laptop", "not a price", "4.0", "20"),
+        ]
+
+    def test_statistics_per_keyword(self):
+        result = compare_statistics(self.rows)
+        camera = result["keywords"]["camera"]
+        self.assertEqual(camera["seller_count"], 2)
+        self.assertEqual(camera["price_range"], (10.0, 30.5))
+        self.assertAlmostEqual(camera["average_price"], 20.25)
+        self.assertAlmostEqual(camera["average_reviews"], 200.0)
+        self.assertEqual(camera["rating_distribution"], {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1})
+        self.assertEqual(result["keywords"]["laptop"]["seller_count"], 2)
+
+    def test_distributions_share_bin_edges(self):
+        result = compare_statistics(self.rows)
+        bins = calculate_bins([10.0, 30.5, 25.0, 15.0], round_up=True)
+        self.assertEqual(len(result["price_bins"]), len(bins) - 1)
+        for stats in result["keywords"].values():
+            self.assertEqual(len(stats["price_range_distribution"]), len(result["price_bins"]))
+            self.assertEqual(len(stats["review_range_distribution"]), len(result["review_bins"]))
+        self.assertEqual(sum(result["keywords"]["camera"]["price_range_distribution"]), 2)
+
+    def test_matches_binning_of_single_keyword(self):
+        prices = np.array([12.0, 19.99, 35.0, 35.0, 80.0])
+        rows = [("camera", str(price), "4.0", "1") for price in prices]
+        bins = calculate_bins(prices, round_up=True)
+        expected = np.histogram(prices[prices >= bins[0]], bins=bins)[0].tolist()
+        self.assertEqual(
+            compare_statistics(rows)["keywords"]["camera"]["price_range_distribution"], expected
+        )
+
+    def test_no_rows(self):
+        self.assertEqual(compare_statistics([])["keywords"], {})
+
+    def test_merged_parts_match_rows(self):
+        parts = row_parts(self.rows)
+        self.assertEqual([part[0] for part in parts], ["camera", "laptop"])
+        np.testing.assert_array_equal(parts[1][1], [25.0, 15.0])
+        # snapshot columns (integer reviews) merge with parts parsed from rows
+        snapshot = ("camera", np.array([10.0, 30.5]), np.array([4.0, 5.0]), np.array([100, 300]))
+        merged = compare_columns(*merge_parts([parts[1], snapshot]))
+        self.assertEqual(merged, compare_statistics(self.rows))
+        self.assertEqual(compare_columns(*merge_parts([]))["keywords"], {})
+
+
+class TestMarketScores(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [
+            ("camera", "10.00", "4.0", "100"),
+            ("camera", "30.00", "5.0", "300"),
+            ("camera", "20.00", "4.5", "0"),
+            ("laptop", "25.00", "4.5", "10"),
+            ("laptop", "15.00", "3.0", "10"),
+            ("laptop", "not a price", "4.0", "20"),
+        ]
+
+    def scores(self, rows):
+        return {score["keyword"]: score for score in market_scores(rows)}
+
+    def test_statistics_per_keyword(self):
+        camera = self.scores(self.rows)["camera"]
+        self.assertEqual(camera["product_count"], 3)
+        self.assertEqual(camera["total_reviews"], 400)
+        self.assertEqual(camera["median_reviews"], 100.0)
+        self.assertAlmostEqual(camera["review_hhi"], 0.25**2 + 0.75**2)
+        self.assertAlmostEqual(camera["average_price"], 20.0)
+        laptop = self.scores(self.rows)["laptop"]
+        self.assertEqual(laptop["product_count"], 2)
+        self.assertEqual(laptop["median_reviews"], 10.0)
+        self.assertAlmostEqual(laptop["review_hhi"], 0.5)
+        self.assertAlmostEqual(laptop["rating_std"], 0.75)
+
+    def test_scores_are_bounded(self):
+        for score in market_scores(self.rows):
+            self.assertTrue(0 <= score["saturation"] <= 1)
+            self.assertTrue(0 <= score["opportunity"] <= 100)
+
+    def test_entrenched_market_is_more_saturated(self):
+        rows = [("open", f"{price}.00", "3.5", "40") for price in (10, 20, 30, 40)] + [
+            ("crowded", "20.00", "4.8", "90000"),
+            ("crowded", "21.00", "4.8", "200"),
+        ]
+        scores = self.scores(rows)
+        self.assertGreater(scores["crowded"]["saturation"], scores["open"]["saturation"])
+
+    def test_keyword_scored_alone_scores_the_same(self):
+        alone = self.scores([row for row in self.rows if row[0] == "laptop"])["laptop"]
+        self.assertEqual(alone, self.scores(self.rows)["laptop"])
+
+    def test_no_rows(self):
+        self.assertEqual(market_scores([]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from backend.utils.metric_snapshots import (
+    SnapshotStore,
+    build_snapshot,
+    parse_metric_rows,
+)
+
+
+class FakeCursor:
+    """Cursor answering the version lookup and the metrics query"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.result = []
+
+    def execute(self, query, params=None):
+        self.result = [(self.version,)] if "keyword_versions" in query else self.rows
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+class TestMetricSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = SnapshotStore(self.directory.name)
+        self.rows = [
+            (1, "10.00", "4.0", "100"),
+            (2, "30.50", "5.0", "300"),
+            (3, None, "4.5", "10"),
+            (4, "15.00", "3.0", "1200"),
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_skips_rows_that_do_not_parse(self):
+        columns = parse_metric_rows(self.rows)
+        np.testing.assert_array_equal(columns["product_ids"], [1, 2, 4])
+        np.testing.assert_array_equal(columns["prices"], [10.0, 30.5, 15.0])
+        self.assertEqual(columns["reviews"].dtype, np.int64)
+
+    def test_round_trip(self):
+        build_snapshot(FakeCursor(7, self.rows), self.store, "camera", "us")
+        snapshot = self.store.load("camera", "us", version=7)
+        self.assertEqual(snapshot.version, 7)
+        self.assertEqual(len(snapshot), 3)
+        np.testing.assert_array_equal(snapshot.columns["ratings"], [4.0, 5.0, 3.0])
+        np.testing.assert_array_equal(snapshot.columns["reviews"], [100, 300, 1200])
+        self.assertFalse(snapshot.columns["prices"].flags.writeable)
+        self.assertIsNone(self.store.load("camera", "uk"))
+
+    def test_stale_snapshot_is_skipped(self):
+        build_snapshot(FakeCursor(7, self.rows), self.store, "camera", "us")
+        self.assertIsNone(self.store.load("camera", "us", version=8))
+        self.assertEqual(self.store.metrics()["metric_snapshot_stale"], 1)
+
+    def test_replaced_file_is_remapped(self):
+        build_snapshot(FakeCursor(1, self.rows), self.store, "camera", "us")
+        first = self.store.load("camera", "us")
+        self.assertIs(self.store.load("camera", "us"), first)
+        build_snapshot(FakeCursor(2, self.rows[:1]), self.store, "camera", "us")
+        second = self.store.load("camera", "us", version=2)
+        self.assertEqual(len(second), 1)
+        # the old mapping stays readable after the file is replaced
+        self.assertEqual(len(first), 3)
+
+    def test_truncated_file_is_ignored(self):
+        path = build_snapshot(FakeCursor(1, self.rows), self.store, "camera", "us")
+        with open(path, "r+b") as snapshot_file:
+            snapshot_file.truncate(os.path.getsize(path) - 8)
+        with self.assertLogs("backend.utils.metric_snapshots", "WARNING"):
+            self.assertIsNone(self.store.load("camera", "us"))
+
+    def test_prune_keeps_listed_snapshots(self):
+        keep = build_snapshot(FakeCursor(1, self.rows), self.store, "camera", "us")
+        build_snapshot(FakeCursor(1, self.rows), self.store, "laptop", "us")
+        self.assertEqual(self.store.prune({keep}), 1)
+        self.assertIsNotNone(self.store.load("camera", "us"))
+        self.assertIsNone(self.store.load("laptop", "us"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.utils.metrics import MetricsRegistry, install_http_metrics, timed
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_by_label(self):
+        counter = self.registry.counter("crawl_tasks_enqueued_total", "Tasks", ("mode",))
+        counter.inc(mode="crawl")
+        counter.inc(2, mode="refresh")
+        counter.inc(mode="crawl")
+        lines = self.registry.render().splitlines()
+        self.assertIn("# TYPE crawl_tasks_enqueued_total counter", lines)
+        self.assertIn('crawl_tasks_enqueued_total{mode="crawl"} 2', lines)
+        self.assertIn('crawl_tasks_enqueued_total{mode="refresh"} 2', lines)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram(
+            "stage_seconds", "Stages", ("stage",), buckets=(0.1, 1.0)
+        )
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, stage="query")
+        lines = self.registry.render().splitlines()
+        self.assertIn('stage_seconds_bucket{stage="query",le="0.1"} 1', lines)
+        self.assertIn('stage_seconds_bucket{stage="query",le="1"} 3', lines)
+        self.assertIn('stage_seconds_bucket{stage="query",le="+Inf"} 4', lines)
+        self.assertIn('stage_seconds_sum{stage="query"} 4.05', lines)
+        self.assertIn('stage_seconds_count{stage="query"} 4', lines)
+
+    def test_timed_decorator(self):
+        histogram = self.registry.histogram("stage_seconds", "Stages", ("stage",))
+
+        @timed("normalize_keyword", histogram)
+        def normalize(keyword):
+            return keyword.lower()
+
+        self.assertEqual(normalize("Camera"), "camera")
+        self.assertEqual(histogram.count(stage="normalize_keyword"), 1)
+
+    def test_label_values_escaped(self):
+        counter = self.registry.counter("queries_total", "Queries", ("keyword",))
+        counter.inc(keyword='12" "ring"\\')
+        self.assertIn(
+            'queries_total{keyword="12\\" \\"ring\\"\\\\"} 1',
+            self.registry.render().splitlines(),
+        )
+
+    def test_collector_samples(self):
+        self.registry.add_collector(lambda: [("cache_bytes", "gauge", "Bytes", 42)])
+        self.assertIn("cache_bytes 42", self.registry.render().splitlines())
+
+    def test_http_latency_by_route_template(self):
+        app = FastAPI()
+        histogram = self.registry.histogram(
+            "http_request_duration_seconds", "Latency", ("method", "route", "status")
+        )
+        install_http_metrics(app, histogram)
+
+        @app.get("/api/products/{product_id}/images")
+        async def images(product_id: int):
+            return []
+
+        client = TestClient(app)
+        client.get("/api/products/1/images")
+        client.get("/api/products/2/images")
+        client.get("/missing")
+        self.assertEqual(
+            histogram.count(method="GET", route="/api/products/{product_id}/images", status=200),
+            2,
+        )
+        self.assertEqual(histogram.count(method="GET", route="unmatched", status=404), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from backend.utils.migrations import (
+    MIGRATIONS,
+    MigrationError,
+    add_product_metrics_index,
+    apply_migrations,
+    check_query_plans,
+    plan_problem,
+)
+
+
+class FakeCursor:
+    """Cursor answering queries from a list of canned results, recording statements"""
+
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.statements = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        statement = " ".join(query.split())
+        self.statements.append((statement, params))
+        self.rows = next(
+            (rows for prefix, rows in self.results.items() if statement.startswith(prefix)),
+            [],
+        )
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+
+class TestMigrations(unittest.TestCase):
+
+    def test_versions_are_unique(self):
+        versions = [version for version, _, _ in MIGRATIONS]
+        self.assertEqual(len(versions), len(set(versions)))
+        self.assertEqual(sorted(versions), list(range(1, len(versions) + 1)))
+
+    def test_applies_pending_migrations_in_order(self):
+        applied = []
+        migrations = [
+            (3, "third", lambda cursor: applied.append(3)),
+            (1, "first", lambda cursor: applied.append(1)),
+            (2, "second", lambda cursor: applied.append(2)),
+        ]
+        cursor = FakeCursor({"SELECT version FROM schema_migrations": [(1,)]})
+        connection = FakeConnection()
+        self.assertEqual(apply_migrations(connection, cursor, migrations), [2, 3])
+        self.assertEqual(applied, [2, 3])
+        self.assertEqual(connection.commits, 2)
+        recorded = [
+            params for statement, params in cursor.statements
+            if statement.startswith("INSERT INTO schema_migrations")
+        ]
+        self.assertEqual(recorded, [(2, "second"), (3, "third")])
+
+    def test_metrics_index_refuses_to_truncate(self):
+        cursor = FakeCursor({"SHOW INDEX": [], "SELECT COALESCE(MAX": [(120,)]})
+        with self.assertRaises(MigrationError):
+            add_product_metrics_index(cursor)
+        self.assertFalse(any(s.startswith("ALTER") for s, _ in cursor.statements))
+
+    def test_metrics_index_narrows_columns(self):
+        cursor = FakeCursor({"SHOW INDEX": [], "SELECT COALESCE(MAX": [(18,)]})
+        add_product_metrics_index(cursor)
+        alter = cursor.statements[-1][0]
+        self.assertIn("MODIFY reviews VARCHAR(64)", alter)
+        self.assertIn(
+            "ADD KEY idx_products_metrics (keyword, marketplace, price_whole, "
+            "price_fraction, rating, reviews)",
+            alter,
+        )
+
+
+class TestQueryPlans(unittest.TestCase):
+
+    def test_plan_problems(self):
+        indexes = ("idx_products_metrics",)
+        plan = {"key": "idx_products_metrics", "type": "ref", "Extra": "Using index"}
+        self.assertIsNone(plan_problem(plan, indexes, covering=True))
+        self.assertIn(
+            "index-only", plan_problem(dict(plan, Extra=None), indexes, covering=True)
+        )
+        self.assertIn(
+            "no index", plan_problem(dict(plan, key=None, type="ALL"), indexes, False)
+        )
+
+    def test_check_reports_queries_off_their_index(self):
+        class PlanCursor(FakeCursor):
+            def execute(self, query, params=None):
+                super().execute(query, params)
+                if query.startswith("EXPLAIN"):
+                    scan = "FROM products" in query and "mainImage_url" not in query
+                    self.rows = [
+                        {"key": None, "type": "ALL", "Extra": None}
+                        if scan
+                        else {"key": "PRIMARY", "type": "ref", "Extra": "Using index"}
+                    ]
+                elif "savedLists" in query:
+                    self.rows = []
+                else:
+                    self.rows = [{"value": "camera"}]
+
+        problems = check_query_plans(PlanCursor())
+        self.assertIn("product_metrics", problems)
+        self.assertIn("products_listing", problems)
+        self.assertNotIn("keyword_version", problems)
+        # savedLists is empty, so its queries are not checked
+        self.assertNotIn("saved_list_lookup", problems)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+import unittest.mock
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from backend.tasks.pacing import PacingController, CrawlTimings
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+
+class FakePage:
+    def __init__(self, url="https://www.amazon.com/s?k=camera", ready=True):
+        self.url = url
+        self.ready = ready
+
+    async def wait_for_selector(self, selector, state, timeout):
+        if not self.ready:
+            raise PlaywrightTimeoutError("timeout")
+
+    async def wait_for_load_state(self, state, timeout):
+        raise PlaywrightTimeoutError("still loading")
+
+
+class TestPacingController(unittest.TestCase):
+
+    def setUp(self):
+        self.pacing = PacingController(min_ms=0, max_ms=0)
+
+    def settle(self, page, response=None):
+        return asyncio.run(self.pacing.settle(page, response))
+
+    def test_backoff_and_decay(self):
+        self.pacing.record(False)
+        self.pacing.record(False)
+        self.assertEqual(self.pacing.multiplier, 4.0)
+        for _ in range(20):
+            self.pacing.record(True)
+        self.assertEqual(self.pacing.multiplier, 1.0)
+
+    def test_multiplier_is_capped(self):
+        for _ in range(20):
+            self.pacing.record(False)
+        self.assertEqual(self.pacing.multiplier, self.pacing.max_multiplier)
+
+    def test_ready_page(self):
+        self.assertTrue(self.settle(FakePage(), FakeResponse(200)))
+        self.assertEqual(self.pacing.successes, 1)
+
+    def test_throttled_page(self):
+        self.assertFalse(self.settle(FakePage(), FakeResponse(503)))
+        captcha = FakePage(url="https://www.amazon.com/errors/validateCaptcha")
+        self.assertFalse(self.settle(captcha, FakeResponse(200)))
+        self.assertEqual(self.pacing.failures, 2)
+
+    def test_page_never_ready(self):
+        self.assertFalse(self.settle(FakePage(ready=False), FakeResponse(200)))
+
+    def test_jitter_scales_with_multiplier(self):
+        pacing = PacingController(min_ms=1000, max_ms=1000)
+        pacing.record(False)
+        self.assertEqual(pacing.jitter_seconds(), 2.0)
+
+
+class TestCrawlTimings(unittest.TestCase):
+
+    def test_measure_accumulates(self):
+        timings = CrawlTimings()
+        with unittest.mock.patch("backend.tasks.pacing.time.perf_counter", side_effect=[0, 1, 5, 7]):
+            with timings.measure("wait"):
+                pass
+            with timings.measure("wait"):
+                pass
+        self.assertEqual(timings.summary(), {"wait": 3.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+import unittest.mock
+from backend.tasks.rate_limiter import TokenBucket, DomainRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=2.0, capacity=3, clock=self.clock)
+
+    def test_burst_is_free(self):
+        self.assertEqual([self.bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+
+    def test_requests_past_burst_are_spaced_by_rate(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        self.assertAlmostEqual(self.bucket.reserve(), 0.5)
+        self.assertAlmostEqual(self.bucket.reserve(), 1.0)
+
+    def test_tokens_refill_up_to_capacity(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        self.clock.now = 100.0
+        self.assertEqual([self.bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(self.bucket.reserve(), 0.5)
+
+
+class TestDomainRateLimiter(unittest.TestCase):
+
+    def test_domains_have_separate_budgets(self):
+        limiter = DomainRateLimiter(rate=1.0, burst=1)
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+
+        async def run():
+            await limiter.acquire("https://www.amazon.com/s?k=camera&page=1")
+            await limiter.acquire("https://www.amazon.de/s?k=camera&page=1")
+            await limiter.acquire("https://www.amazon.com/s?k=camera&page=2")
+
+        with unittest.mock.patch("asyncio.sleep", fake_sleep):
+            asyncio.run(run())
+
+        self.assertEqual(len(sleeps), 1)
+        self.assertEqual(limiter.metrics()["www.amazon.com"]["requests"], 2)
+        self.assertEqual(limiter.metrics()["www.amazon.de"]["wait_seconds"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+import unittest.mock
+from backend.tasks import crawl_amazon_product_data as crawler
+from backend.tasks.crawl_amazon_product_data import changed_metrics
+
+
+class TestChangedMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.stored = {
+            "id": 7,
+            "asin": "B0BTYCRJSS",
+            "price_whole": "29",
+            "price_fraction": "99",
+            "rating": "4.5 out of 5 stars",
+            "reviews": "1,024",
+        }
+
+    def details(self, price_whole="29", reviews="1,024"):
+        return (
+            "Wireless Earbuds",
+            "https://www.amazon.com/dp/B0BTYCRJSS",
+            price_whole,
+            "99",
+            "4.5 out of 5 stars",
+            reviews,
+        )
+
+    def test_unchanged_product(self):
+        self.assertIsNone(changed_metrics(self.stored, self.details()))
+
+    def test_price_change(self):
+        update = changed_metrics(self.stored, self.details(price_whole="24"))
+        self.assertEqual(update["id"], 7)
+        self.assertEqual(update["price_whole"], "24")
+
+    def test_reviews_change(self):
+        update = changed_metrics(self.stored, self.details(reviews="1,100"))
+        self.assertEqual(update["reviews"], "1,100")
+
+
+class FakePage:
+    def __init__(self, items):
+        self.items = items
+
+    async def query_selector_all(self, selector):
+        return self.items
+
+
+class TestRefreshPage(unittest.TestCase):
+
+    def test_items_without_asin_are_not_stored_again(self):
+        details = {
+            "known": ("Earbuds", "https://www.amazon.com/dp/B0BTYCRJSS", "29", "99", "4.5", "1,024"),
+            "no asin": ("Earbuds", "https://www.amazon.com/s?k=earbuds", "9", "99", "4.0", "12"),
+        }
+        stored = {
+            "B0BTYCRJSS": {
+                "id": 7,
+                "price_whole": "29",
+                "price_fraction": "99",
+                "rating": "4.5",
+                "reviews": "1,024",
+            }
+        }
+        stored_batches = []
+
+        async def extract_product_details(item, base_url):
+            return details[item]
+
+        with unittest.mock.patch.object(
+            crawler, "extract_product_details", extract_product_details
+        ), unittest.mock.patch.object(
+            crawler, "store_batch", stored_batches.append
+        ), unittest.mock.patch.object(crawler, "update_product_metrics", lambda *args: None):
+            counts = asyncio.run(
+                crawler.refresh_page(FakePage(["known", "no asin"]), "earbuds", stored, set())
+            )
+        self.assertEqual(counts, {"updated": 0, "unchanged": 1, "new": 0, "skipped": 1})
+        self.assertEqual(stored_batches, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from backend.utils.result_cache import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResultCache(max_mb=10 / (1024 * 1024))
+        self.cache.add_alias("cameras", "camera")
+
+    def test_lookup_resolves_alias(self):
+        self.cache.put("camera", "us", b"[1]")
+        self.assertEqual(self.cache.lookup("cameras", "us"), ("camera", b"[1]", None))
+        self.assertIsNone(self.cache.lookup("cameras", "de"))
+        self.assertIsNone(self.cache.lookup("camcorder", "us"))
+        metrics = self.cache.metrics()
+        self.assertEqual((metrics["result_cache_hits"], metrics["result_cache_misses"]), (1, 2))
+        self.assertAlmostEqual(metrics["result_cache_hit_ratio"], 1 / 3)
+
+    def test_evicts_least_recently_used_over_budget(self):
+        self.cache.put("camera", "us", b"1234")
+        self.cache.put("laptop", "us", b"1234")
+        self.cache.get("camera", "us")
+        self.cache.put("tablet", "us", b"1234")
+        self.assertIsNone(self.cache.get("laptop", "us"))
+        self.assertEqual(self.cache.get("camera", "us"), (b"1234", None))
+        self.assertEqual(self.cache.metrics()["result_cache_bytes"], 8)
+        self.assertEqual(self.cache.metrics()["result_cache_evictions"], 1)
+
+    def test_oversized_body_is_not_cached(self):
+        self.cache.put("camera", "us", b"x" * 11)
+        self.assertEqual(self.cache.metrics()["result_cache_entries"], 0)
+
+    def test_invalidate_marketplace(self):
+        self.cache.put("camera", "us", b"[1]")
+        self.cache.put("camera", "de", b"[2]")
+        self.cache.invalidate("camera", "de")
+        self.assertIsNone(self.cache.get("camera", "de"))
+        self.assertEqual(self.cache.lookup("cameras", "us"), ("camera", b"[1]", None))
+
+    def test_invalidate_all_marketplaces_drops_aliases(self):
+        self.cache.put("camera", "us", b"[1]")
+        self.cache.invalidate("camera")
+        self.assertIsNone(self.cache.get("camera", "us"))
+        self.assertNotIn("cameras", self.cache.aliases)
+        self.assertEqual(self.cache.metrics()["result_cache_bytes"], 0)
+
+    def test_encoded_variants_are_kept_and_invalidated_together(self):
+        self.cache.put("camera", "us", b"[1]", etag='"v1"')
+        self.cache.put("camera", "us", b"gz", etag='"v1"', variant="gzip")
+        self.assertEqual(self.cache.get("camera", "us", "gzip", record=False), (b"gz", '"v1"'))
+        self.assertEqual(self.cache.metrics()["result_cache_bytes"], 5)
+        self.cache.invalidate("camera", "us")
+        self.assertIsNone(self.cache.get("camera", "us", "gzip"))
+        self.assertEqual(self.cache.metrics()["result_cache_bytes"], 0)
+
+    def test_replacing_plain_body_drops_encoded_variants(self):
+        self.cache.put("camera", "us", b"[1]", etag='"v1"')
+        self.cache.put("camera", "us", b"gz", etag='"v1"', variant="gzip")
+        self.cache.put("camera", "de", b"gz", etag='"v1"', variant="gzip")
+        self.cache.put("camera", "us", b"[2]", etag='"v2"')
+        self.assertIsNone(self.cache.get("camera", "us", "gzip"))
+        self.assertIsNotNone(self.cache.get("camera", "de", "gzip"))
+        self.assertEqual(self.cache.metrics()["result_cache_bytes"], 5)
+
+    def test_body_built_before_invalidation_is_not_cached(self):
+        generation = self.cache.generation
+        self.cache.invalidate("camera", "us")
+        self.cache.put("camera", "us", b"[stale]", generation)
+        self.assertIsNone(self.cache.get("camera", "us"))
+
+    def test_aliases_are_bounded_least_recently_used_first(self):
+        cache = ResultCache(max_aliases=2)
+        cache.add_alias("cameras", "camera")
+        cache.add_alias("laptops", "laptop")
+        cache.lookup("cameras", "us")
+        cache.add_alias("tablets", "tablet")
+        self.assertEqual(list(cache.aliases), ["cameras", "tablets"])
+        self.assertEqual(cache.metrics()["result_cache_aliases"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from backend.utils.saved_lists import save_products, unsave_products
+
+
+class FakeCursor:
+    """Cursor over in-memory products and savedLists rows"""
+
+    def __init__(self, products, saved):
+        self.products = set(products)
+        self.saved = set(saved)
+        self.statements = []
+        self.rows = []
+
+    def execute(self, query, params):
+        statement = " ".join(query.split())
+        self.statements.append(statement.split()[0])
+        user_id, *ids = params
+        if statement.startswith("SELECT p.id"):
+            self.rows = [
+                (product_id, (user_id, product_id) in self.saved)
+                for product_id in ids
+                if product_id in self.products
+            ]
+        elif statement.startswith("SELECT product_id"):
+            self.rows = [
+                (product_id,) for product_id in ids if (user_id, product_id) in self.saved
+            ]
+        elif statement.startswith("INSERT IGNORE"):
+            self.saved.update((user_id, product_id) for product_id in ids)
+        elif statement.startswith("DELETE"):
+            self.saved.difference_update((user_id, product_id) for product_id in ids)
+
+    def fetchall(self):
+        return self.rows
+
+
+class TestSavedLists(unittest.TestCase):
+
+    def test_bulk_save_reports_each_product(self):
+        cursor = FakeCursor(products=[1, 2, 3], saved=[("u", 2)])
+        results = save_products(cursor, "u", [1, 2, 9, 1, 3])
+        self.assertEqual(
+            results, [(1, "saved"), (2, "already_saved"), (9, "not_found"), (3, "saved")]
+        )
+        self.assertEqual(cursor.saved, {("u", 1), ("u", 2), ("u", 3)})
+        self.assertEqual(cursor.statements, ["SELECT", "INSERT"])
+
+    def test_bulk_save_of_saved_products_writes_nothing(self):
+        cursor = FakeCursor(products=[1], saved=[("u", 1)])
+        self.assertEqual(save_products(cursor, "u", [1]), [(1, "already_saved")])
+        self.assertEqual(cursor.statements, ["SELECT"])
+
+    def test_bulk_unsave_reports_each_product(self):
+        cursor = FakeCursor(products=[1, 2], saved=[("u", 1), ("v", 2)])
+        self.assertEqual(
+            unsave_products(cursor, "u", [1, 2]), [(1, "unsaved"), (2, "not_saved")]
+        )
+        self.assertEqual(cursor.saved, {("v", 2)})
+        self.assertEqual(cursor.statements, ["SELECT", "DELETE"])
+
+    def test_empty_request_runs_no_query(self):
+        cursor = FakeCursor(products=[], saved=[])
+        self.assertEqual(save_products(cursor, "u", []), [])
+        self.assertEqual(unsave_products(cursor, "u", []), [])
+        self.assertEqual(cursor.statements, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
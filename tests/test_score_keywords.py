@@ -0,0 +1,70 @@
+import unittest
+import unittest.mock
+from backend.tasks import score_keywords as scoring
+
+
+class FakeCursor:
+    """Cursor answering the stale keyword and product queries, recording score writes"""
+
+    def __init__(self, stale, rows):
+        self.stale = stale
+        self.rows = rows
+        self.result = []
+        self.written = []
+
+    def execute(self, query, params=None):
+        self.result = self.stale if "FROM keywords k" in query else self.rows
+
+    def executemany(self, query, rows):
+        self.written.extend(rows)
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+class TestScoreKeywords(unittest.TestCase):
+
+    def score(self, stale, rows):
+        cursor = FakeCursor(stale, rows)
+        connection = FakeConnection(cursor)
+        with unittest.mock.patch.object(scoring, "create_connection", lambda: connection):
+            scored = scoring.score_keywords()
+        return scored, {row[0]: row for row in cursor.written}
+
+    def test_keyword_without_products_gets_empty_score_at_its_version(self):
+        scored, written = self.score(
+            [("camera", "us", 3), ("tripod", "us", 7)],
+            [("camera", "199.99", "4.5", "1200"), ("camera", "99.00", "4.1", "300")],
+        )
+        self.assertEqual(scored, 1)
+        self.assertEqual(written["camera"][2], 2)
+        self.assertEqual(written["camera"][-1], 3)
+        self.assertEqual(written["tripod"], ("tripod", "us", *[0] * 10, 7))
+
+    def test_unparseable_products_count_as_none(self):
+        scored, written = self.score([("tripod", "us", 2)], [("tripod", None, None, None)])
+        self.assertEqual(scored, 0)
+        self.assertEqual(written["tripod"][2:], (*[0] * 10, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
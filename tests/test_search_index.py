@@ -0,0 +1,120 @@
+import unittest
+from datetime import datetime
+from backend.utils.search_index import (
+    SYNC_OVERLAP,
+    ProductSearchIndex,
+    changed_product_rows,
+    tokenize,
+)
+
+
+class FakeCursor:
+    """Cursor answering the clock query and recording the products query"""
+
+    def __init__(self, now, rows):
+        self.now = now
+        self.rows = rows
+        self.queries = []
+        self.result = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+        self.result = [(self.now,)] if "CURRENT_TIMESTAMP" in query else list(self.rows)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchmany(self, size):
+        rows, self.result = self.result[:size], self.result[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+class TestProductSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ProductSearchIndex()
+        self.index.add_rows([
+            (1, "Wireless Earbuds Bluetooth 5.3 Headphones", "29", "99", "4.5 out of 5 stars"),
+            (2, "Wired Earbuds with Microphone", "9", "99", "4.0 out of 5 stars"),
+            (3, "Stainless Steel Water Bottle", "1,024", "50", "4.8 out of 5 stars"),
+            (4, "Bluetooth Speaker Portable Wireless", "45", "00", "3.9 out of 5 stars"),
+        ])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Wireless Earbuds, 5.3!"), ["wireless", "earbuds", "5", "3"])
+        self.assertEqual(tokenize(None), [])
+
+    def test_search_ranks_best_match_first(self):
+        results = self.index.search("wireless earbuds")
+        self.assertEqual([product_id for product_id, _ in results], [1, 2, 4])
+        self.assertGreater(results[0][1], results[1][1])
+
+    def test_search_unknown_term(self):
+        self.assertEqual(self.index.search("refrigerator"), [])
+
+    def test_search_filters(self):
+        results = self.index.search("earbuds", min_price=10)
+        self.assertEqual([product_id for product_id, _ in results], [1])
+        results = self.index.search("wireless", min_rating=4.2)
+        self.assertEqual([product_id for product_id, _ in results], [1])
+        results = self.index.search("bottle", max_price=1000)
+        self.assertEqual(results, [])
+
+    def test_search_limit(self):
+        self.assertEqual(len(self.index.search("wireless earbuds bluetooth", limit=2)), 2)
+
+    def test_incremental_add_and_replace(self):
+        self.index.add(5, "Noise Cancelling Earbuds", 59.0, 4.6)
+        self.assertEqual(self.index.max_id, 5)
+        self.assertIn(5, [product_id for product_id, _ in self.index.search("earbuds")])
+
+        self.index.add(2, "Wired Headphones", 9.99, 4.0)
+        self.assertEqual(len(self.index), 5)
+        self.assertNotIn(2, [product_id for product_id, _ in self.index.search("earbuds")])
+        self.assertIn(2, [product_id for product_id, _ in self.index.search("headphones")])
+
+
+class TestChangedProductRows(unittest.TestCase):
+
+    def test_first_sync_reads_every_product(self):
+        now = datetime(2024, 5, 1, 12, 0)
+        cursor = FakeCursor(now, [(1, "Earbuds", "9", "99", "4.0 out of 5 stars")])
+        index = ProductSearchIndex()
+        rows, synced_at = changed_product_rows(FakeConnection(cursor), index)
+        self.assertEqual((len(rows), synced_at), (1, now))
+        query, params = cursor.queries[-1]
+        self.assertNotIn("crawled_at", query)
+        self.assertEqual(params, [0])
+
+    def test_later_syncs_reread_products_crawled_again(self):
+        index = ProductSearchIndex()
+        index.add_rows([(1, "Wired Earbuds", "9", "99", "4.0 out of 5 stars")])
+        index.synced_at = datetime(2024, 5, 1, 12, 0)
+        cursor = FakeCursor(
+            datetime(2024, 5, 1, 13, 0), [(1, "Wired Headphones", "8", "99", "4.1 out of 5 stars")]
+        )
+        rows, _ = changed_product_rows(FakeConnection(cursor), index)
+        query, params = cursor.queries[-1]
+        self.assertIn("crawled_at >= %s", query)
+        self.assertEqual((params[0], params[-1]), (1, index.synced_at - SYNC_OVERLAP))
+        index.add_rows(rows)
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.replaced(), 1)
+        self.assertEqual([product_id for product_id, _ in index.search("headphones")], [1])
+        self.assertEqual(index.search("earbuds"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ import unittest
 import unittest.mock
 from fastapi.testclient import TestClient
 from app import app, get_db_connection
+from backend.utils.migrations import apply_migrations
 import mysql.connector
 
 load_dotenv()
@@ -20,15 +21,7 @@ def create_test_db():
     cursor = conn.cursor()
     cursor.execute(f"CREATE DATABASE IF NOT EXISTS {TEST_DB_NAME}")
     conn.database = TEST_DB_NAME
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id VARCHAR(36) PRIMARY KEY,
-            name VARCHAR(255),
-            email VARCHAR(255) UNIQUE,
-            password VARCHAR(255)
-        )
-    """)
-    conn.commit()
+    apply_migrations(conn, cursor)
     cursor.close()
     conn.close()
 
@@ -0,0 +1,148 @@
+import os
+import json
+import asyncio
+import tempfile
+import unittest
+
+os.environ.setdefault("QUEUE_BACKEND", "memory")
+
+from backend.tasks.queue_backends import MemoryBackend, SQLiteBackend, QueueError
+from backend.tasks.tasks import TaskBatcher, task_body
+
+
+class RecordingBackend(MemoryBackend):
+    """Memory queue recording batch sizes, optionally rejecting entries"""
+
+    def __init__(self, reject=()):
+        super().__init__()
+        self.batches = []
+        self.reject = list(reject)
+
+    def send_batch(self, bodies):
+        self.batches.append(len(bodies))
+        failed = [i for i, body in enumerate(bodies) if body in self.reject]
+        for body in bodies:
+            if body in self.reject:
+                self.reject.remove(body)
+        super().send_batch([b for i, b in enumerate(bodies) if i not in failed])
+        return failed
+
+
+class FailingBackend(MemoryBackend):
+    def send_batch(self, bodies):
+        raise QueueError("unreachable")
+
+
+class FlakyBackend(MemoryBackend):
+    """Memory queue whose first send fails with an error other than QueueError"""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    def send_batch(self, bodies):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionResetError("connection reset by peer")
+        return super().send_batch(bodies)
+
+
+class TestQueueBackends(unittest.TestCase):
+
+    def check_roundtrip(self, backend):
+        backend.send_batch(["a", "b"])
+        self.assertEqual(backend.depth(), 2)
+        messages = backend.receive(10, 0)
+        self.assertEqual([message["Body"] for message in messages], ["a", "b"])
+        self.assertIn("SentTimestamp", messages[0]["Attributes"])
+        self.assertEqual(backend.receive(10, 0), [])
+        backend.delete(messages[0]["ReceiptHandle"])
+        return messages
+
+    def test_memory_roundtrip_and_visibility(self):
+        clock = [0.0]
+        backend = MemoryBackend(visibility_timeout=30, clock=lambda: clock[0])
+        self.check_roundtrip(backend)
+        clock[0] = 31.0
+        self.assertEqual([m["Body"] for m in backend.receive(10, 0)], ["b"])
+
+    def test_sqlite_roundtrip_and_visibility(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SQLiteBackend(
+                os.path.join(directory, "queue.sqlite3"), visibility_timeout=0.2
+            )
+            self.check_roundtrip(backend)
+            self.assertEqual([m["Body"] for m in backend.receive(10, 1)], ["b"])
+
+
+class TestTaskBatcher(unittest.TestCase):
+
+    def test_enqueues_are_sent_in_batches_of_ten(self):
+        backend = RecordingBackend()
+
+        async def run():
+            batcher = TaskBatcher(backend, flush_interval=0.01)
+            futures = [batcher.enqueue(str(i)) for i in range(25)]
+            results = await asyncio.gather(*futures)
+            await batcher.close()
+            return results
+
+        self.assertEqual(asyncio.run(run()), [True] * 25)
+        self.assertEqual(backend.batches, [10, 10, 5])
+        self.assertEqual(backend.depth(), 25)
+
+    def test_rejected_entries_are_retried(self):
+        backend = RecordingBackend(reject=["b"])
+
+        async def run():
+            batcher = TaskBatcher(backend, flush_interval=0.001, retry_delay=0.001)
+            results = await asyncio.gather(batcher.enqueue("a"), batcher.enqueue("b"))
+            await batcher.close()
+            return results
+
+        self.assertEqual(asyncio.run(run()), [True, True])
+        self.assertEqual(backend.batches, [2, 1])
+        self.assertEqual(sorted(m["Body"] for m in backend.receive(10, 0)), ["a", "b"])
+
+    def test_gives_up_after_max_retries(self):
+        async def run():
+            batcher = TaskBatcher(
+                FailingBackend(), flush_interval=0.001, max_retries=2, retry_delay=0.001
+            )
+            result = await batcher.enqueue("a")
+            await batcher.close()
+            return result, batcher.metrics()
+
+        result, metrics = asyncio.run(run())
+        self.assertFalse(result)
+        self.assertEqual(metrics["queue_batches_sent"], 3)
+        self.assertEqual(metrics["queue_messages_failed"], 1)
+
+    def test_unexpected_backend_error_retries_the_batch(self):
+        backend = FlakyBackend()
+
+        async def run():
+            batcher = TaskBatcher(backend, flush_interval=0.001, retry_delay=0.001)
+            results = await asyncio.gather(batcher.enqueue("a"), batcher.enqueue("b"))
+            await batcher.close()
+            return results
+
+        self.assertEqual(asyncio.run(run()), [True, True])
+        self.assertEqual(backend.depth(), 2)
+
+    def test_close_flushes_buffered_tasks(self):
+        backend = RecordingBackend()
+
+        async def run():
+            batcher = TaskBatcher(backend, flush_interval=60)
+            batcher.enqueue(task_body("camera", "session", marketplace="de"))
+            await batcher.close()
+
+        asyncio.run(run())
+        body = json.loads(backend.receive(10, 0)[0]["Body"])
+        self.assertEqual(body["marketplace"], "de")
+        self.assertEqual(body["mode"], "crawl")
+
+
+if __name__ == "__main__":
+    unittest.main()
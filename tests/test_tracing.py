@@ -0,0 +1,85 @@
+import json
+import asyncio
+import tempfile
+import unittest
+from backend.tasks.tracing import (
+    Tracer,
+    JsonLinesExporter,
+    ThroughputWindow,
+    current_span,
+)
+from backend.utils.metrics import MetricsRegistry
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = f"{self.directory.name}/spans.jsonl"
+        self.registry = MetricsRegistry()
+        self.tracer = Tracer(JsonLinesExporter(self.path, flush_every=1000), self.registry)
+
+    def read_spans(self):
+        self.tracer.flush()
+        with open(self.path, encoding="utf-8") as trace_file:
+            return {span["name"]: span for span in map(json.loads, trace_file)}
+
+    def test_nested_spans_across_awaits(self):
+        async def item(number):
+            with self.tracer.span("process_item", number=number):
+                await asyncio.sleep(0)
+                current_span().set(outcome="extracted")
+
+        async def page():
+            with self.tracer.span("crawl_page", page=3) as span:
+                await asyncio.gather(item(1), item(2))
+                span.add("items_crawled", 2)
+
+        asyncio.run(page())
+        self.tracer.flush()
+        with open(self.path, encoding="utf-8") as trace_file:
+            spans = [json.loads(line) for line in trace_file]
+        parent = spans[-1]
+        self.assertEqual(parent["name"], "crawl_page")
+        self.assertEqual(parent["attributes"], {"page": 3, "items_crawled": 2})
+        children = [span for span in spans if span["name"] == "process_item"]
+        self.assertEqual(len(children), 2)
+        for child in children:
+            self.assertEqual(child["parent_id"], parent["span_id"])
+            self.assertEqual(child["trace_id"], parent["trace_id"])
+            self.assertEqual(child["attributes"]["outcome"], "extracted")
+        self.assertIsNone(current_span())
+
+    def test_error_class_recorded(self):
+        with self.assertRaises(TimeoutError):
+            with self.tracer.span("extract_product_images"):
+                raise TimeoutError()
+        span = self.read_spans()["extract_product_images"]
+        self.assertEqual((span["status"], span["error"]), ("error", "TimeoutError"))
+        lines = self.registry.render().splitlines()
+        self.assertIn(
+            'worker_span_errors_total{span="extract_product_images",error="TimeoutError"} 1',
+            lines,
+        )
+        self.assertIn(
+            'worker_span_duration_seconds_count{span="extract_product_images",status="error"} 1',
+            lines,
+        )
+
+
+class TestThroughputWindow(unittest.TestCase):
+
+    def test_rate_over_window(self):
+        now = [0.0]
+        window = ThroughputWindow(seconds=10, clock=lambda: now[0])
+        window.add(20)
+        now[0] = 5.0
+        window.add(30)
+        self.assertEqual(window.rate(), 5.0)
+        now[0] = 12.0
+        self.assertEqual(window.rate(), 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
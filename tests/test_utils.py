@@ -0,0 +1,59 @@
+import unittest
+from backend.utils.utils import (
+    extract_asin,
+    parse_price,
+    parse_rating,
+    parse_reviews,
+    image_rows,
+)
+
+
+class TestExtractAsin(unittest.TestCase):
+
+    def test_product_url(self):
+        url = "https://www.amazon.com/Soundcore-Wireless/dp/B0BTYCRJSS/ref=sr_1_1?keywords=earbuds"
+        self.assertEqual(extract_asin(url), "B0BTYCRJSS")
+
+    def test_sponsored_redirect_url(self):
+        url = (
+            "https://www.amazon.com/sspa/click?ie=UTF8&spc=MTo"
+            "&url=%2FJBL-Vibe%2Fdp%2FB0BQPNMXQV%2Fref%3Dsr_1_1_sspa"
+        )
+        self.assertEqual(extract_asin(url), "B0BQPNMXQV")
+
+    def test_gp_product_url(self):
+        self.assertEqual(extract_asin("https://www.amazon.com/gp/product/B07XJ8C8F5"), "B07XJ8C8F5")
+
+    def test_url_without_asin(self):
+        self.assertIsNone(extract_asin("https://www.amazon.com/s?k=camera"))
+        self.assertIsNone(extract_asin(None))
+
+
+class TestParsers(unittest.TestCase):
+
+    def test_parse_price(self):
+        self.assertEqual(parse_price("1,299\n", "9"), 1299.09)
+        self.assertEqual(parse_price("19", "99"), 19.99)
+        self.assertIsNone(parse_price(None, "99"))
+
+    def test_parse_rating(self):
+        self.assertEqual(parse_rating("4.5 out of 5 stars"), 4.5)
+        self.assertIsNone(parse_rating(""))
+
+    def test_parse_reviews(self):
+        self.assertEqual(parse_reviews("12,345"), 12345)
+        self.assertIsNone(parse_reviews(None))
+
+
+class TestImageRows(unittest.TestCase):
+
+    def test_main_image_first_without_duplicates(self):
+        rows = image_rows(7, "main.jpg", ["a.jpg", "main.jpg", "", "b.jpg"])
+        self.assertEqual(rows, [(7, 0, "main.jpg"), (7, 1, "a.jpg"), (7, 2, "b.jpg")])
+
+    def test_missing_main_image(self):
+        self.assertEqual(image_rows(7, None, ["a.jpg"]), [(7, 0, "a.jpg")])
+
+
+if __name__ == "__main__":
+    unittest.main()